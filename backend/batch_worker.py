@@ -0,0 +1,19 @@
+# Dedicated batch worker process: python -m backend.batch_worker
+# (web processes can then run with BATCH_WORKERS=0)
+import time
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.main import EXCEL_FILE_PATH
+from backend.services import batch, startup
+
+def main():
+    startup.run_initial_load(EXCEL_FILE_PATH)
+    batch.start_workers(max(batch.BATCH_WORKERS, 1))
+    while True:
+        time.sleep(3600)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+import argparse
+import json
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+from backend.services import database, ingestion
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load ERP workbooks (files, directories or glob patterns) into procurement_records"
+    )
+    parser.add_argument("paths", nargs="+", help="Workbook files, directories or glob patterns")
+    parser.add_argument("--workers", type=int, default=None, help="Parser processes (default: all cores)")
+    parser.add_argument("--sheet", action="append", dest="sheets", help="Only load these sheet names")
+    parser.add_argument("--report", help="Write the per-file report as JSON to this path")
+    args = parser.parse_args()
+
+    database.init_database()
+    if not database.db_available:
+        raise SystemExit("Database is not available - set DATABASE_URL")
+
+    reports = ingestion.ingest(args.paths, workers=args.workers, sheets=args.sheets)
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump(reports, f, indent=2)
+    if any(report["errors"] for report in reports):
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
@@ -4,16 +4,22 @@ from dotenv import load_dotenv
 # Load environment variables from .env file
 load_dotenv()
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 
-from backend.services import database, excel_loader
-from backend.routes import chat
+from backend.services import metrics, usage, startup, warmup, entities, health, reports, paraphrase, stage_analytics, batch as batch_queue
+from backend.services.compression import CompressionMiddleware
+from backend.services.admission import AdmissionMiddleware
+from backend.routes import chat, admin, batch, analytics
 
 app = FastAPI(title="Procurement AI Chatbot")
 
+# Bounded concurrency and per-client rate limits for the LLM-backed endpoints.
+# Added before CORS so its 429s still carry the CORS headers.
+app.add_middleware(AdmissionMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[
@@ -26,9 +32,58 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Lets the client replay POST /query and /chat/details conditionally
+    expose_headers=["ETag", "Last-Modified"],
 )
 
+# gzip/brotli per Accept-Encoding; SSE streams are passed through
+app.add_middleware(CompressionMiddleware)
+
+def _route_label(request: Request) -> str:
+    # Route template, never the raw path: unmatched requests (404 probes) share
+    # one label so they cannot create unbounded metric series
+    return getattr(request.scope.get("route"), "path", "unmatched")
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    """Attach a per-stage timing trace to every API request."""
+    if not request.url.path.startswith("/api"):
+        return await call_next(request)
+
+    trace, token = metrics.start_trace(request.method, request.url.path)
+    tenant = usage.tenant_from_headers(request.headers, request.client.host if request.client else None)
+    usage_token = usage.begin_request(request.url.path, tenant)
+    emit = request.headers.get("x-debug-trace", "").lower() in ("1", "true", "yes")
+    try:
+        response = await call_next(request)
+    except Exception:
+        metrics.finish_trace(trace, _route_label(request), 500, emit)
+        raise
+    finally:
+        metrics.reset_trace(token)
+        usage.end_request(usage_token)
+
+    route_path = _route_label(request)
+    response.headers["Server-Timing"] = metrics.server_timing_header(trace)
+
+    # Streaming bodies keep running after the headers are sent, so the trace
+    # is only finished once the body has been fully written.
+    body_iterator = response.body_iterator
+
+    async def finish_after_body():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            metrics.finish_trace(trace, route_path, response.status_code, emit)
+
+    response.body_iterator = finish_after_body()
+    return response
+
 app.include_router(chat.router, prefix="/api")
+app.include_router(admin.router, prefix="/api")
+app.include_router(batch.router, prefix="/api")
+app.include_router(analytics.router, prefix="/api")
 
 EXCEL_FILE_PATH = os.path.join(
     os.path.dirname(os.path.dirname(__file__)),
@@ -38,23 +93,22 @@ EXCEL_FILE_PATH = os.path.join(
 
 @app.on_event("startup")
 async def startup_event():
-    database.init_database()
-    
-    if database.db_available:
-        count = database.get_record_count()
-        if count == 0:
-            print("Database is empty, loading data from Excel file...")
-            try:
-                records = excel_loader.load_excel_data(EXCEL_FILE_PATH)
-                print(f"Loaded {len(records)} records from Excel")
-                database.insert_records(records)
-                print(f"Successfully imported {len(records)} procurement records")
-            except Exception as e:
-                print(f"Error loading Excel data: {e}")
-        else:
-            print(f"Database already has {count} records")
-    else:
-        print("Skipping database data loading since database is not available")
+    # Database init and Excel ingestion run in the background so the server
+    # accepts traffic (liveness) immediately; /api/ready reports progress.
+    # Once the data is loaded: record the probe state, build the entity
+    # dictionary, seed the paraphrase index from the query log, load the stage
+    # analytics arrays, precompute the recurring reports, warm the cache, then
+    # start answering queued batch questions.
+    startup.after_load(health.refresh)
+    startup.after_load(entities.refresh)
+    startup.after_load(paraphrase.rebuild)
+    startup.after_load(stage_analytics.refresh)
+    startup.after_load(reports.run)
+    startup.after_load(warmup.run)
+    startup.after_load(batch_queue.start_workers)
+    startup.start_background_load(EXCEL_FILE_PATH)
+    health.start()
+    reports.start()
 
 
 CLIENT_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "client")
@@ -0,0 +1,117 @@
+"""Local stand-in for the OpenAI chat completions API.
+
+Used to exercise timeouts, retries, hedging, fallback and the circuit breaker
+without spending tokens:
+
+    MOCK_OPENAI_SLOW_RATE=0.2 uvicorn backend.mock_openai:app --port 8765
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 uvicorn backend.main:app
+"""
+import os
+import json
+import time
+import random
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Base latency of every response
+MOCK_DELAY_MS = float(os.environ.get("MOCK_OPENAI_DELAY_MS", "50"))
+# Share of requests that take MOCK_OPENAI_SLOW_DELAY_MS instead (tail latency)
+MOCK_SLOW_RATE = float(os.environ.get("MOCK_OPENAI_SLOW_RATE", "0"))
+MOCK_SLOW_DELAY_MS = float(os.environ.get("MOCK_OPENAI_SLOW_DELAY_MS", "5000"))
+# Share of requests answered with MOCK_OPENAI_FAIL_STATUS
+MOCK_FAIL_RATE = float(os.environ.get("MOCK_OPENAI_FAIL_RATE", "0"))
+MOCK_FAIL_STATUS = int(os.environ.get("MOCK_OPENAI_FAIL_STATUS", "503"))
+# Streamed responses: delay between chunks of ~4 characters (one token)
+MOCK_TOKEN_DELAY_MS = float(os.environ.get("MOCK_OPENAI_TOKEN_DELAY_MS", "10"))
+MOCK_SQL = os.environ.get(
+    "MOCK_OPENAI_SQL",
+    "SELECT department, SUM(budget) AS total FROM procurement_records GROUP BY department"
+)
+# Returned as the first candidate when candidates are requested (exercises EXPLAIN rejection)
+MOCK_BAD_SQL = os.environ.get("MOCK_OPENAI_BAD_SQL")
+
+app = FastAPI(title="Mock OpenAI")
+
+_stats = {"requests": 0, "failed": 0, "slow": 0}
+
+
+def _content(body: dict) -> str:
+    system = body["messages"][0]["content"]
+    if "suggestion" in system.lower():
+        return json.dumps({"suggestions": ["Show budget by department", "Show delayed projects"]})
+    if body.get("response_format"):
+        if any("candidate queries" in m["content"] for m in body["messages"] if m["role"] == "system"):
+            candidates = [{"sql": sql, "explanation": "Mock query"} for sql in (MOCK_BAD_SQL, MOCK_SQL) if sql]
+            return json.dumps({"candidates": candidates})
+        return json.dumps({
+            "sql": MOCK_SQL,
+            "explanation": "This mock query totals the budget of every department so the largest spenders stand out."
+        })
+    return "**Summary**\n\nMock answer generated locally."
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    _stats["requests"] += 1
+
+    delay = MOCK_DELAY_MS
+    if random.random() < MOCK_SLOW_RATE:
+        _stats["slow"] += 1
+        delay = MOCK_SLOW_DELAY_MS
+    await asyncio.sleep(delay / 1000)
+
+    if random.random() < MOCK_FAIL_RATE:
+        _stats["failed"] += 1
+        return JSONResponse(
+            {"error": {"message": "Mock upstream failure", "type": "server_error"}},
+            status_code=MOCK_FAIL_STATUS
+        )
+
+    content = _content(body)
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body["messages"]) // 4
+    completion_tokens = len(content) // 4
+    usage = {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+    if body.get("stream"):
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        return StreamingResponse(_stream(body, content, usage if include_usage else None),
+                                 media_type="text/event-stream")
+    return {
+        "id": f"mock-{_stats['requests']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model", "mock"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        }],
+        "usage": usage
+    }
+
+
+async def _stream(body: dict, content: str, usage: dict):
+    base = {"id": f"mock-{_stats['requests']}", "object": "chat.completion.chunk",
+            "created": int(time.time()), "model": body.get("model", "mock")}
+    for i in range(0, len(content), 4):
+        delta = {"content": content[i:i + 4]}
+        if i == 0:
+            delta["role"] = "assistant"
+        chunk = dict(base, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+        yield f"data: {json.dumps(chunk)}\n\n"
+        await asyncio.sleep(MOCK_TOKEN_DELAY_MS / 1000)
+    yield f"data: {json.dumps(dict(base, choices=[{'index': 0, 'delta': {}, 'finish_reason': 'stop'}]))}\n\n"
+    if usage:
+        yield f"data: {json.dumps(dict(base, choices=[], usage=usage))}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+@app.get("/stats")
+async def stats():
+    return _stats
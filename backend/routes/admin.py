@@ -0,0 +1,78 @@
+import os
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from backend.services import metrics, usage, llm, cache, warmup, query_log, admission, batch, reports, paraphrase
+
+router = APIRouter()
+
+ADMIN_API_KEY = os.environ.get("ADMIN_API_KEY")
+
+def require_admin(x_admin_key: Optional[str] = Header(default=None)):
+    """Admin endpoints are open in development, key-protected once ADMIN_API_KEY is set."""
+    if ADMIN_API_KEY and x_admin_key != ADMIN_API_KEY:
+        raise HTTPException(status_code=403, detail="Admin key required")
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus-style metrics: per-stage latency histograms, token and cache counters"""
+    return PlainTextResponse(
+        metrics.render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@router.get("/admin/usage", dependencies=[Depends(require_admin)])
+async def get_usage(group_by: str = "endpoint", day: Optional[str] = None):
+    """Token and cost totals grouped by endpoint, tenant, model or day"""
+    if group_by not in ("endpoint", "tenant", "model", "day"):
+        raise HTTPException(status_code=400, detail="group_by must be endpoint, tenant, model or day")
+    return usage.summary(group_by, day)
+
+@router.get("/admin/llm", dependencies=[Depends(require_admin)])
+async def get_llm_stats():
+    """Shared OpenAI client: connections, retries, timeouts, hedges, fallbacks and circuit state"""
+    return llm.connection_stats()
+
+@router.get("/admin/admission", dependencies=[Depends(require_admin)])
+async def get_admission():
+    """Per-endpoint concurrency, queue depth, service time and per-client rate limits"""
+    return admission.status()
+
+@router.get("/admin/batch", dependencies=[Depends(require_admin)])
+async def get_batch_stats():
+    """Batch workers in this process and questions answered, failed and retried"""
+    return batch.stats()
+
+@router.get("/admin/reports", dependencies=[Depends(require_admin)])
+async def get_reports():
+    """Precomputed reports: definitions, schedule, last run and the snapshots held by this worker"""
+    return reports.status()
+
+@router.post("/admin/reports/run", dependencies=[Depends(require_admin)])
+async def run_reports():
+    """Rebuild every report snapshot now"""
+    built = await asyncio.to_thread(reports.run, None)
+    return {"built": built, **reports.status()}
+
+@router.get("/admin/paraphrase", dependencies=[Depends(require_admin)])
+async def get_paraphrase(limit: int = 50):
+    """Paraphrase index: size, lookup outcomes and the most recent near misses with their scores"""
+    return paraphrase.status(limit)
+
+@router.get("/admin/cache", dependencies=[Depends(require_admin)])
+async def get_cache_stats():
+    """Shared cache backend, entries and bytes per namespace, data version, warm-up progress"""
+    return {**cache.stats(), "warmup": warmup.status()}
+
+@router.delete("/admin/cache", dependencies=[Depends(require_admin)])
+async def clear_cache(namespace: Optional[str] = None):
+    """Drop all cache entries (or one namespace: sql, result, answer)"""
+    return {"removed": cache.clear(namespace)}
+
+@router.get("/admin/query-log", dependencies=[Depends(require_admin)])
+async def get_query_log_report(days: int = 7, limit: int = 20):
+    """Most frequent and slowest SQL shapes (literals stripped) with outcome counts"""
+    return query_log.report(days=days, limit=min(max(limit, 1), 200))
@@ -0,0 +1,19 @@
+from fastapi import APIRouter, HTTPException
+from typing import Optional
+import asyncio
+
+from backend.services import stage_analytics
+
+router = APIRouter()
+
+
+@router.get("/analytics/stages")
+async def stage_stats(department: Optional[str] = None, supplier: Optional[str] = None, status: Optional[str] = None,
+                      group_by: Optional[str] = None, top: int = 10):
+    """Per-stage percentiles, SLA breach rates, critical-path contribution, breakdown and at-risk open PRs"""
+    try:
+        return await asyncio.to_thread(
+            stage_analytics.analyze, department, supplier, status, group_by, min(max(top, 1), 100)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,108 @@
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response
+from pydantic import BaseModel
+from typing import List
+import csv
+import io
+import json
+import asyncio
+
+from backend.services import batch, shaping, usage
+
+router = APIRouter()
+
+# How often the progress stream re-reads the batch
+EVENTS_POLL_SECONDS = 1.0
+
+
+class BatchRequest(BaseModel):
+    questions: List[str]
+    language: str = "en"
+
+
+def _get_or_404(batch_id: str, include_data: bool = False) -> dict:
+    job = batch.get(batch_id, include_data)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return job
+
+
+@router.post("/batch", status_code=202)
+async def submit_batch(request: BatchRequest, http_request: Request):
+    """Queue a list of questions; answers are produced in the background"""
+    tenant = usage.tenant_from_headers(http_request.headers, http_request.client.host if http_request.client else None)
+    try:
+        job = await asyncio.to_thread(batch.submit, request.questions, request.language, tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    base = f"/api/batch/{job['id']}"
+    return {**job, "status_url": base, "events_url": f"{base}/events", "download_url": f"{base}/download"}
+
+
+@router.get("/batch/{batch_id}")
+async def get_batch(batch_id: str):
+    """Progress and answers so far (poll this, or subscribe to /events)"""
+    return await asyncio.to_thread(_get_or_404, batch_id)
+
+
+@router.delete("/batch/{batch_id}")
+async def cancel_batch(batch_id: str):
+    """Cancel the questions that have not started yet"""
+    if not await asyncio.to_thread(batch.cancel, batch_id):
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return await asyncio.to_thread(_get_or_404, batch_id)
+
+
+@router.get("/batch/{batch_id}/events")
+async def batch_events(batch_id: str):
+    """Server-sent events: one `item` per answered question, `progress` updates, then `complete`"""
+    job = await asyncio.to_thread(_get_or_404, batch_id)
+
+    async def generate():
+        sent = set()
+        current = job
+        while True:
+            for item in current["items"]:
+                if item["status"] in ("done", "failed", "cancelled") and item["position"] not in sent:
+                    sent.add(item["position"])
+                    yield f"data: {shaping.dumps({'type': 'item', **item}).decode()}\n\n"
+            summary = {k: v for k, v in current.items() if k != "items"}
+            if current["status"] in ("done", "cancelled"):
+                yield f"data: {json.dumps({'type': 'complete', **summary})}\n\n"
+                return
+            yield f"data: {json.dumps({'type': 'progress', **summary})}\n\n"
+            await asyncio.sleep(EVENTS_POLL_SECONDS)
+            current = await asyncio.to_thread(batch.get, batch_id)
+            if current is None:
+                return
+
+    return StreamingResponse(
+        generate(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/batch/{batch_id}/download")
+async def download_batch(batch_id: str, format: str = "json"):
+    """Answers as a file: json (with result rows) or csv (one line per question)"""
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=400, detail="format must be json or csv")
+    job = await asyncio.to_thread(_get_or_404, batch_id, format == "json")
+    filename = f"batch-{batch_id[:8]}.{format}"
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if format == "json":
+        return shaping.RowsJSONResponse(job, headers=headers)
+
+    out = io.StringIO()
+    writer = csv.writer(out)
+    columns = ["position", "question", "status", "response", "sql", "row_count", "error", "duration_ms"]
+    writer.writerow(columns)
+    for item in job["items"]:
+        writer.writerow([item.get(c) for c in columns])
+    # BOM so spreadsheet apps read Arabic text as UTF-8
+    return Response(
+        content="\ufeff" + out.getvalue(),
+        media_type="text/csv; charset=utf-8",
+        headers=headers
+    )
@@ -1,19 +1,26 @@
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
-from openai import OpenAI
 import json
 import asyncio
 import os
 
-from backend.services import database, openai_client
+from backend.services import database, openai_client, metrics, usage, llm, pipeline, query_log, text_search, shaping, conditional, health, admission, reports, stage_analytics
+from backend.services.resultset import ResultSet, as_text
 
 router = APIRouter()
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
 
-class ChatRequest(BaseModel):
+DETAILS_TIMEOUT = float(os.environ.get("LLM_DETAILS_TIMEOUT", "60"))
+
+class ShapedRequest(BaseModel):
+    # Only return these result columns (default: all)
+    columns: Optional[List[str]] = None
+    # rows: list of objects; columnar: "columns" once plus one array per row
+    format: Literal["rows", "columnar"] = "rows"
+
+class ChatRequest(ShapedRequest):
     message: str
     language: str = "en"
     history: List[Dict[str, Any]] = []
@@ -22,10 +29,20 @@ class ChatResponse(BaseModel):
     response: str
     sql: Optional[str] = None
     data: Optional[list] = None
+    # Column names of `data` in columnar format
+    columns: Optional[List[str]] = None
+    # Literals rewritten to stored values: [{column, from, to, method}]
+    rewrites: Optional[list] = None
 
-class QueryRequest(BaseModel):
+class QueryRequest(ShapedRequest):
     sql: str
 
+def _shaped(rows: list, request: ShapedRequest) -> dict:
+    try:
+        return shaping.shape(rows, request.columns, request.format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 class SuggestionRequest(BaseModel):
     partial_input: str
     language: str = "en"
@@ -36,26 +53,46 @@ class SuggestionResponse(BaseModel):
 
 @router.get("/health")
 async def health_check():
-    try:
-        count = database.get_record_count()
-        return {
-            "status": "healthy",
-            "recordCount": count,
+    """Summary for monitors; served from the background-refreshed snapshot"""
+    ready, details = health.readiness()
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={
+            "status": "healthy" if details["status"] == "ready" else details["status"],
+            "recordCount": details["recordCount"],
+            "reasons": details["reasons"],
             "timestamp": datetime.utcnow().isoformat() + "Z"
         }
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    )
+
+@router.get("/live")
+async def liveness():
+    """Process is up and serving HTTP - never touches the database"""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat() + "Z"}
+
+@router.get("/ready")
+async def readiness():
+    """200 when this instance can serve queries, 503 with the reasons otherwise (cached state only)"""
+    ready, details = health.readiness()
+    return JSONResponse(status_code=200 if ready else 503, content=details)
 
 @router.get("/stats")
-async def get_stats():
+async def get_stats(http_request: Request, response: Response):
     try:
+        # Unchanged since the client's last poll: answer without touching the table
+        tag = conditional.etag("stats")
+        unchanged = conditional.not_modified(http_request, tag)
+        if unchanged is not None:
+            return unchanged
         stats = database.get_stats()
+        response.headers.update(conditional.headers(tag))
         return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Plain def: FastAPI runs it in the threadpool, keeping the blocking pipeline off the event loop
 @router.post("/chat")
-async def chat(request: ChatRequest):
+def chat(request: ChatRequest):
     try:
         # Check if message contains multiple questions
         questions = openai_client.split_questions(request.message)
@@ -66,25 +103,39 @@ async def chat(request: ChatRequest):
             max_questions = min(len(questions), 10)
             
             for i, question in enumerate(questions[:max_questions], 1):
-                result = openai_client.process_chat(question, request.language, request.history)
-                sql = result.get("sql")
-                
-                if sql and openai_client.validate_sql(sql):
-                    try:
-                        data = database.execute_query(sql)
-                        # Limit to 20 rows per question for faster processing
-                        data_list = [dict(row) for row in data][:20]
-                        
-                        response_text = openai_client.generate_response(
-                            data_list, 
-                            question, 
-                            request.language
-                        )
-                        all_responses.append(response_text)
-                    except Exception as e:
-                        all_responses.append(f"**Error:** {str(e)}")
-                else:
-                    all_responses.append(result.get("explanation", ""))
+                with query_log.entry(question, request.language) as log:
+                    snapshot = reports.match(question, request.language)
+                    if snapshot is not None:
+                        log.update(sql=snapshot["sql"], valid=True, row_count=snapshot["row_count"], outcome="report")
+                        all_responses.append(snapshot["response"])
+                        continue
+                    analysis = stage_analytics.answer(question, request.language)
+                    if analysis is not None:
+                        log.update(valid=True, row_count=len(analysis["data"]), outcome="analytics")
+                        all_responses.append(analysis["response"])
+                        continue
+                    result = openai_client.process_chat(question, request.language, request.history)
+                    sql, unresolved, _ = pipeline.prepare_sql(result, log)
+                    
+                    if sql:
+                        try:
+                            data = database.execute_query(sql)
+                            # Limit to 20 rows per question for faster processing
+                            data = data[:20]
+                            log["row_count"] = len(data)
+                            
+                            response_text = pipeline.render_answer(
+                                data, 
+                                question, 
+                                request.language,
+                                unresolved
+                            )
+                            all_responses.append(response_text)
+                        except Exception as e:
+                            log.update(outcome="failed", error=str(e))
+                            all_responses.append(f"**Error:** {str(e)}")
+                    else:
+                        all_responses.append(result.get("explanation", ""))
             
             # Add note if questions were limited
             if len(questions) > 10:
@@ -100,70 +151,26 @@ async def chat(request: ChatRequest):
             )
         
         else:
-            # Single question - original logic
-            result = openai_client.process_chat(request.message, request.language, request.history)
-            
-            sql = result.get("sql")
-            explanation = result.get("explanation", "")
-            
-            if sql and openai_client.validate_sql(sql):
-                try:
-                    data = database.execute_query(sql)
-                    data_list = [dict(row) for row in data]
-                    
-                    response_text = openai_client.generate_response(
-                        data_list, 
-                        request.message, 
-                        request.language
-                    )
-                    
-                    return ChatResponse(
-                        response=response_text,
-                        sql=sql,
-                        data=data_list[:100]
-                    )
-                except Exception as e:
-                    # If query fails, try to fix it
-                    error_msg = str(e)
-                    fixed_result = openai_client.fix_failed_query(
-                        sql, error_msg, request.message, request.language
-                    )
-                    
-                    if fixed_result.get("sql"):
-                        # Try the fixed query
-                        try:
-                            data = database.execute_query(fixed_result["sql"])
-                            data_list = [dict(row) for row in data]
-                            response_text = openai_client.generate_response(
-                                data_list, request.message, request.language
-                            )
-                            return ChatResponse(
-                                response=response_text,
-                                sql=fixed_result["sql"],
-                                data=data_list[:100]
-                            )
-                        except:
-                            pass
-                    
-                    # If still failing, return helpful error
-                    return ChatResponse(
-                        response=openai_client.generate_error_response(
-                            error_msg, request.message, request.language
-                        ),
-                        sql=sql
-                    )
-            else:
-                return ChatResponse(response=explanation)
+            # Single question
+            result = pipeline.answer_question(request.message, request.language, request.history)
+            if result.get("data") is not None:
+                result.update(_shaped(result["data"], request))
+            return ChatResponse(**result)
             
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/suggestions")
-async def get_suggestions(request: SuggestionRequest):
+def get_suggestions(request: SuggestionRequest):
     """Generate smart query suggestions based on user's partial input"""
     try:
         if not request.partial_input or len(request.partial_input.strip()) < 3:
             return SuggestionResponse(suggestions=[])
+        # Over capacity: suggestions are optional, answer with none
+        if admission.degraded():
+            return SuggestionResponse(suggestions=[])
         
         # Generate suggestions using AI
         suggestions = openai_client.generate_query_suggestions(
@@ -178,35 +185,97 @@ async def get_suggestions(request: SuggestionRequest):
         print(f"Suggestion error: {e}")
         return SuggestionResponse(suggestions=[])
 
+async def _deliver(response_text: str, sql: Optional[str], rewrites: Optional[list]):
+    """Step 4 of the chat stream: type out the answer, then the final metadata"""
+    # Step 4: Finalizing answer (75-100%) - FASTER
+    yield f"data: {json.dumps({'type': 'progress', 'step': 4, 'total': 4, 'status': 'active', 'message': 'Finalizing answer..'})}\n\n"
+    await asyncio.sleep(0.1)
+    
+    # Stream the response word by word - FASTER
+    words = response_text.split(' ')
+    for i, word in enumerate(words):
+        chunk_data = {
+            "type": "content",
+            "content": word + (' ' if i < len(words) - 1 else ''),
+            "done": False
+        }
+        yield f"data: {json.dumps(chunk_data)}\n\n"
+        await asyncio.sleep(0.015)  # 15ms delay (was 30ms) for faster typing
+    
+    # Send final metadata
+    final_data = {
+        "type": "complete",
+        "content": response_text,
+        "sql": sql,
+        "rewrites": rewrites or None,
+        "done": True
+    }
+    yield f"data: {json.dumps(final_data)}\n\n"
+
 @router.post("/chat/stream")
 async def chat_stream(request: ChatRequest):
     """Streaming endpoint for typing animation effect - optimized for speed"""
     async def generate_stream():
+        log = query_log.start(request.message, request.language)
         try:
             # Step 1: Analyzing query (0-25%) - FASTER
             yield f"data: {json.dumps({'type': 'progress', 'step': 1, 'total': 4, 'status': 'active', 'message': 'Analyzing your question'})}\n\n"
             await asyncio.sleep(0.2)
             
-            # Get the complete response first
-            result = openai_client.process_chat(request.message, request.language, request.history)
+            # Recurring questions are answered from the precomputed report,
+            # stage/SLA questions by the analytics engine
+            snapshot = await asyncio.to_thread(reports.match, request.message, request.language) if not request.history else None
+            if snapshot is not None:
+                log.update(sql=snapshot["sql"], valid=True, row_count=snapshot["row_count"], outcome="report")
+            elif not request.history:
+                snapshot = await asyncio.to_thread(stage_analytics.answer, request.message, request.language)
+                if snapshot is not None:
+                    log.update(valid=True, row_count=len(snapshot["data"]), outcome="analytics")
+            if snapshot is not None:
+                query_log.finish(log)
+                for step, message in ((1, 'Analyzing your question'), (2, 'Searching for information'), (3, 'Generating response..')):
+                    yield f"data: {json.dumps({'type': 'progress', 'step': step, 'total': 4, 'status': 'completed', 'message': message})}\n\n"
+                async for chunk in _deliver(snapshot["response"], snapshot["sql"], None):
+                    yield chunk
+                return
+            
+            # Generate the SQL in a worker thread: as soon as the streamed `sql`
+            # field is complete it starts executing and is sent to the client
+            loop = asyncio.get_running_loop()
+            early_sql = asyncio.Queue()
+            early = pipeline.EarlyExecution(
+                on_ready=lambda ready_sql: loop.call_soon_threadsafe(early_sql.put_nowait, ready_sql)
+            )
+            chat_task = asyncio.ensure_future(asyncio.to_thread(
+                openai_client.process_chat, request.message, request.language, request.history, early
+            ))
+            waiter = asyncio.ensure_future(early_sql.get())
+            await asyncio.wait({chat_task, waiter}, return_when=asyncio.FIRST_COMPLETED)
+            if waiter.done():
+                yield f"data: {json.dumps({'type': 'sql', 'sql': waiter.result(), 'early': True})}\n\n"
+            else:
+                waiter.cancel()
+            result = await chat_task
             
             # Step 1 Complete
             yield f"data: {json.dumps({'type': 'progress', 'step': 1, 'total': 4, 'status': 'completed', 'message': 'Analyzing your question'})}\n\n"
             await asyncio.sleep(0.05)
             
-            sql = result.get("sql")
             explanation = result.get("explanation", "")
             response_text = ""
-            data_list = []
+            sql, unresolved, _ = await asyncio.to_thread(pipeline.prepare_sql, result, log, early)
             
-            if sql and openai_client.validate_sql(sql):
+            if sql:
+                
                 # Step 2: Searching for information (25-50%) - FASTER
                 yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'total': 4, 'status': 'active', 'message': 'Searching for information'})}\n\n"
                 await asyncio.sleep(0.2)
                 
                 try:
-                    data = database.execute_query(sql)
-                    data_list = [dict(row) for row in data]
+                    data = await early.atake(sql)
+                    if data is None:
+                        data = await asyncio.to_thread(database.execute_query, sql)
+                    log["row_count"] = len(data)
                     
                     # Step 2 Complete
                     yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'total': 4, 'status': 'completed', 'message': 'Searching for information'})}\n\n"
@@ -216,10 +285,12 @@ async def chat_stream(request: ChatRequest):
                     yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'total': 4, 'status': 'active', 'message': 'Generating response..'})}\n\n"
                     await asyncio.sleep(0.2)
                     
-                    response_text = openai_client.generate_response(
-                        data_list, 
+                    response_text = await asyncio.to_thread(
+                        pipeline.render_answer,
+                        data, 
                         request.message, 
-                        request.language
+                        request.language,
+                        unresolved
                     )
                     
                     # Step 3 Complete
@@ -229,14 +300,16 @@ async def chat_stream(request: ChatRequest):
                 except Exception as e:
                     # If query fails, try to fix it
                     error_msg = str(e)
-                    fixed_result = openai_client.fix_failed_query(
-                        sql, error_msg, request.message, request.language
+                    log["error"] = error_msg
+                    fixed_result = await asyncio.to_thread(
+                        openai_client.fix_failed_query, sql, error_msg, request.message, request.language
                     )
                     
                     if fixed_result.get("sql"):
+                        log["fixed_sql"] = fixed_result["sql"]
                         try:
-                            data = database.execute_query(fixed_result["sql"])
-                            data_list = [dict(row) for row in data]
+                            data = await asyncio.to_thread(database.execute_query, fixed_result["sql"])
+                            log.update(row_count=len(data), outcome="fixed")
                             
                             # Step 2 Complete
                             yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'total': 4, 'status': 'completed', 'message': 'Searching for information'})}\n\n"
@@ -246,8 +319,8 @@ async def chat_stream(request: ChatRequest):
                             yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'total': 4, 'status': 'active', 'message': 'Generating response..'})}\n\n"
                             await asyncio.sleep(0.2)
                             
-                            response_text = openai_client.generate_response(
-                                data_list, request.message, request.language
+                            response_text = await asyncio.to_thread(
+                                openai_client.generate_response, data, request.message, request.language
                             )
                             sql = fixed_result["sql"]
                             
@@ -255,10 +328,12 @@ async def chat_stream(request: ChatRequest):
                             yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'total': 4, 'status': 'completed', 'message': 'Generating response..'})}\n\n"
                             await asyncio.sleep(0.1)
                         except:
+                            log["outcome"] = "failed"
                             response_text = fixed_result.get("explanation", explanation)
                             yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'total': 4, 'status': 'completed', 'message': 'Searching for information'})}\n\n"
                             yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'total': 4, 'status': 'completed', 'message': 'Generating response..'})}\n\n"
                     else:
+                        log["outcome"] = "failed"
                         response_text = fixed_result.get("explanation", explanation)
                         yield f"data: {json.dumps({'type': 'progress', 'step': 2, 'total': 4, 'status': 'completed', 'message': 'Searching for information'})}\n\n"
                         yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'total': 4, 'status': 'completed', 'message': 'Generating response..'})}\n\n"
@@ -274,30 +349,12 @@ async def chat_stream(request: ChatRequest):
                 yield f"data: {json.dumps({'type': 'progress', 'step': 3, 'total': 4, 'status': 'completed', 'message': 'Generating response..'})}\n\n"
                 await asyncio.sleep(0.1)
             
-            # Step 4: Finalizing answer (75-100%) - FASTER
-            yield f"data: {json.dumps({'type': 'progress', 'step': 4, 'total': 4, 'status': 'active', 'message': 'Finalizing answer..'})}\n\n"
-            await asyncio.sleep(0.1)
-            
-            # Stream the response word by word - FASTER
-            words = response_text.split(' ')
-            for i, word in enumerate(words):
-                chunk_data = {
-                    "type": "content",
-                    "content": word + (' ' if i < len(words) - 1 else ''),
-                    "done": False
-                }
-                yield f"data: {json.dumps(chunk_data)}\n\n"
-                await asyncio.sleep(0.015)  # 15ms delay (was 30ms) for faster typing
-            
-            # Send final metadata
-            final_data = {
-                "type": "complete",
-                "content": response_text,
-                "done": True
-            }
-            yield f"data: {json.dumps(final_data)}\n\n"
+            query_log.finish(log)
+            async for chunk in _deliver(response_text, sql, log["rewrites"]):
+                yield chunk
             
         except Exception as e:
+            query_log.finish(log, outcome="error", error=str(e))
             error_data = {
                 "type": "error",
                 "content": str(e),
@@ -315,40 +372,55 @@ async def chat_stream(request: ChatRequest):
         }
     )
 
+@router.get("/search")
+async def search(q: str, field: Optional[str] = None, limit: int = 20):
+    """Typo-tolerant search over description, supplier_details and note (trigram + full-text)"""
+    if len(q.strip()) < 2:
+        raise HTTPException(status_code=400, detail="Search query must be at least 2 characters")
+    if field and field not in text_search.SEARCH_COLUMNS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"field must be one of: {', '.join(text_search.SEARCH_COLUMNS)}"
+        )
+    try:
+        # The embedded engine scans in Python; keep it off the event loop
+        rows = await asyncio.to_thread(
+            database.search_records, q.strip(), [field] if field else None, min(max(limit, 1), 100)
+        )
+        return {"query": q, "total": len(rows), "data": rows}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/query")
-async def direct_query(request: QueryRequest):
+async def direct_query(request: QueryRequest, http_request: Request):
     try:
         if not openai_client.validate_sql(request.sql):
             raise HTTPException(status_code=400, detail="Invalid or unsafe SQL query. Only SELECT queries are allowed.")
         
+        tag = conditional.etag("query", request.sql, request.columns, request.format)
+        unchanged = conditional.not_modified(http_request, tag)
+        if unchanged is not None:
+            return unchanged
         data = database.execute_query(request.sql)
-        return {"data": [dict(row) for row in data]}
+        return shaping.RowsJSONResponse(_shaped(data, request), headers=conditional.headers(tag))
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-class DetailRequest(BaseModel):
+class DetailRequest(ShapedRequest):
     question: str
     sql: str
     language: str = "en"
 
-@router.post("/chat/details")
-async def get_details(request: DetailRequest):
-    """Get detailed table view for a query - only called when user clicks 'Show Details'"""
-    try:
-        if not openai_client.validate_sql(request.sql):
-            raise HTTPException(status_code=400, detail="Invalid SQL query")
-        
-        # Execute query and get all results
-        data = database.execute_query(request.sql)
-        data_list = [dict(row) for row in data]
-        
-        # Generate detailed response with properly formatted tables
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": f"""Generate a properly formatted table view for the data.
+@metrics.timed("render_details")
+async def _render_details(request: DetailRequest, data: ResultSet) -> str:
+    """Ask the model for a formatted markdown table of the detail rows."""
+    metrics.annotate(rows=len(data))
+    response = await llm.achat_completion(
+        timeout=DETAILS_TIMEOUT,
+        messages=[
+            {"role": "system", "content": f"""Generate a properly formatted table view for the data.
 
 STRICT FORMATTING RULES:
 1. Start with a brief one-line summary (COUNT MUST BE ACCURATE)
@@ -372,16 +444,51 @@ Example format:
 CRITICAL: The table row count MUST match the exact data provided. Do not approximate.
 
 Respond in {request.language}."""},
-                {"role": "user", "content": f"Question: {request.question}\n\nData ({len(data_list)} records):\n{str(data_list)}\n\nCreate a well-formatted table showing ALL {len(data_list)} records."}
-            ],
-            temperature=0.1,
-            max_tokens=3000
+            {"role": "user", "content": f"Question: {request.question}\n\nData ({len(data)} records):\n{as_text(data)}\n\nCreate a well-formatted table showing ALL {len(data)} records."}
+        ],
+        temperature=0.1,
+        max_tokens=3000
+    )
+    return response.choices[0].message.content
+
+@router.post("/chat/details")
+async def get_details(request: DetailRequest, http_request: Request):
+    """Get detailed table view for a query - only called when user clicks 'Show Details'"""
+    try:
+        if not openai_client.validate_sql(request.sql):
+            raise HTTPException(status_code=400, detail="Invalid SQL query")
+        
+        # A replay of details the client already has skips both the query and the model
+        tag = conditional.etag(
+            "details", request.sql, request.question, request.language, request.columns, request.format
         )
+        unchanged = conditional.not_modified(http_request, tag)
+        if unchanged is not None:
+            return unchanged
         
-        return {
-            "response": response.choices[0].message.content,
-            "total_records": len(data_list),
-            "data": data_list
-        }
+        # Execute query and get all results (the table only shows requested columns)
+        try:
+            data = database.execute_query(request.sql).project(request.columns)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        
+        # Generate detailed response with properly formatted tables
+        details_text = None
+        # Over capacity the table is rendered locally instead of by the model
+        if not admission.degraded() and usage.allow("details"):
+            try:
+                details_text = await _render_details(request, data)
+            except llm.LLMError as e:
+                print(f"⚠ Details table generation failed: {e}")
+        if details_text is None:
+            details_text = f"{len(data)} records\n\n" + openai_client.render_markdown_table(data)
+        
+        return shaping.RowsJSONResponse({
+            "response": details_text,
+            "total_records": len(data),
+            **_shaped(data, request)
+        }, headers=conditional.headers(tag))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
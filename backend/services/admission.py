@@ -0,0 +1,246 @@
+# Admission control for the LLM-backed endpoints. Each endpoint class has a
+# concurrency limit with a bounded wait queue, and each client a token bucket
+# per class. Over capacity a request is shed early (429 + Retry-After) or,
+# where a cheaper answer exists, degraded instead of queueing behind
+# everyone else. Limits are per worker process.
+import os
+import json
+import math
+import time
+import asyncio
+import contextvars
+
+from starlette.requests import Request
+
+from backend.services import metrics, usage
+
+ADMISSION_ENABLED = os.environ.get("ADMISSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Longest a request waits in a class queue before it is shed
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10"))
+
+
+def _rate(value: str):
+    """'20/60' -> (20 requests, per 60 seconds); '0' or '' disables the limit."""
+    if not value or value.strip() == "0":
+        return None
+    count, _, period = value.partition("/")
+    return float(count), float(period or 60)
+
+
+# when_full: reject -> 429; degrade -> run the cheap path (no LLM call)
+CLASSES = {
+    "chat": {
+        "paths": ("/api/chat", "/api/chat/stream"),
+        "concurrency": int(os.environ.get("ADMISSION_CHAT_CONCURRENCY", "8")),
+        "queue": int(os.environ.get("ADMISSION_CHAT_QUEUE", "16")),
+        "when_full": "reject",
+        "rate": _rate(os.environ.get("RATE_LIMIT_CHAT", "20/60")),
+    },
+    "details": {
+        "paths": ("/api/chat/details",),
+        "concurrency": int(os.environ.get("ADMISSION_DETAILS_CONCURRENCY", "2")),
+        "queue": int(os.environ.get("ADMISSION_DETAILS_QUEUE", "4")),
+        "when_full": "degrade",
+        "rate": _rate(os.environ.get("RATE_LIMIT_DETAILS", "10/60")),
+    },
+    "suggestions": {
+        "paths": ("/api/suggestions",),
+        "concurrency": int(os.environ.get("ADMISSION_SUGGESTIONS_CONCURRENCY", "4")),
+        "queue": int(os.environ.get("ADMISSION_SUGGESTIONS_QUEUE", "0")),
+        "when_full": "degrade",
+        "rate": _rate(os.environ.get("RATE_LIMIT_SUGGESTIONS", "60/60")),
+    },
+    # Submitting is cheap but each batch fans out into many LLM calls
+    "batch": {
+        "paths": ("/api/batch",),
+        "concurrency": int(os.environ.get("ADMISSION_BATCH_CONCURRENCY", "4")),
+        "queue": int(os.environ.get("ADMISSION_BATCH_QUEUE", "8")),
+        "when_full": "reject",
+        "rate": _rate(os.environ.get("RATE_LIMIT_BATCH", "10/3600")),
+    },
+}
+_BY_PATH = {path: name for name, spec in CLASSES.items() for path in spec["paths"]}
+
+_degraded = contextvars.ContextVar("admission_degraded", default=False)
+
+
+def degraded() -> bool:
+    """True when the current request was admitted on the cheap path (skip LLM calls)."""
+    return _degraded.get()
+
+
+class _Gate:
+    """Concurrency limit with a bounded FIFO queue."""
+
+    def __init__(self, name: str, limit: int, queue: int):
+        self.name = name
+        self.limit = limit
+        self.queue = queue
+        self.active = 0
+        self.waiters = []
+        # Smoothed seconds per request, used for Retry-After
+        self.service_time = 1.0
+
+    def _publish(self):
+        metrics.set_gauge("admission_active", self.active, endpoint=self.name)
+        metrics.set_gauge("admission_queue_depth", len(self.waiters), endpoint=self.name)
+
+    def try_acquire(self) -> bool:
+        if self.active < self.limit and not self.waiters:
+            self.active += 1
+            self._publish()
+            return True
+        return False
+
+    def can_queue(self) -> bool:
+        return len(self.waiters) < self.queue
+
+    async def wait(self, timeout: float) -> bool:
+        future = asyncio.get_running_loop().create_future()
+        self.waiters.append(future)
+        self._publish()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+            return True
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                return True  # granted just as the wait expired
+            future.cancel()
+            return False
+        except asyncio.CancelledError:
+            # Client went away; pass on a slot that was already handed over
+            if future.done() and not future.cancelled():
+                self.release()
+            future.cancel()
+            raise
+        finally:
+            if future in self.waiters:
+                self.waiters.remove(future)
+            self._publish()
+
+    def release(self, seconds: float = None):
+        if seconds is not None:
+            self.service_time = 0.8 * self.service_time + 0.2 * seconds
+        # Hand the slot straight to the oldest live waiter
+        while self.waiters:
+            future = self.waiters.pop(0)
+            if not future.done():
+                future.set_result(True)
+                self._publish()
+                return
+        self.active -= 1
+        self._publish()
+
+    def retry_after(self) -> int:
+        backlog = len(self.waiters) + self.active + 1
+        return max(1, math.ceil(self.service_time * backlog / max(self.limit, 1)))
+
+
+_gates = {name: _Gate(name, spec["concurrency"], spec["queue"]) for name, spec in CLASSES.items()}
+_buckets = {}
+_MAX_BUCKETS = 10000
+
+
+def _take_token(endpoint: str, tenant: str, now: float):
+    """Spend one token from the client's bucket; return seconds until one is available if empty."""
+    rate = CLASSES[endpoint]["rate"]
+    if rate is None:
+        return 0
+    capacity, period = rate
+    refill = capacity / period
+    tokens, updated = _buckets.get((endpoint, tenant), (capacity, now))
+    tokens = min(capacity, tokens + (now - updated) * refill)
+    if tokens < 1:
+        _buckets[(endpoint, tenant)] = (tokens, now)
+        return (1 - tokens) / refill
+    _buckets[(endpoint, tenant)] = (tokens - 1, now)
+    if len(_buckets) > _MAX_BUCKETS:
+        # Forget clients whose buckets have refilled anyway
+        for key, (value, at) in list(_buckets.items()):
+            if value + (now - at) * capacity / period >= capacity:
+                del _buckets[key]
+    return 0
+
+
+def status() -> dict:
+    return {
+        name: {
+            "active": gate.active,
+            "limit": gate.limit,
+            "queued": len(gate.waiters),
+            "queue_limit": gate.queue,
+            "service_seconds": round(gate.service_time, 3),
+            "rate": CLASSES[name]["rate"],
+        }
+        for name, gate in _gates.items()
+    }
+
+
+async def _send_429(send, message: str, retry_after: int, reason: str):
+    body = json.dumps({"detail": message, "reason": reason, "retry_after": retry_after}).encode()
+    await send({
+        "type": "http.response.start",
+        "status": 429,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", str(retry_after).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+class AdmissionMiddleware:
+    """ASGI middleware; a slot is held until the response body (or stream) is finished."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        endpoint = _BY_PATH.get(scope.get("path")) if scope["type"] == "http" else None
+        if not ADMISSION_ENABLED or endpoint is None or scope.get("method") != "POST":
+            return await self.app(scope, receive, send)
+
+        request = Request(scope)
+        tenant = usage.tenant_from_headers(request.headers, request.client.host if request.client else None)
+        wait_for_token = _take_token(endpoint, tenant, time.monotonic())
+        if wait_for_token:
+            metrics.inc("admission_total", endpoint=endpoint, result="rate_limited")
+            return await _send_429(send, "Too many requests from this client. Please slow down.",
+                                   math.ceil(wait_for_token), "rate_limited")
+
+        gate = _gates[endpoint]
+        admitted = gate.try_acquire()
+        if not admitted and gate.can_queue():
+            started = time.perf_counter()
+            admitted = await gate.wait(ADMISSION_QUEUE_TIMEOUT)
+            metrics.observe("admission_wait_seconds", time.perf_counter() - started, endpoint=endpoint)
+        if not admitted:
+            if CLASSES[endpoint]["when_full"] == "degrade":
+                metrics.inc("admission_total", endpoint=endpoint, result="degraded")
+                token = _degraded.set(True)
+                try:
+                    return await self.app(scope, receive, send)
+                finally:
+                    _degraded.reset(token)
+            metrics.inc("admission_total", endpoint=endpoint, result="rejected")
+            return await _send_429(send, "The service is busy. Please retry shortly.",
+                                   gate.retry_after(), "overloaded")
+
+        metrics.inc("admission_total", endpoint=endpoint, result="admitted")
+        started = time.perf_counter()
+        released = False
+
+        async def send_and_release(message):
+            nonlocal released
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False) and not released:
+                released = True
+                gate.release(time.perf_counter() - started)
+
+        try:
+            await self.app(scope, receive, send_and_release)
+        finally:
+            if not released:
+                released = True
+                gate.release(time.perf_counter() - started)
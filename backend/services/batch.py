@@ -0,0 +1,369 @@
+# Batch questions. A submitted list becomes one batch_items row per question;
+# worker threads claim rows with FOR UPDATE SKIP LOCKED and answer them
+# through the normal pipeline, so every web worker (or a separate
+# `python -m backend.batch_worker` process) drains the same queue and a
+# large batch never holds an HTTP request open. Without Postgres the queue
+# is kept in memory by this process.
+import os
+import time
+import uuid
+import socket
+import threading
+from collections import deque
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+from backend.services import database, metrics, pipeline, shaping, usage
+
+# Answering threads per process (0 = this process only enqueues)
+BATCH_WORKERS = int(os.environ.get("BATCH_WORKERS", "2"))
+BATCH_MAX_QUESTIONS = int(os.environ.get("BATCH_MAX_QUESTIONS", "200"))
+BATCH_MAX_ATTEMPTS = int(os.environ.get("BATCH_MAX_ATTEMPTS", "2"))
+# Idle workers look for new items this often (items enqueued by this process wake them at once)
+BATCH_POLL_SECONDS = float(os.environ.get("BATCH_POLL_SECONDS", "2"))
+# An item claimed longer ago than this is assumed lost with its worker and retried
+BATCH_LOCK_TIMEOUT = int(os.environ.get("BATCH_LOCK_TIMEOUT", "300"))
+BATCH_RETENTION_DAYS = int(os.environ.get("BATCH_RETENTION_DAYS", "7"))
+
+DDL = """
+CREATE TABLE IF NOT EXISTS batch_jobs (
+    id TEXT PRIMARY KEY,
+    tenant TEXT,
+    language TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    finished_at TIMESTAMPTZ
+);
+CREATE TABLE IF NOT EXISTS batch_items (
+    id BIGSERIAL PRIMARY KEY,
+    batch_id TEXT NOT NULL REFERENCES batch_jobs (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    locked_by TEXT,
+    locked_at TIMESTAMPTZ,
+    response TEXT,
+    sql TEXT,
+    data JSONB,
+    row_count INTEGER,
+    error TEXT,
+    duration_ms REAL,
+    finished_at TIMESTAMPTZ,
+    UNIQUE (batch_id, position)
+);
+CREATE INDEX IF NOT EXISTS batch_items_pending_idx ON batch_items (id) WHERE status IN ('queued', 'running')
+"""
+
+ITEM_COLUMNS = ["position", "question", "status", "attempts", "response", "sql", "row_count", "error", "duration_ms"]
+
+_CLAIM_SQL = """
+    UPDATE batch_items
+    SET status = 'running', attempts = attempts + 1, locked_by = %s, locked_at = NOW()
+    WHERE id = (
+        SELECT id FROM batch_items
+        WHERE status = 'queued'
+           OR (status = 'running' AND locked_at < NOW() - make_interval(secs => %s))
+        ORDER BY id
+        FOR UPDATE SKIP LOCKED
+        LIMIT 1
+    )
+    RETURNING id, batch_id, position, question, attempts,
+              (SELECT language FROM batch_jobs WHERE batch_jobs.id = batch_items.batch_id) AS language,
+              (SELECT tenant FROM batch_jobs WHERE batch_jobs.id = batch_items.batch_id) AS tenant
+"""
+
+_COMPLETE_SQL = """
+    UPDATE batch_items
+    SET status = %s, response = %s, sql = %s, data = %s, row_count = %s, error = %s,
+        duration_ms = %s, finished_at = NOW(), locked_by = NULL
+    WHERE id = %s AND locked_by = %s
+"""
+
+_FINISH_JOB_SQL = """
+    UPDATE batch_jobs SET status = 'done', finished_at = NOW()
+    WHERE id = %s AND status = 'queued'
+      AND NOT EXISTS (
+          SELECT 1 FROM batch_items WHERE batch_id = %s AND status IN ('queued', 'running')
+      )
+"""
+
+_worker_id = f"{socket.gethostname()}:{os.getpid()}"
+_wakeup = threading.Event()
+_lock = threading.Lock()
+_memory = {"jobs": {}, "queue": deque()}
+_workers = []
+_stats = {"answered": 0, "failed": 0, "retried": 0}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def submit(questions: list, language: str = "en", tenant: str = None) -> dict:
+    """Enqueue a batch; returns its id and size. Raises ValueError for an empty or oversized list."""
+    questions = [q.strip() for q in questions if q and q.strip()]
+    if not questions:
+        raise ValueError("No questions given")
+    if len(questions) > BATCH_MAX_QUESTIONS:
+        raise ValueError(f"At most {BATCH_MAX_QUESTIONS} questions per batch ({len(questions)} given)")
+    batch_id = uuid.uuid4().hex
+    if database.db_available:
+        with metrics.stage("batch_enqueue", questions=len(questions)), database.get_cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO batch_jobs (id, tenant, language, total) VALUES (%s, %s, %s, %s)",
+                (batch_id, tenant, language, len(questions))
+            )
+            execute_values(
+                cursor, "INSERT INTO batch_items (batch_id, position, question) VALUES %s",
+                [(batch_id, position, question) for position, question in enumerate(questions)]
+            )
+    else:
+        with _lock:
+            _memory["jobs"][batch_id] = {
+                "id": batch_id, "tenant": tenant, "language": language, "total": len(questions),
+                "status": "queued", "created_at": _now(), "finished_at": None,
+                "items": [
+                    {"position": position, "question": question, "status": "queued", "attempts": 0,
+                     "response": None, "sql": None, "data": None, "row_count": None, "error": None,
+                     "duration_ms": None}
+                    for position, question in enumerate(questions)
+                ],
+            }
+            _memory["queue"].extend((batch_id, position) for position in range(len(questions)))
+    metrics.inc("batch_questions_total", len(questions), result="queued")
+    _wakeup.set()
+    return {"id": batch_id, "total": len(questions), "status": "queued"}
+
+
+def _claim():
+    """Take the next pending item (or None)."""
+    if database.db_available:
+        with database.get_cursor() as cursor:
+            cursor.execute(_CLAIM_SQL, (_worker_id, BATCH_LOCK_TIMEOUT))
+            row = cursor.fetchone()
+        return dict(row) if row else None
+    with _lock:
+        while _memory["queue"]:
+            batch_id, position = _memory["queue"].popleft()
+            job = _memory["jobs"].get(batch_id)
+            if job is None or job["items"][position]["status"] != "queued":
+                continue
+            item = job["items"][position]
+            item["status"] = "running"
+            item["attempts"] += 1
+            return {"id": (batch_id, position), "batch_id": batch_id, "position": position,
+                    "question": item["question"], "attempts": item["attempts"],
+                    "language": job["language"], "tenant": job["tenant"]}
+    return None
+
+
+def _complete(claimed: dict, status: str, result: dict = None, error: str = None, duration_ms: float = None):
+    result = result or {}
+    data = result.get("data")
+    if database.db_available:
+        with database.get_cursor() as cursor:
+            cursor.execute(_COMPLETE_SQL, (
+                status, result.get("response"), result.get("sql"),
+                shaping.dumps(data).decode() if data is not None else None,
+                len(data) if data is not None else None, error, duration_ms,
+                claimed["id"], _worker_id
+            ))
+            cursor.execute(_FINISH_JOB_SQL, (claimed["batch_id"], claimed["batch_id"]))
+        return
+    with _lock:
+        job = _memory["jobs"].get(claimed["batch_id"])
+        if job is None:
+            return
+        job["items"][claimed["position"]].update(
+            status=status, response=result.get("response"), sql=result.get("sql"), data=data,
+            row_count=len(data) if data is not None else None, error=error, duration_ms=duration_ms
+        )
+        if job["status"] == "queued" and all(i["status"] not in ("queued", "running") for i in job["items"]):
+            job.update(status="done", finished_at=_now())
+
+
+def _requeue(claimed: dict, error: str):
+    if database.db_available:
+        with database.get_cursor() as cursor:
+            cursor.execute(
+                "UPDATE batch_items SET status = 'queued', error = %s, locked_by = NULL WHERE id = %s AND locked_by = %s",
+                (error, claimed["id"], _worker_id)
+            )
+        return
+    with _lock:
+        job = _memory["jobs"].get(claimed["batch_id"])
+        if job is not None:
+            job["items"][claimed["position"]].update(status="queued", error=error)
+            _memory["queue"].append((claimed["batch_id"], claimed["position"]))
+
+
+def process_one() -> bool:
+    """Answer one queued question; False when the queue is empty."""
+    claimed = _claim()
+    if claimed is None:
+        return False
+    if claimed["attempts"] > BATCH_MAX_ATTEMPTS:
+        # Reclaimed after its lock expired too often: the workers holding it died or hung
+        _stats["failed"] += 1
+        metrics.inc("batch_questions_total", result="failed")
+        _complete(claimed, "failed", error=f"Gave up after {BATCH_MAX_ATTEMPTS} attempts")
+        return True
+
+    # Each question is accounted and budgeted like a request from the submitter
+    token = usage.begin_request("batch", claimed["tenant"] or "system")
+    started = time.perf_counter()
+    try:
+        result = pipeline.answer_question(claimed["question"], claimed["language"])
+    except Exception as e:
+        if claimed["attempts"] < BATCH_MAX_ATTEMPTS:
+            _stats["retried"] += 1
+            _requeue(claimed, str(e))
+        else:
+            _stats["failed"] += 1
+            metrics.inc("batch_questions_total", result="failed")
+            _complete(claimed, "failed", error=str(e),
+                      duration_ms=round((time.perf_counter() - started) * 1000, 1))
+        return True
+    finally:
+        usage.end_request(token)
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    metrics.observe("batch_question_seconds", duration_ms / 1000)
+    # The pipeline answers failed queries with an explanation instead of raising
+    failed = bool(result.get("sql")) and result.get("data") is None
+    _stats["failed" if failed else "answered"] += 1
+    metrics.inc("batch_questions_total", result="failed" if failed else "answered")
+    _complete(claimed, "failed" if failed else "done", result,
+              error=result.get("response") if failed else None, duration_ms=duration_ms)
+    return True
+
+
+def _worker_loop(index: int):
+    last_purge = 0.0
+    while True:
+        try:
+            if index == 0 and time.monotonic() - last_purge > 3600:
+                last_purge = time.monotonic()
+                purge()
+            while process_one():
+                pass
+        except Exception as e:
+            print(f"⚠ Batch worker {index} error: {e}")
+            time.sleep(BATCH_POLL_SECONDS)
+        _wakeup.wait(BATCH_POLL_SECONDS)
+        _wakeup.clear()
+
+
+def start_workers(count: int = None):
+    """Start the answering threads (registered with startup.after_load)."""
+    count = BATCH_WORKERS if count is None else count
+    with _lock:
+        if _workers or count <= 0:
+            return
+        for index in range(count):
+            thread = threading.Thread(target=_worker_loop, args=(index,), name=f"batch-worker-{index}", daemon=True)
+            thread.start()
+            _workers.append(thread)
+    print(f"✓ {count} batch worker(s) started ({'postgres' if database.db_available else 'memory'} queue)")
+
+
+def purge() -> int:
+    """Delete batches older than BATCH_RETENTION_DAYS."""
+    if database.db_available:
+        with database.get_cursor() as cursor:
+            cursor.execute(
+                "DELETE FROM batch_jobs WHERE created_at < NOW() - make_interval(days => %s)",
+                (BATCH_RETENTION_DAYS,)
+            )
+            return cursor.rowcount
+    cutoff = time.time() - BATCH_RETENTION_DAYS * 86400
+    with _lock:
+        old = [i for i, job in _memory["jobs"].items() if job["created_at"].timestamp() < cutoff]
+        for batch_id in old:
+            del _memory["jobs"][batch_id]
+    return len(old)
+
+
+def cancel(batch_id: str) -> bool:
+    """Drop the batch's questions that have not started; False if the batch does not exist."""
+    if database.db_available:
+        with database.get_cursor() as cursor:
+            cursor.execute(
+                "UPDATE batch_jobs SET status = 'cancelled', finished_at = NOW() WHERE id = %s AND status = 'queued'",
+                (batch_id,)
+            )
+            cursor.execute(
+                "UPDATE batch_items SET status = 'cancelled' WHERE batch_id = %s AND status = 'queued'",
+                (batch_id,)
+            )
+            cursor.execute("SELECT 1 FROM batch_jobs WHERE id = %s", (batch_id,))
+            return cursor.fetchone() is not None
+    with _lock:
+        job = _memory["jobs"].get(batch_id)
+        if job is None:
+            return False
+        if job["status"] == "queued":
+            job.update(status="cancelled", finished_at=_now())
+        for item in job["items"]:
+            if item["status"] == "queued":
+                item["status"] = "cancelled"
+        return True
+
+
+def _summary(job: dict, items: list) -> dict:
+    counts = {}
+    for item in items:
+        counts[item["status"]] = counts.get(item["status"], 0) + 1
+    finished = sum(counts.get(s, 0) for s in ("done", "failed", "cancelled"))
+    status = job["status"]
+    if status == "queued" and finished + counts.get("running", 0) > 0:
+        status = "running"
+    return {
+        "id": job["id"],
+        "status": status,
+        "language": job["language"],
+        "total": job["total"],
+        "counts": counts,
+        "progress": round(finished / job["total"], 3) if job["total"] else 1.0,
+        "created_at": job["created_at"].isoformat(),
+        "finished_at": job["finished_at"].isoformat() if job["finished_at"] else None,
+    }
+
+
+def get(batch_id: str, include_data: bool = False) -> dict:
+    """Batch status with its items (result rows only with include_data), or None."""
+    columns = ITEM_COLUMNS + (["data"] if include_data else [])
+    if database.db_available:
+        with database.get_cursor() as cursor:
+            cursor.execute(
+                "SELECT id, language, total, status, created_at, finished_at FROM batch_jobs WHERE id = %s",
+                (batch_id,)
+            )
+            job = cursor.fetchone()
+            if job is None:
+                return None
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM batch_items WHERE batch_id = %s ORDER BY position",
+                (batch_id,)
+            )
+            items = [dict(row) for row in cursor.fetchall()]
+    else:
+        with _lock:
+            job = _memory["jobs"].get(batch_id)
+            if job is None:
+                return None
+            items = [{c: item[c] for c in columns} for item in job["items"]]
+    return {**_summary(job, items), "items": items}
+
+
+def stats() -> dict:
+    return {
+        "workers": len(_workers),
+        "worker_id": _worker_id,
+        "queue": "postgres" if database.db_available else "memory",
+        **_stats,
+    }
+
@@ -0,0 +1,283 @@
+# Shared cache tier for generated SQL, query results and rendered answers.
+# Entries live outside the worker process so a question answered by one
+# uvicorn worker is a hit in all of them: an UNLOGGED Postgres table when the
+# database is up, otherwise a SQLite file in /dev/shm (memory-mapped, WAL mode,
+# shared by every process on the host, no extra service). Entries are tagged
+# with the data version and silently miss once the data is reloaded.
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import tempfile
+import threading
+from datetime import date, datetime
+from decimal import Decimal
+
+from backend.services import metrics, database
+from backend.services.resultset import ResultSet, Row
+
+# auto (Postgres when available, else local), postgres, local or off
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "auto").lower()
+_SHM_DIR = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+CACHE_PATH = os.environ.get("CACHE_PATH", os.path.join(_SHM_DIR, "procbot-cache.sqlite"))
+
+# TTL in seconds per namespace
+CACHE_TTLS = {
+    "sql": int(os.environ.get("CACHE_SQL_TTL", "86400")),
+    "result": int(os.environ.get("CACHE_RESULT_TTL", "3600")),
+    "answer": int(os.environ.get("CACHE_ANSWER_TTL", "3600")),
+}
+# Generated SQL depends on the question, not the data, so it survives reloads
+UNVERSIONED_NAMESPACES = {"sql"}
+
+CACHE_MAX_BYTES = int(os.environ.get("CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get("CACHE_MAX_ENTRY_BYTES", str(2 * 1024 * 1024)))
+# Expired/stale/over-budget entries are pruned every N writes per worker
+CACHE_EVICT_EVERY = int(os.environ.get("CACHE_EVICT_EVERY", "200"))
+
+POSTGRES_DDL = """
+CREATE UNLOGGED TABLE IF NOT EXISTS app_cache (
+    cache_key TEXT PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    data_version TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size_bytes INTEGER NOT NULL,
+    created_at DOUBLE PRECISION NOT NULL,
+    expires_at DOUBLE PRECISION NOT NULL
+)
+"""
+
+_SQLITE_DDL = POSTGRES_DDL.replace("UNLOGGED ", "").replace("DOUBLE PRECISION", "REAL")
+
+# Rows over the size budget, newest kept first
+_EVICT_SQL = """
+DELETE FROM app_cache WHERE cache_key IN (
+    SELECT cache_key FROM (
+        SELECT cache_key, SUM(size_bytes) OVER (ORDER BY created_at DESC, cache_key) AS running
+        FROM app_cache
+    ) ranked WHERE running > {limit}
+)
+"""
+
+_writes = {"count": 0}
+
+
+def _default(value):
+    # Same conversions the API applies when it serialises rows to JSON
+    if isinstance(value, ResultSet):
+        return value.to_json()
+    if isinstance(value, Row):
+        return dict(value)
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def key(*parts) -> str:
+    """Stable cache key for any JSON-serialisable parts."""
+    payload = json.dumps(parts, default=_default, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class _PostgresStore:
+    name = "postgres"
+    placeholder = "%s"
+
+    def execute(self, sql: str, params=(), fetch: bool = False):
+        with database.get_cursor() as cursor:
+            cursor.execute(sql, params)
+            if fetch:
+                return [tuple(row.values()) for row in cursor.fetchall()]
+            return cursor.rowcount
+
+
+class _LocalStore:
+    name = "local"
+    placeholder = "?"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        # Connections must not cross a fork; each worker opens its own
+        if self._conn is None or self._pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = OFF")
+            conn.execute(f"PRAGMA mmap_size = {CACHE_MAX_BYTES}")
+            conn.execute(_SQLITE_DDL)
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def execute(self, sql: str, params=(), fetch: bool = False):
+        with self._lock:
+            cursor = self._connection().execute(sql, params)
+            if fetch:
+                return cursor.fetchall()
+            return cursor.rowcount
+
+
+_postgres = _PostgresStore()
+_local = _LocalStore(CACHE_PATH)
+
+
+def _store():
+    if CACHE_BACKEND == "off":
+        return None
+    if CACHE_BACKEND == "postgres":
+        return _postgres if database.db_available else None
+    if CACHE_BACKEND == "local":
+        return _local
+    return _postgres if database.db_available else _local
+
+
+def _version(namespace: str) -> str:
+    if namespace in UNVERSIONED_NAMESPACES:
+        return "*"
+    return database.get_data_version()
+
+
+def _cache_key(namespace: str, entry_key: str) -> str:
+    return f"{namespace}:{entry_key}"
+
+
+def get(namespace: str, entry_key: str):
+    """Cached value for the current data version, or None."""
+    store = _store()
+    if store is None:
+        return None
+    p = store.placeholder
+    try:
+        rows = store.execute(
+            f"SELECT value FROM app_cache WHERE cache_key = {p} AND data_version = {p} AND expires_at > {p}",
+            (_cache_key(namespace, entry_key), _version(namespace), time.time()),
+            fetch=True
+        )
+    except Exception as e:
+        print(f"⚠ Cache read failed ({store.name}): {e}")
+        metrics.inc("cache_errors_total", backend=store.name, op="get")
+        return None
+    hit = bool(rows)
+    metrics.record_cache(namespace, hit)
+    return json.loads(rows[0][0]) if hit else None
+
+
+def put(namespace: str, entry_key: str, value, ttl: int = None):
+    store = _store()
+    if store is None:
+        return
+    payload = json.dumps(value, default=_default, ensure_ascii=False)
+    size = len(payload.encode())
+    if size > CACHE_MAX_ENTRY_BYTES:
+        metrics.inc("cache_skipped_total", cache=namespace, reason="too_large")
+        return
+    now = time.time()
+    p = store.placeholder
+    try:
+        store.execute(
+            f"""INSERT INTO app_cache (cache_key, namespace, data_version, value, size_bytes, created_at, expires_at)
+                VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    data_version = EXCLUDED.data_version, value = EXCLUDED.value,
+                    size_bytes = EXCLUDED.size_bytes, created_at = EXCLUDED.created_at,
+                    expires_at = EXCLUDED.expires_at""",
+            (_cache_key(namespace, entry_key), namespace, _version(namespace), payload, size,
+             now, now + (ttl or CACHE_TTLS.get(namespace, 3600)))
+        )
+    except Exception as e:
+        print(f"⚠ Cache write failed ({store.name}): {e}")
+        metrics.inc("cache_errors_total", backend=store.name, op="put")
+        return
+    _writes["count"] += 1
+    if _writes["count"] % CACHE_EVICT_EVERY == 0:
+        evict()
+
+
+def claim(namespace: str, entry_key: str, value, ttl: int = None) -> bool:
+    """Atomically take a one-off job for the current data version; False if another worker holds it.
+
+    A single upsert that only overwrites an expired or stale claim, so exactly one
+    concurrent caller sees a row written. Without a cache every caller wins.
+    """
+    store = _store()
+    if store is None:
+        return True
+    payload = json.dumps(value, default=_default, ensure_ascii=False)
+    now = time.time()
+    p = store.placeholder
+    try:
+        written = store.execute(
+            f"""INSERT INTO app_cache (cache_key, namespace, data_version, value, size_bytes, created_at, expires_at)
+                VALUES ({p}, {p}, {p}, {p}, {p}, {p}, {p})
+                ON CONFLICT (cache_key) DO UPDATE SET
+                    data_version = EXCLUDED.data_version, value = EXCLUDED.value,
+                    size_bytes = EXCLUDED.size_bytes, created_at = EXCLUDED.created_at,
+                    expires_at = EXCLUDED.expires_at
+                WHERE app_cache.expires_at <= {p} OR app_cache.data_version <> EXCLUDED.data_version""",
+            (_cache_key(namespace, entry_key), namespace, _version(namespace), payload, len(payload.encode()),
+             now, now + (ttl or CACHE_TTLS.get(namespace, 3600)), now)
+        )
+    except Exception as e:
+        print(f"⚠ Cache claim failed ({store.name}): {e}")
+        metrics.inc("cache_errors_total", backend=store.name, op="claim")
+        return True
+    return written > 0
+
+
+def evict() -> int:
+    """Drop expired entries, entries from older data versions, then the oldest over CACHE_MAX_BYTES."""
+    store = _store()
+    if store is None:
+        return 0
+    p = store.placeholder
+    try:
+        removed = store.execute(
+            f"DELETE FROM app_cache WHERE expires_at <= {p} OR (data_version <> '*' AND data_version <> {p})",
+            (time.time(), database.get_data_version())
+        )
+        removed += store.execute(_EVICT_SQL.format(limit=int(CACHE_MAX_BYTES)))
+    except Exception as e:
+        print(f"⚠ Cache eviction failed ({store.name}): {e}")
+        metrics.inc("cache_errors_total", backend=store.name, op="evict")
+        return 0
+    if removed:
+        metrics.inc("cache_evictions_total", removed, backend=store.name)
+    return removed
+
+
+def clear(namespace: str = None) -> int:
+    store = _store()
+    if store is None:
+        return 0
+    if namespace:
+        return store.execute(f"DELETE FROM app_cache WHERE namespace = {store.placeholder}", (namespace,))
+    return store.execute("DELETE FROM app_cache")
+
+
+def stats() -> dict:
+    store = _store()
+    if store is None:
+        return {"backend": "off"}
+    rows = store.execute(
+        "SELECT namespace, COUNT(*), COALESCE(SUM(size_bytes), 0) FROM app_cache GROUP BY namespace",
+        fetch=True
+    )
+    namespaces = {name: {"entries": count, "bytes": size} for name, count, size in rows}
+    total = sum(ns["bytes"] for ns in namespaces.values())
+    metrics.set_gauge("cache_bytes", total, backend=store.name)
+    return {
+        "backend": store.name,
+        "path": CACHE_PATH if store is _local else None,
+        "data_version": database.get_data_version(),
+        "max_bytes": CACHE_MAX_BYTES,
+        "bytes": total,
+        "namespaces": namespaces,
+        "ttls": CACHE_TTLS,
+    }
@@ -0,0 +1,121 @@
+# Negotiated response compression (brotli when the optional `brotli` package
+# is installed and the client accepts it, else gzip). Server-sent event
+# streams and already-encoded or small bodies pass through untouched.
+import os
+import zlib
+
+from backend.services import metrics
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESSION_ENABLED = os.environ.get("COMPRESSION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Bodies smaller than this are sent as-is (compression would not pay off)
+COMPRESSION_MIN_BYTES = int(os.environ.get("COMPRESSION_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("COMPRESSION_BROTLI_QUALITY", "5"))
+
+_SKIP_TYPES = ("text/event-stream", "image/", "audio/", "video/", "application/zip", "application/gzip")
+
+
+def negotiate(accept_encoding: str):
+    """Best supported encoding in an Accept-Encoding header, or None."""
+    offered = {}
+    for part in accept_encoding.lower().split(","):
+        name, _, params = part.strip().partition(";")
+        quality = 1.0
+        if params.strip().startswith("q="):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        offered[name.strip()] = quality
+    for encoding in (["br"] if brotli else []) + ["gzip"]:
+        if offered.get(encoding, offered.get("*", 0)) > 0:
+            return encoding
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._impl = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._impl = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == "br":
+            return self._impl.process(data) + self._impl.flush()
+        return self._impl.compress(data) + self._impl.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._impl.finish() if self.encoding == "br" else self._impl.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware: compresses response bodies per Accept-Encoding."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            return await self.app(scope, receive, send)
+        headers = dict(scope.get("headers") or [])
+        encoding = negotiate(headers.get(b"accept-encoding", b"").decode("latin-1"))
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        state = {"start": None, "compressor": None, "passthrough": False, "raw": 0, "sent": 0}
+
+        async def send_compressed(message):
+            if message["type"] == "http.response.start":
+                state["start"] = message
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                return await send(message)
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if state["compressor"] is None:
+                start = state["start"]
+                response_headers = {k.lower(): v for k, v in start["headers"]}
+                content_type = response_headers.get(b"content-type", b"").decode("latin-1")
+                if (b"content-encoding" in response_headers
+                        or content_type.startswith(_SKIP_TYPES)
+                        or (not more and len(body) < COMPRESSION_MIN_BYTES)):
+                    state["passthrough"] = True
+                    await send(start)
+                    return await send(message)
+                state["compressor"] = _Compressor(encoding)
+                vary = response_headers.get(b"vary")
+                vary = vary + b", Accept-Encoding" if vary else b"Accept-Encoding"
+                start["headers"] = [
+                    (k, v) for k, v in start["headers"] if k.lower() not in (b"content-length", b"vary")
+                ] + [(b"content-encoding", encoding.encode()), (b"vary", vary)]
+                if not more:
+                    compressed = state["compressor"].compress(body) + state["compressor"].finish()
+                    start["headers"].append((b"content-length", str(len(compressed)).encode()))
+                    await send(start)
+                    _record(encoding, len(body), len(compressed))
+                    return await send({"type": "http.response.body", "body": compressed})
+                await send(start)
+
+            compressed = state["compressor"].compress(body)
+            if not more:
+                compressed += state["compressor"].finish()
+            state["raw"] += len(body)
+            state["sent"] += len(compressed)
+            if not more:
+                _record(encoding, state["raw"], state["sent"])
+            await send({"type": "http.response.body", "body": compressed, "more_body": more})
+
+        await self.app(scope, receive, send_compressed)
+
+
+def _record(encoding: str, raw: int, sent: int):
+    metrics.inc("response_bytes_total", raw, encoding=encoding, kind="uncompressed")
+    metrics.inc("response_bytes_total", sent, encoding=encoding, kind="compressed")
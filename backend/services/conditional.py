@@ -0,0 +1,61 @@
+# Conditional requests keyed on the data version: responses that only depend
+# on the loaded data carry an ETag/Last-Modified, and a client that already
+# has the current representation gets a 304 without the query being run.
+import hashlib
+import json
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from backend.services import database, metrics
+
+
+def etag(*parts) -> str:
+    """Weak ETag for the current data version plus whatever else shapes the response.
+
+    Weak because the bytes differ with Content-Encoding; None before any data is loaded.
+    """
+    version = database.get_data_version()
+    if version in (None, "none"):
+        return None
+    digest = hashlib.sha1(json.dumps([version, *parts], default=str).encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def headers(tag: str) -> dict:
+    if tag is None:
+        return {}
+    result = {"ETag": tag, "Cache-Control": "no-cache"}
+    modified = database.get_data_modified()
+    if modified is not None:
+        result["Last-Modified"] = formatdate(modified, usegmt=True)
+    return result
+
+
+def _matches(request: Request, tag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        # Weak comparison: W/"x" matches "x"
+        candidates = [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+        return "*" in candidates or tag.removeprefix("W/") in candidates
+    if_modified_since = request.headers.get("if-modified-since")
+    modified = database.get_data_modified()
+    if if_modified_since and modified is not None:
+        try:
+            return int(modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified(request: Request, tag: str):
+    """A 304 response when the client's copy is current, else None."""
+    conditional = "if-none-match" in request.headers or "if-modified-since" in request.headers
+    if tag is None or not conditional:
+        return None
+    if not _matches(request, tag):
+        metrics.inc("conditional_requests_total", route=request.url.path, result="modified")
+        return None
+    metrics.inc("conditional_requests_total", route=request.url.path, result="not_modified")
+    return Response(status_code=304, headers=headers(tag))
@@ -1,122 +1,269 @@
 import os
+import time
+import zlib
+import threading
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.pool import ThreadedConnectionPool
+from psycopg2.extras import RealDictCursor, execute_values
 from contextlib import contextmanager
+from itertools import islice
+
+from backend.services import metrics, embedded_engine, schema, cache, query_log, text_search, batch
+from backend.services.resultset import ResultSet
 
 DATABASE_URL = os.environ.get("DATABASE_URL")
 db_available = False
 
+# auto: Postgres, falling back to the embedded engine when it is unavailable
+# postgres: Postgres only
+# embedded: always read from the embedded in-process engine
+READ_ENGINE = os.environ.get("READ_ENGINE", "auto").lower()
+
+PROCUREMENT_TABLE_DDL = schema.create_table_sql()
+
+# Tables created before project_status held text stored it as INTEGER
+PROJECT_STATUS_MIGRATION = """
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'procurement_records' AND column_name = 'project_status'
+                 AND data_type = 'integer') THEN
+        ALTER TABLE procurement_records ALTER COLUMN project_status TYPE TEXT;
+    END IF;
+END $$
+"""
+
+APP_META_DDL = """
+CREATE TABLE IF NOT EXISTS app_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+)
+"""
+
+# Any write to procurement_records, including ones made outside this app,
+# moves the data version (once per statement, so batched inserts stay cheap).
+# Created only when missing, so restarting workers take no DDL locks on the
+# table; the advisory lock serialises workers starting together.
+DATA_VERSION_TRIGGER_LOCK = "SELECT pg_advisory_xact_lock(hashtext('procurement_data_version'))"
+DATA_VERSION_TRIGGER_DDL = """
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger
+                   WHERE tgname = 'procurement_data_version'
+                     AND tgrelid = 'procurement_records'::regclass) THEN
+        CREATE OR REPLACE FUNCTION procurement_bump_data_version() RETURNS trigger AS $fn$
+        BEGIN
+            INSERT INTO app_meta (key, value)
+            VALUES ('data_version', 'v' || to_hex((extract(epoch FROM clock_timestamp()) * 1000000000)::bigint))
+            ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW();
+            RETURN NULL;
+        END
+        $fn$ LANGUAGE plpgsql;
+        CREATE TRIGGER procurement_data_version
+            AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON procurement_records
+            FOR EACH STATEMENT EXECUTE FUNCTION procurement_bump_data_version();
+    END IF;
+END $$
+"""
+
+# How long a worker trusts its copy of the Postgres data version before
+# re-reading it (bounds how stale another worker's reload can look)
+DATA_VERSION_CHECK_SECONDS = float(os.environ.get("DATA_VERSION_CHECK_SECONDS", "5"))
+_data_version = {"value": None, "checked": 0.0, "modified": None}
+
+# Connections are pooled per process: DB_POOL_MIN are opened up front and
+# kept open when idle, extra ones up to DB_POOL_MAX are closed after use.
+# Callers beyond DB_POOL_MAX wait up to DB_POOL_TIMEOUT seconds.
+DB_POOL_MIN = int(os.environ.get("DB_POOL_MIN", "4"))
+DB_POOL_MAX = int(os.environ.get("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", "10"))
+
+_pool_lock = threading.Lock()
+_pool = {"pool": None, "slots": threading.BoundedSemaphore(DB_POOL_MAX), "in_use": 0, "waiting": 0,
+         "timeouts": 0, "discarded": 0}
+
+def _get_pool() -> ThreadedConnectionPool:
+    if _pool["pool"] is None:
+        with _pool_lock:
+            if _pool["pool"] is None:
+                with metrics.stage("db_connect"):
+                    _pool["pool"] = ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, DATABASE_URL)
+    return _pool["pool"]
+
+def _pool_count(field: str, amount: int):
+    with _pool_lock:
+        _pool[field] += amount
+    metrics.set_gauge(f"db_pool_{field}", _pool[field])
+
 def get_connection():
+    """Borrow a pooled connection; hand it back with release_connection()."""
     if not DATABASE_URL:
         raise Exception("DATABASE_URL not configured")
-    return psycopg2.connect(DATABASE_URL)
+    _pool_count("waiting", 1)
+    try:
+        acquired = _pool["slots"].acquire(timeout=DB_POOL_TIMEOUT)
+    finally:
+        _pool_count("waiting", -1)
+    if not acquired:
+        _pool_count("timeouts", 1)
+        raise Exception(f"No database connection available within {DB_POOL_TIMEOUT:.0f}s")
+    try:
+        conn = _get_pool().getconn()
+    except Exception:
+        _pool["slots"].release()
+        raise
+    _pool_count("in_use", 1)
+    return conn
+
+def release_connection(conn, broken: bool = False):
+    # A connection that failed mid-transaction may be unusable; drop it
+    # rather than hand it to the next caller
+    broken = broken or conn.closed != 0
+    if broken:
+        _pool_count("discarded", 1)
+    try:
+        _get_pool().putconn(conn, close=broken)
+    finally:
+        _pool_count("in_use", -1)
+        _pool["slots"].release()
+
+def pool_status() -> dict:
+    pool = _pool["pool"]
+    with _pool_lock:
+        return {
+            "max": DB_POOL_MAX,
+            "open": len(pool._pool) + len(pool._used) if pool else 0,
+            "in_use": _pool["in_use"],
+            "waiting": _pool["waiting"],
+            "timeouts": _pool["timeouts"],
+            "discarded": _pool["discarded"],
+        }
 
 @contextmanager
-def get_cursor():
+def get_cursor(cursor_factory=RealDictCursor):
     conn = get_connection()
+    broken = False
+    cursor = None
     try:
-        cursor = conn.cursor(cursor_factory=RealDictCursor)
+        cursor = conn.cursor(cursor_factory=cursor_factory)
         yield cursor
         conn.commit()
     except Exception as e:
-        conn.rollback()
+        try:
+            conn.rollback()
+        except psycopg2.Error:
+            broken = True
         raise e
     finally:
-        cursor.close()
-        conn.close()
+        if cursor is not None:
+            cursor.close()
+        release_connection(conn, broken)
 
 def init_database():
     global db_available
     try:
         with get_cursor() as cursor:
-            cursor.execute("""
-            CREATE TABLE IF NOT EXISTS procurement_records (
-                id SERIAL PRIMARY KEY,
-                year INTEGER,
-                quarter TEXT,
-                month TEXT,
-                period TEXT,
-                date TEXT,
-                pr_number TEXT UNIQUE,
-                description TEXT,
-                department TEXT,
-                contact_person TEXT,
-                assign_to TEXT,
-                budget REAL,
-                budget_q1 REAL,
-                budget_q2 REAL,
-                budget_q3 REAL,
-                budget_q4 REAL,
-                source_method TEXT,
-                status TEXT,
-                supplier_details TEXT,
-                supplier_rating TEXT,
-                local_content_percentage REAL,
-                pr_approval_scope_input TEXT,
-                approving_authority TEXT,
-                planned TEXT,
-                target_date TEXT,
-                actual_project_start TEXT,
-                sla INTEGER,
-                note TEXT,
-                review_approval_scope_eval REAL,
-                floating REAL,
-                tender_submit_by_vendor REAL,
-                evaluation REAL,
-                award_approval REAL,
-                contract_and_po REAL,
-                pr_approval_scope_input_pd REAL,
-                review_approval_scope_eval_pd REAL,
-                floating_pd REAL,
-                tender_submit_by_vendor_pd REAL,
-                evaluation_pd REAL,
-                award_approval_pd REAL,
-                contract_and_po_pd REAL,
-                total_days_pd REAL,
-                review_approval_scope_eval_ad REAL,
-                floating_ad REAL,
-                tender_submit_by_vendor_ad REAL,
-                evaluation_ad REAL,
-                award_approval_ad REAL,
-                contract_and_po_ad REAL,
-                total_days_ad REAL,
-                review_approval_scope_eval_pd_sla REAL,
-                floating_pd_sla REAL,
-                tender_submit_by_vendor_pd_sla REAL,
-                evaluation_pd_sla REAL,
-                award_approval_pd_sla REAL,
-                contract_and_po_pd_sla REAL,
-                review_approval_scope_eval_ad_sla REAL,
-                floating_ad_sla REAL,
-                tender_submit_by_vendor_ad_sla REAL,
-                evaluation_ad_sla REAL,
-                award_approval_ad_sla REAL,
-                contract_and_po_ad_sla REAL,
-                review_approval_scope_eval_diff_sla REAL,
-                floating_diff_sla REAL,
-                tender_submit_by_vendor_diff_sla REAL,
-                evaluation_diff_sla REAL,
-                award_approval_diff_sla REAL,
-                contract_and_po_diff_sla REAL,
-                project_status INTEGER,
-                risk TEXT,
-                duration INTEGER,
-                last_status_date TEXT,
-                status_duration INTEGER,
-                status_sla INTEGER,
-                status_co TEXT,
-                escalate_48h TEXT,
-                ceo_escalation TEXT
-            )
-            """)
+            cursor.execute(PROCUREMENT_TABLE_DDL)
+            cursor.execute(PROJECT_STATUS_MIGRATION)
+            cursor.execute(APP_META_DDL)
+            cursor.execute(cache.POSTGRES_DDL)
+            cursor.execute(query_log.DDL)
+            cursor.execute(batch.DDL)
         db_available = True
         print("✓ Database connected and initialized successfully")
+        init_data_version_trigger()
+        init_search_indexes()
     except Exception as e:
         db_available = False
         print(f"⚠ Database connection failed: {e}")
         print("⚠ Application will run without database functionality")
 
+def init_data_version_trigger():
+    """Create the data-version trigger if missing; a failure here never disables the database."""
+    try:
+        with get_cursor() as cursor:
+            cursor.execute(DATA_VERSION_TRIGGER_LOCK)
+            cursor.execute(DATA_VERSION_TRIGGER_DDL)
+    except Exception as e:
+        print(f"⚠ Data version trigger setup skipped (writes made outside this app will not invalidate caches): {e}")
+
+def init_search_indexes():
+    """pg_trgm and full-text indexes; optional, the app works (slower) without them."""
+    for statement in text_search.postgres_ddl():
+        try:
+            with get_cursor() as cursor:
+                cursor.execute(statement)
+        except Exception as e:
+            print(f"⚠ Search index setup skipped ({statement.split(' ON ')[0]}): {e}")
+            if "pg_trgm" in statement:
+                return
+
+def use_embedded() -> bool:
+    if READ_ENGINE == "embedded":
+        return True
+    return READ_ENGINE == "auto" and not db_available
+
+def active_engine() -> str:
+    if use_embedded():
+        return "embedded" if embedded_engine.is_loaded() else "none"
+    return "postgres" if db_available else "none"
+
+def load_embedded(records):
+    embedded_engine.load_records(_record_rows(records), len(records), schema.COLUMN_NAMES, PROCUREMENT_TABLE_DDL)
+    _data_version["value"] = _fingerprint(records)
+    source = getattr(records, "source", None)
+    path = source.split("#")[0] if source else None
+    _data_version["modified"] = os.stat(path).st_mtime if path and os.path.exists(path) else time.time()
+
+def _fingerprint(records) -> str:
+    """Data version for the embedded engine, identical in every worker loading the same file."""
+    source = getattr(records, "source", None)
+    path = source.split("#")[0] if source else None
+    if path and os.path.exists(path):
+        stat = os.stat(path)
+        return f"file-{stat.st_size}-{stat.st_mtime_ns}-{len(records)}"
+    checksum = 0
+    for row in _record_rows(records):
+        checksum = zlib.crc32(repr(row).encode(), checksum)
+    return f"rows-{len(records)}-{checksum:08x}"
+
+def get_data_version() -> str:
+    """Opaque version of the loaded data; changes whenever data is reloaded."""
+    if use_embedded() or not db_available:
+        return _data_version["value"] or "none"
+    now = time.monotonic()
+    if _data_version["value"] is None or now - _data_version["checked"] > DATA_VERSION_CHECK_SECONDS:
+        with get_cursor() as cursor:
+            cursor.execute("SELECT value, updated_at FROM app_meta WHERE key = 'data_version'")
+            row = cursor.fetchone()
+        _data_version["value"] = row["value"] if row else "initial"
+        _data_version["modified"] = row["updated_at"].timestamp() if row else None
+        _data_version["checked"] = now
+    return _data_version["value"]
+
+def get_data_modified():
+    """Epoch seconds at which the current data version was created (None if unknown)."""
+    get_data_version()
+    return _data_version["modified"]
+
+def bump_data_version() -> str:
+    """Mark the Postgres data as changed so every worker's cache entries go stale."""
+    version = f"v{time.time_ns():x}"
+    with get_cursor() as cursor:
+        cursor.execute(
+            """INSERT INTO app_meta (key, value) VALUES ('data_version', %s)
+               ON CONFLICT (key) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()""",
+            (version,)
+        )
+    _data_version["value"] = version
+    _data_version["modified"] = time.time()
+    _data_version["checked"] = time.monotonic()
+    return version
+
 def get_record_count():
+    if use_embedded():
+        return embedded_engine.record_count
     if not db_available:
         return 0
     with get_cursor() as cursor:
@@ -124,67 +271,97 @@ def get_record_count():
         result = cursor.fetchone()
         return result['count'] if result else 0
 
-def insert_records(records: list):
+INSERT_BATCH_SIZE = 1000
+
+def _record_rows(records):
+    """Accept an excel_loader.ColumnBatch or a list of record dicts."""
+    if hasattr(records, "rows"):
+        return records.rows()
+    return (tuple(record.get(name) for name in schema.COLUMN_NAMES) for record in records)
+
+def insert_records(records, progress=None) -> int:
+    """Insert records in pages; progress(rows_done) is called after each page.
+
+    Returns the rows actually inserted (duplicate pr_numbers are skipped).
+    """
     if not db_available:
         print("⚠ Database not available - skipping record insertion")
-        return
-    with get_cursor() as cursor:
-        for record in records:
-            cursor.execute("""
-                INSERT INTO procurement_records (
-                    year, quarter, month, period, date, pr_number, description,
-                    department, contact_person, assign_to, budget, budget_q1,
-                    budget_q2, budget_q3, budget_q4, source_method, status,
-                    supplier_details, supplier_rating, local_content_percentage,
-                    pr_approval_scope_input, approving_authority, planned, target_date,
-                    actual_project_start, sla, note, review_approval_scope_eval,
-                    floating, tender_submit_by_vendor, evaluation, award_approval,
-                    contract_and_po, pr_approval_scope_input_pd, review_approval_scope_eval_pd,
-                    floating_pd, tender_submit_by_vendor_pd, evaluation_pd, award_approval_pd,
-                    contract_and_po_pd, total_days_pd, review_approval_scope_eval_ad,
-                    floating_ad, tender_submit_by_vendor_ad, evaluation_ad, award_approval_ad,
-                    contract_and_po_ad, total_days_ad, review_approval_scope_eval_pd_sla,
-                    floating_pd_sla, tender_submit_by_vendor_pd_sla, evaluation_pd_sla,
-                    award_approval_pd_sla, contract_and_po_pd_sla, review_approval_scope_eval_ad_sla,
-                    floating_ad_sla, tender_submit_by_vendor_ad_sla, evaluation_ad_sla,
-                    award_approval_ad_sla, contract_and_po_ad_sla, review_approval_scope_eval_diff_sla,
-                    floating_diff_sla, tender_submit_by_vendor_diff_sla, evaluation_diff_sla,
-                    award_approval_diff_sla, contract_and_po_diff_sla, project_status,
-                    risk, duration, last_status_date, status_duration, status_sla,
-                    status_co, escalate_48h, ceo_escalation
-                ) VALUES (
-                    %(year)s, %(quarter)s, %(month)s, %(period)s, %(date)s,
-                    %(pr_number)s, %(description)s, %(department)s, %(contact_person)s,
-                    %(assign_to)s, %(budget)s, %(budget_q1)s, %(budget_q2)s,
-                    %(budget_q3)s, %(budget_q4)s, %(source_method)s, %(status)s,
-                    %(supplier_details)s, %(supplier_rating)s, %(local_content_percentage)s,
-                    %(pr_approval_scope_input)s, %(approving_authority)s, %(planned)s, %(target_date)s,
-                    %(actual_project_start)s, %(sla)s, %(note)s, %(review_approval_scope_eval)s,
-                    %(floating)s, %(tender_submit_by_vendor)s, %(evaluation)s, %(award_approval)s,
-                    %(contract_and_po)s, %(pr_approval_scope_input_pd)s, %(review_approval_scope_eval_pd)s,
-                    %(floating_pd)s, %(tender_submit_by_vendor_pd)s, %(evaluation_pd)s, %(award_approval_pd)s,
-                    %(contract_and_po_pd)s, %(total_days_pd)s, %(review_approval_scope_eval_ad)s,
-                    %(floating_ad)s, %(tender_submit_by_vendor_ad)s, %(evaluation_ad)s, %(award_approval_ad)s,
-                    %(contract_and_po_ad)s, %(total_days_ad)s, %(review_approval_scope_eval_pd_sla)s,
-                    %(floating_pd_sla)s, %(tender_submit_by_vendor_pd_sla)s, %(evaluation_pd_sla)s,
-                    %(award_approval_pd_sla)s, %(contract_and_po_pd_sla)s, %(review_approval_scope_eval_ad_sla)s,
-                    %(floating_ad_sla)s, %(tender_submit_by_vendor_ad_sla)s, %(evaluation_ad_sla)s,
-                    %(award_approval_ad_sla)s, %(contract_and_po_ad_sla)s, %(review_approval_scope_eval_diff_sla)s,
-                    %(floating_diff_sla)s, %(tender_submit_by_vendor_diff_sla)s, %(evaluation_diff_sla)s,
-                    %(award_approval_diff_sla)s, %(contract_and_po_diff_sla)s, %(project_status)s,
-                    %(risk)s, %(duration)s, %(last_status_date)s, %(status_duration)s, %(status_sla)s,
-                    %(status_co)s, %(escalate_48h)s, %(ceo_escalation)s
-                ) ON CONFLICT (pr_number) DO NOTHING
-            """, record)
-
-def execute_query(sql: str):
+        return 0
+    rows = _record_rows(records)
+    done = inserted = 0
+    with metrics.stage("insert_records", rows=len(records)), get_cursor() as cursor:
+        while True:
+            page = list(islice(rows, INSERT_BATCH_SIZE))
+            if not page:
+                break
+            # One statement per page, so rowcount covers the whole page
+            execute_values(cursor, schema.insert_sql(), page, page_size=INSERT_BATCH_SIZE)
+            inserted += max(cursor.rowcount, 0)
+            done += len(page)
+            if progress:
+                progress(done)
+    bump_data_version()
+    return inserted
+
+def execute_query(sql: str) -> ResultSet:
+    """Run a validated SELECT, served from the shared result cache when possible."""
+    key = cache.key(" ".join(sql.split()))
+    cached = cache.get("result", key)
+    if cached is not None:
+        return ResultSet.from_json(cached)
+    rows = _run_query(sql)
+    if use_embedded() or db_available:
+        cache.put("result", key, rows)
+    return rows
+
+def explain(sql: str):
+    """Plan a query without executing it; raises on invalid SQL.
+
+    Returns the planner's total cost on Postgres, None on the embedded engine.
+    """
+    if use_embedded():
+        with metrics.stage("explain", engine="embedded"):
+            embedded_engine.explain(sql)
+        return None
     if not db_available:
-        return []
-    with get_cursor() as cursor:
-        cursor.execute(sql)
-        return cursor.fetchall()
+        raise Exception("Database not available")
+    with metrics.stage("explain"), get_cursor() as cursor:
+        cursor.execute("EXPLAIN (FORMAT JSON) " + sql)
+        plan = list(cursor.fetchone().values())[0]
+        return float(plan[0]["Plan"]["Total Cost"])
+
+def _run_query(sql: str):
+    if use_embedded():
+        return embedded_engine.execute_query(sql)
+    if not db_available:
+        return ResultSet((), [])
+    with metrics.stage("execute_query"):
+        # Plain tuple rows: column names are kept once in the ResultSet
+        with get_cursor(cursor_factory=psycopg2.extensions.cursor) as cursor:
+            cursor.execute(sql)
+            rows = ResultSet([column[0] for column in cursor.description], cursor.fetchall())
+        metrics.annotate(rows=len(rows))
+        return rows
+
+STATS_SQL = """
+    SELECT 
+        COALESCE(SUM(budget), 0) as total_budget,
+        COUNT(*) as total_projects,
+        COUNT(*) FILTER (WHERE risk = 'High') as high_risk_projects,
+        COALESCE(AVG(budget), 0) as average_budget,
+        COUNT(DISTINCT department) as department_count,
+        COUNT(*) FILTER (WHERE project_status = 'Completed') as completed_projects,
+        COUNT(*) FILTER (WHERE project_status = 'In Progress') as in_progress_projects,
+        COUNT(*) FILTER (WHERE project_status = 'Delayed' OR 
+            (total_days_ad IS NOT NULL AND total_days_pd IS NOT NULL AND total_days_ad > total_days_pd)
+        ) as delayed_projects
+    FROM procurement_records
+"""
 
 def get_stats():
+    if use_embedded() and embedded_engine.is_loaded():
+        with metrics.stage("get_stats"):
+            return _format_stats(embedded_engine.execute_query(STATS_SQL)[0])
     if not db_available:
         return {
             "totalBudget": 0.0,
@@ -196,29 +373,73 @@ def get_stats():
             "inProgressProjects": 0,
             "delayedProjects": 0
         }
-    with get_cursor() as cursor:
-        cursor.execute("""
-            SELECT 
-                COALESCE(SUM(budget), 0) as total_budget,
-                COUNT(*) as total_projects,
-                COUNT(*) FILTER (WHERE risk = 'High') as high_risk_projects,
-                COALESCE(AVG(budget), 0) as average_budget,
-                COUNT(DISTINCT department) as department_count,
-                COUNT(*) FILTER (WHERE project_status = 'Completed') as completed_projects,
-                COUNT(*) FILTER (WHERE project_status = 'In Progress') as in_progress_projects,
-                COUNT(*) FILTER (WHERE project_status = 'Delayed' OR 
-                    (total_days_ad IS NOT NULL AND total_days_pd IS NOT NULL AND total_days_ad > total_days_pd)
-                ) as delayed_projects
-            FROM procurement_records
-        """)
-        result = cursor.fetchone()
-        return {
-            "totalBudget": float(result['total_budget']),
-            "totalProjects": result['total_projects'],
-            "highRiskProjects": result['high_risk_projects'],
-            "averageBudget": float(result['average_budget']),
-            "departmentCount": result['department_count'],
-            "completedProjects": result['completed_projects'],
-            "inProgressProjects": result['in_progress_projects'],
-            "delayedProjects": result['delayed_projects']
-        }
+    with metrics.stage("get_stats"), get_cursor() as cursor:
+        cursor.execute(STATS_SQL)
+        return _format_stats(cursor.fetchone())
+
+def _format_stats(result) -> dict:
+    return {
+        "totalBudget": float(result['total_budget']),
+        "totalProjects": result['total_projects'],
+        "highRiskProjects": result['high_risk_projects'],
+        "averageBudget": float(result['average_budget']),
+        "departmentCount": result['department_count'],
+        "completedProjects": result['completed_projects'],
+        "inProgressProjects": result['in_progress_projects'],
+        "delayedProjects": result['delayed_projects']
+    }
+
+SEARCH_RESULT_COLUMNS = [
+    "pr_number", "description", "supplier_details", "note", "department", "status", "budget", "risk"
+]
+
+def _search_sql(fields: list, embedded: bool, prefilter: list = None) -> str:
+    """Rank by best trigram word similarity; match on similarity or full-text terms.
+
+    Parameters: the query once per field for the score, then per field the
+    prefilter terms (embedded only) and the query twice for the match, then
+    the limit.
+    """
+    p = "?" if embedded else "%s"
+    scores = [f"word_similarity({p}, coalesce({f}, ''))" for f in fields]
+    if len(scores) == 1:
+        score = scores[0]
+    else:
+        score = ("MAX(" if embedded else "GREATEST(") + ", ".join(scores) + ")"
+    matches = []
+    for f in fields:
+        if embedded:
+            match = (f"word_similarity({p}, {f}) >= {text_search.WORD_SIMILARITY_THRESHOLD} "
+                     f"OR fts_match({f}, {p})")
+            if prefilter:
+                # Plain substring tests skip most rows before the Python functions run
+                needles = " OR ".join(f"instr(lower({f}), {p}) > 0" for _ in prefilter)
+                match = f"({needles}) AND ({match})"
+            matches.append(f"({match})")
+        else:
+            # %% is a literal % for psycopg2
+            matches.append(f"{p} <%% {f}")
+            matches.append(f"{text_search.tsvector(f)} @@ websearch_to_tsquery('{text_search.TS_CONFIG}', {p})")
+    return (
+        f"SELECT {', '.join(SEARCH_RESULT_COLUMNS)}, {score} AS score "
+        f"FROM procurement_records WHERE {' OR '.join(matches)} "
+        f"ORDER BY score DESC, pr_number LIMIT {p}"
+    )
+
+def search_records(query: str, fields: list = None, limit: int = 20) -> list:
+    """Typo-tolerant search over description, supplier_details and note."""
+    fields = [f for f in (fields or text_search.SEARCH_COLUMNS) if f in text_search.SEARCH_COLUMNS]
+    with metrics.stage("search_records", fields=",".join(fields)):
+        if use_embedded():
+            terms = text_search.prefilter(query) or []
+            params = [query] * len(fields) + (terms + [query, query]) * len(fields) + [limit]
+            rows = embedded_engine.execute_params(_search_sql(fields, True, terms), params).dicts()
+        elif db_available:
+            params = [query] * (3 * len(fields)) + [limit]
+            with get_cursor() as cursor:
+                cursor.execute(_search_sql(fields, embedded=False), params)
+                rows = [dict(row) for row in cursor.fetchall()]
+        else:
+            rows = []
+        metrics.annotate(rows=len(rows))
+    return rows
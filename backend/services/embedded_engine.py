@@ -0,0 +1,215 @@
+# In-process SQLite copy of procurement_records, loaded straight from the
+# Excel records. Serves the same validated SELECTs (after a light Postgres ->
+# SQLite dialect translation) when Postgres is down, or as the primary read
+# path for small single-node deployments (READ_ENGINE=embedded).
+import re
+import math
+import struct
+import sqlite3
+import threading
+
+from backend.services import metrics, text_search
+from backend.services.resultset import ResultSet
+
+_conn = None
+_lock = threading.Lock()
+record_count = 0
+
+
+def _as_float4(value):
+    """Round a float the way a Postgres REAL column stores and returns it."""
+    if value is None or not isinstance(value, float) or math.isnan(value) or math.isinf(value):
+        return value
+    single = struct.unpack("f", struct.pack("f", value))[0]
+    # Postgres prints the shortest decimal that round-trips through float4
+    for digits in range(6, 10):
+        text = f"{single:.{digits}g}"
+        if struct.unpack("f", struct.pack("f", float(text)))[0] == single:
+            return float(text)
+    return single
+
+
+class _StdDev:
+    def __init__(self):
+        self.values = []
+
+    def step(self, value):
+        if value is not None:
+            self.values.append(float(value))
+
+    def finalize(self):
+        n = len(self.values)
+        if n < 2:
+            return None
+        mean = sum(self.values) / n
+        return math.sqrt(sum((v - mean) ** 2 for v in self.values) / (n - 1))
+
+
+def _create_connection():
+    conn = sqlite3.connect(":memory:", check_same_thread=False)
+    # Postgres LIKE is case-sensitive; ILIKE is translated separately
+    conn.execute("PRAGMA case_sensitive_like = ON")
+    conn.create_aggregate("stddev", 1, _StdDev)
+    conn.create_aggregate("stddev_samp", 1, _StdDev)
+    # pg_trgm / full-text search operators (see translate_sql)
+    conn.create_function("similarity", 2, text_search.similarity, deterministic=True)
+    conn.create_function("word_similarity", 2, text_search.word_similarity, deterministic=True)
+    conn.create_function("fts_match", 2, text_search.fts_match, deterministic=True)
+    return conn
+
+
+def _sqlite_ddl(ddl: str) -> str:
+    return ddl.replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY")
+
+
+def load_records(rows, row_count: int, columns: list, ddl: str):
+    """(Re)build the embedded table from loader rows in `columns` order."""
+    global _conn, record_count
+    with metrics.stage("embedded_load", rows=row_count):
+        conn = _create_connection()
+        conn.execute(_sqlite_ddl(ddl))
+        placeholders = ", ".join("?" for _ in columns)
+        conn.executemany(
+            f"INSERT OR IGNORE INTO procurement_records ({', '.join(columns)}) VALUES ({placeholders})",
+            ([_as_float4(value) for value in row] for row in rows)
+        )
+        conn.commit()
+        count = conn.execute("SELECT COUNT(*) FROM procurement_records").fetchone()[0]
+    with _lock:
+        _conn = conn
+        record_count = count
+    print(f"✓ Embedded engine loaded {count} records")
+
+
+def is_loaded() -> bool:
+    return _conn is not None
+
+
+_CAST_TYPES = {
+    "numeric": "REAL", "decimal": "REAL", "real": "REAL", "float": "REAL", "float4": "REAL",
+    "float8": "REAL", "double precision": "REAL", "int": "INTEGER", "integer": "INTEGER",
+    "bigint": "INTEGER", "smallint": "INTEGER", "text": "TEXT", "varchar": "TEXT",
+}
+_TYPE_PATTERN = r"(double precision|numeric(?:\(\d+(?:,\s*\d+)?\))?|decimal|real|float[48]?|bigint|smallint|integer|int|text|varchar|date)"
+
+
+def _cast(expr: str, pg_type: str) -> str:
+    base = pg_type.lower().split("(")[0]
+    if base == "date":
+        return f"date({expr})"
+    return f"CAST({expr} AS {_CAST_TYPES.get(base, 'TEXT')})"
+
+
+def _similarity(m) -> str:
+    # Without a text literal on either side this is modulo (id % 2), not pg_trgm
+    if not (m.group(1).startswith("'") or m.group(2).startswith("'")):
+        return m.group(0)
+    return f"(similarity({m.group(1)}, {m.group(2)}) >= {text_search.SIMILARITY_THRESHOLD})"
+
+
+_LITERAL = re.compile(r"'(?:[^']|'')*'")
+
+
+def translate_sql(sql: str) -> str:
+    """Translate the Postgres constructs the model commonly emits to SQLite."""
+    # Set string literals aside as '<n>' so the rewrites below never touch
+    # their contents; they are restored once translation is done
+    literals = []
+
+    def hold(m):
+        literals.append(m.group(0))
+        return f"'{len(literals) - 1}'"
+
+    out = _LITERAL.sub(hold, sql.strip().rstrip(";"))
+    # expr::type (identifiers, literals, function calls and parenthesised groups, one level of nesting)
+    out = re.sub(
+        r"(\w*\((?:[^()]|\([^()]*\))*\)|'[^']*'|[\w.]+)::" + _TYPE_PATTERN,
+        lambda m: _cast(m.group(1), m.group(2)), out, flags=re.IGNORECASE
+    )
+    out = re.sub(
+        r"CAST\(\s*([^()]+?|[^()]*\([^()]*\)[^()]*?)\s+AS\s+" + _TYPE_PATTERN + r"\s*\)",
+        lambda m: _cast(m.group(1), m.group(2)), out, flags=re.IGNORECASE
+    )
+    def interval(m):
+        amount = re.fullmatch(r"'\s*(\d+)\s*(day|days|month|months|year|years)\s*'", literals[int(m.group(2))], flags=re.IGNORECASE)
+        if not amount:
+            return m.group(0)
+        return f"date('now', '{m.group(1)}{amount.group(1)} {amount.group(2).rstrip('sS')}s')"
+
+    out = re.sub(r"CURRENT_DATE\s*([+-])\s*INTERVAL\s*'(\d+)'", interval, out, flags=re.IGNORECASE)
+    out = re.sub(r"\bCURRENT_DATE\b", "date('now')", out, flags=re.IGNORECASE)
+    out = re.sub(r"\bNOW\(\)", "datetime('now')", out, flags=re.IGNORECASE)
+    out = re.sub(
+        r"EXTRACT\(\s*(YEAR|MONTH|DAY)\s+FROM\s+([^()]+?|[^()]*\([^()]*\)[^()]*?)\s*\)",
+        lambda m: "CAST(strftime('%{}', {}) AS INTEGER)".format(
+            {"YEAR": "Y", "MONTH": "m", "DAY": "d"}[m.group(1).upper()], m.group(2)
+        ),
+        out, flags=re.IGNORECASE
+    )
+    # to_tsvector('english', col) @@ websearch_to_tsquery('english', 'terms')
+    out = re.sub(
+        r"to_tsvector\(\s*'\w+'\s*,\s*(coalesce\([^()]*\)|[\w.]+)\s*\)\s*@@\s*"
+        r"(?:websearch_to_tsquery|plainto_tsquery|phraseto_tsquery|to_tsquery)\(\s*(?:'\w+'\s*,\s*)?('(?:[^']|'')*')\s*\)",
+        lambda m: f"fts_match({m.group(1)}, {m.group(2)})", out, flags=re.IGNORECASE
+    )
+    # pg_trgm: 'term' <% col, col %> 'term' (word similarity) and a % b (similarity)
+    out = re.sub(
+        r"('(?:[^']|'')*')\s*<%\s*([\w.]+)",
+        lambda m: f"(word_similarity({m.group(1)}, {m.group(2)}) >= {text_search.WORD_SIMILARITY_THRESHOLD})", out
+    )
+    out = re.sub(
+        r"([\w.]+)\s*%>\s*('(?:[^']|'')*')",
+        lambda m: f"(word_similarity({m.group(2)}, {m.group(1)}) >= {text_search.WORD_SIMILARITY_THRESHOLD})", out
+    )
+    out = re.sub(
+        r"([\w.]+|'(?:[^']|'')*')\s+%\s+([\w.]+|'(?:[^']|'')*')", _similarity, out
+    )
+    out = re.sub(
+        r"(\S+)\s+(NOT\s+)?ILIKE\s+('(?:[^']|'')*')",
+        lambda m: f"lower({m.group(1)}) {m.group(2) or ''}LIKE lower({m.group(3)})",
+        out, flags=re.IGNORECASE
+    )
+    out = re.sub(r"\bSTRING_AGG\(", "group_concat(", out, flags=re.IGNORECASE)
+    return re.sub(r"'(\d+)'", lambda m: literals[int(m.group(1))], out)
+
+
+def _pg_column_name(name: str) -> str:
+    """Name an output column the way Postgres would (count, sum, budget...)."""
+    cast = re.fullmatch(r"CAST\((?:\w+\.)?(\w+)(?:\(.*\))? AS \w+\)", name, flags=re.IGNORECASE | re.DOTALL)
+    if cast:
+        return cast.group(1).lower()
+    func = re.fullmatch(r"(\w+)\(.*\)", name, flags=re.DOTALL)
+    if func:
+        return func.group(1).lower()
+    ident = re.fullmatch(r"(?:\w+\.)?(\w+)", name)
+    if ident:
+        return ident.group(1).lower()
+    return "?column?"
+
+
+def execute_query(sql: str) -> ResultSet:
+    if _conn is None:
+        return ResultSet((), [])
+    translated = translate_sql(sql)
+    with metrics.stage("execute_query", engine="embedded"):
+        rows = execute_params(translated)
+        metrics.annotate(rows=len(rows))
+    return rows
+
+
+def explain(sql: str):
+    """Prepare the translated query without running it; raises on invalid SQL."""
+    if _conn is None:
+        raise RuntimeError("Embedded engine not loaded")
+    with _lock:
+        return _conn.execute("EXPLAIN QUERY PLAN " + translate_sql(sql)).fetchall()
+
+
+def execute_params(sql: str, params=()) -> ResultSet:
+    """Run SQLite-dialect SQL with ? parameters (no translation)."""
+    if _conn is None:
+        return ResultSet((), [])
+    with _lock:
+        cursor = _conn.execute(sql, params)
+        columns = [_pg_column_name(d[0]) for d in cursor.description]
+        return ResultSet(columns, cursor.fetchall())
@@ -0,0 +1,235 @@
+# Value dictionary for the categorical columns, built from procurement_records
+# and rebuilt whenever the data version changes. Generated SQL is checked
+# before execution and literals that don't match a stored value exactly
+# ('it dept', 'Supplier 123', 'الهندسة') are rewritten to the canonical value
+# by case-folding, aliases and (digit-preserving) edit distance.
+import re
+import threading
+
+from backend.services import database, metrics
+
+ENTITY_COLUMNS = ["department", "status", "supplier_details", "contact_person", "risk"]
+
+# Alias -> canonical value, applied only when the canonical value exists in the data
+ALIASES = {
+    "department": {
+        "information technology": "IT", "it dept": "IT", "tech": "IT", "technology": "IT",
+        "human resources": "HR", "people": "HR",
+        "research and development": "R&D", "r and d": "R&D", "rnd": "R&D", "research": "R&D",
+        "ops": "Operations", "finance and accounting": "Finance", "accounting": "Finance",
+        "purchasing": "Procurement", "supply chain": "Procurement",
+        "تقنية المعلومات": "IT", "المالية": "Finance", "الموارد البشرية": "HR",
+        "المبيعات": "Sales", "التسويق": "Marketing", "البحث والتطوير": "R&D",
+        "العمليات": "Operations", "القانونية": "Legal", "الشؤون القانونية": "Legal",
+        "المشتريات": "Procurement", "الهندسة": "Engineering",
+    },
+    "status": {
+        "wip": "In Progress", "ongoing": "In Progress", "active": "In Progress",
+        "done": "Completed", "complete": "Completed", "finished": "Completed",
+        "canceled": "Cancelled", "paused": "On Hold", "hold": "On Hold",
+        "in review": "Under Review", "review": "Under Review", "reviewing": "Under Review",
+        "pending approval": "Pending",
+        "قيد التنفيذ": "In Progress", "مكتمل": "Completed", "ملغي": "Cancelled",
+        "معلق": "On Hold", "قيد المراجعة": "Under Review", "قيد الانتظار": "Pending", "معتمد": "Approved",
+    },
+    "risk": {
+        "med": "Medium", "moderate": "Medium", "severe": "Critical", "none": "None",
+        "عالية": "High", "عالي": "High", "متوسطة": "Medium", "متوسط": "Medium",
+        "منخفضة": "Low", "منخفض": "Low", "حرجة": "Critical", "حرج": "Critical",
+    },
+}
+
+# Words users tack onto values ("IT dept", "قسم الهندسة")
+_NOISE_WORDS = re.compile(r"\b(dept|department|team|division|status|risk)\b|^(قسم|إدارة)\s+", re.IGNORECASE)
+
+_lock = threading.Lock()
+_dictionary = {"version": None, "values": {}}
+_mentions = {"version": None, "pattern": None, "phrases": {}}
+
+
+def _compact(value: str) -> str:
+    """Case-folded letters and digits only: 'Supplier 123' == 'supplier-123'."""
+    return "".join(ch for ch in value.casefold() if ch.isalnum())
+
+
+def _digits(value: str) -> str:
+    return "".join(ch for ch in value if ch.isdigit())
+
+
+def _edit_distance(a: str, b: str, limit: int) -> int:
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def refresh():
+    """Rebuild the dictionary from the loaded data (registered with startup.after_load)."""
+    version = database.get_data_version()
+    values = {}
+    with metrics.stage("entity_dictionary"):
+        for column in ENTITY_COLUMNS:
+            rows = database.execute_query(
+                f"SELECT DISTINCT {column} AS value FROM procurement_records WHERE {column} IS NOT NULL"
+            )
+            canonical = [str(row["value"]) for row in rows if str(row["value"]).strip()]
+            values[column] = {_compact(v): v for v in canonical}
+    with _lock:
+        _dictionary["version"] = version
+        _dictionary["values"] = values
+    print(f"✓ Entity dictionary built: {', '.join(f'{c}={len(v)}' for c, v in values.items())}")
+
+
+def _values(column: str) -> dict:
+    if _dictionary["version"] != database.get_data_version():
+        refresh()
+    return _dictionary["values"].get(column, {})
+
+
+def resolve(column: str, literal: str):
+    """Return (canonical, method) for a literal, or (None, None) when unknown."""
+    known = _values(column)
+    if not known or literal in known.values():
+        return literal, "exact"
+    key = _compact(literal)
+    if key in known:
+        return known[key], "normalized"
+
+    cleaned = _NOISE_WORDS.sub(" ", literal).strip()
+    for candidate in (literal, cleaned):
+        alias = ALIASES.get(column, {}).get(" ".join(candidate.casefold().split()))
+        if alias and _compact(alias) in known:
+            return known[_compact(alias)], "alias"
+    if cleaned and _compact(cleaned) in known:
+        return known[_compact(cleaned)], "alias"
+
+    # Typos only: never change a number ('Supplier-12' is not 'Supplier-123')
+    key = _compact(cleaned or literal)
+    limit = 1 if len(key) <= 5 else 2 if len(key) <= 10 else 3
+    digits = _digits(key)
+    best, best_distance, tie = None, limit + 1, False
+    for compact, canonical in known.items():
+        if _digits(compact) != digits:
+            continue
+        distance = _edit_distance(key, compact, limit)
+        if distance < best_distance:
+            best, best_distance, tie = canonical, distance, False
+        elif distance == best_distance:
+            tie = True
+    if best is not None and best_distance <= limit and not tie:
+        return best, "fuzzy"
+    return None, None
+
+
+def _mention_pattern():
+    """Regex over every known value and usable alias, longest first, rebuilt with the dictionary."""
+    if _mentions["version"] == database.get_data_version() and _mentions["pattern"] is not None:
+        return _mentions["pattern"], _mentions["phrases"]
+    phrases = {}
+    for column in ENTITY_COLUMNS:
+        known = _values(column)
+        for canonical in known.values():
+            if len(canonical) > 1:
+                phrases[canonical.casefold()] = (column, canonical)
+        for alias, canonical in ALIASES.get(column, {}).items():
+            if _compact(canonical) in known:
+                phrases.setdefault(alias, (column, known[_compact(canonical)]))
+    ordered = sorted(phrases, key=len, reverse=True)
+    pattern = re.compile(r"(?<!\w)(" + "|".join(map(re.escape, ordered)) + r")(?!\w)") if ordered else None
+    with _lock:
+        _mentions.update(version=_dictionary["version"], pattern=pattern, phrases=phrases)
+    return pattern, phrases
+
+
+def mentions(text: str) -> frozenset:
+    """(column, canonical value) pairs named in free text: 'IT dept', 'الهندسة', 'high risk'."""
+    pattern, phrases = _mention_pattern()
+    if pattern is None:
+        return frozenset()
+    return frozenset(phrases[m] for m in pattern.findall(" ".join(text.casefold().split())))
+
+
+def suggestions(column: str, literal: str, limit: int = 5) -> list:
+    """Closest stored values for an unknown literal."""
+    key = _compact(literal)
+    known = _values(column)
+    ranked = sorted(known.items(), key=lambda item: _edit_distance(key, item[0], len(key) + len(item[0])))
+    return [canonical for _, canonical in ranked[:limit]]
+
+
+_LITERAL = r"'((?:[^']|'')*)'"
+_COLUMN = r"\b((?:\w+\.)?(?:" + "|".join(ENTITY_COLUMNS) + r"))\b"
+_COMPARISON = re.compile(_COLUMN + r"(\s*(?:=|!=|<>)\s*|\s+(?:NOT\s+)?(?:I?LIKE)\s+)" + _LITERAL, re.IGNORECASE)
+_IN_LIST = re.compile(_COLUMN + r"(\s+(?:NOT\s+)?IN\s*)\(([^()]*)\)", re.IGNORECASE)
+_PLACEHOLDER = re.compile(r"^YOUR_", re.IGNORECASE)
+
+
+def canonicalize(sql: str):
+    """Rewrite categorical literals to stored values.
+
+    Returns (sql, rewrites, unresolved): each rewrite is {column, from, to,
+    method}; unresolved lists literals matching no stored value with the
+    closest suggestions.
+    """
+    rewrites, unresolved = [], []
+
+    def fix(column: str, literal: str, operator: str = "=") -> str:
+        value = literal.replace("''", "'")
+        if "LIKE" in operator.upper() and ("%" in value or "_" in value):
+            return literal
+        name = column.split(".")[-1].lower()
+        canonical, method = resolve(name, value)
+        if canonical is None:
+            if not _PLACEHOLDER.match(value):
+                unresolved.append({"column": name, "value": value, "suggestions": suggestions(name, value)})
+            return literal
+        if canonical != value:
+            rewrites.append({"column": name, "from": value, "to": canonical, "method": method})
+            metrics.inc("entity_rewrites_total", column=name, method=method)
+        return canonical.replace("'", "''")
+
+    def comparison(m):
+        return f"{m.group(1)}{m.group(2)}'{fix(m.group(1), m.group(3), m.group(2))}'"
+
+    def in_list(m):
+        items = re.sub(_LITERAL, lambda lit: f"'{fix(m.group(1), lit.group(1))}'", m.group(3))
+        return f"{m.group(1)}{m.group(2)}({items})"
+
+    try:
+        rewritten = _COMPARISON.sub(comparison, sql)
+        rewritten = _IN_LIST.sub(in_list, rewritten)
+    except Exception as e:
+        print(f"⚠ Entity resolution skipped: {e}")
+        return sql, [], []
+    if rewrites:
+        metrics.annotate(rewrites=len(rewrites))
+    return rewritten, rewrites, unresolved
+
+
+_COLUMN_LABELS = {
+    "department": ("department", "قسم"),
+    "status": ("status", "حالة"),
+    "supplier_details": ("supplier", "مورد"),
+    "contact_person": ("contact person", "شخص اتصال"),
+    "risk": ("risk level", "مستوى مخاطر"),
+}
+
+
+def describe_unresolved(unresolved: list, language: str = "en") -> str:
+    """Empty-result message naming the unknown value(s) and the closest real ones."""
+    lines = []
+    for item in unresolved:
+        label_en, label_ar = _COLUMN_LABELS.get(item["column"], (item["column"], item["column"]))
+        options = ", ".join(item["suggestions"])
+        if language == "ar":
+            lines.append(f"لا يوجد {label_ar} باسم '{item['value']}'. القيم الأقرب: {options}.")
+        else:
+            lines.append(f"No {label_en} named '{item['value']}' exists. Closest matches: {options}.")
+    return "\n".join(lines)
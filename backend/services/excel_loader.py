@@ -1,119 +1,185 @@
 import os
-from openpyxl import load_workbook
+from array import array
 
-def safe_str(value):
-    if value is None:
-        return ""
-    return str(value).strip()
+from backend.services import schema
 
-def safe_float(value):
-    if value is None:
-        return 0.0
+# Typed column storage: floats in array('d') and ints in array('q') with a
+# parallel null mask, text as plain lists
+_FLOAT_NULL = float("nan")
+
+
+class ColumnBatch:
+    """Parsed sheet stored column-at-a-time, in schema.COLUMNS order."""
+
+    def __init__(self, columns: dict, nulls: dict, errors: dict, row_count: int,
+                 source: str = None, width: int = None):
+        self.columns = columns
+        self.nulls = nulls
+        self.errors = errors
+        self.row_count = row_count
+        self.source = source
+        # Number of columns present in the source sheet
+        self.width = width if width is not None else len(schema.COLUMNS)
+
+    def __len__(self):
+        return self.row_count
+
+    @property
+    def rejected(self) -> int:
+        return sum(self.errors.values())
+
+    def column(self, name: str) -> list:
+        """Column values with NULLs restored as None."""
+        values = self.columns[name]
+        mask = self.nulls.get(name)
+        if mask is None:
+            return list(values)
+        return [None if null else value for value, null in zip(values, mask)]
+
+    def rows(self):
+        """Yield one tuple per row in schema.COLUMN_NAMES order."""
+        return zip(*(self.column(name) for name in schema.COLUMN_NAMES))
+
+    def records(self) -> list:
+        names = schema.COLUMN_NAMES
+        return [dict(zip(names, row)) for row in self.rows()]
+
+
+def _convert_text(values, default):
     try:
-        return float(value)
-    except (ValueError, TypeError):
-        return 0.0
+        # Fast path: every cell is already a string
+        out = list(map(str.strip, values))
+    except TypeError:
+        out = [None if v is None else str(v).strip() for v in values]
+        if default is None:
+            out = ["" if v is None else v for v in out]
+    if default is not None:
+        out = [v or default for v in out]
+    return out, None, 0
+
 
-def safe_int(value):
-    if value is None:
-        return None
+def _convert_float(values):
+    n = len(values)
     try:
-        return int(float(value))
-    except (ValueError, TypeError):
-        return None
+        # Fast path: openpyxl already returns numbers for numeric cells
+        return array("d", values), None, 0
+    except TypeError:
+        pass
+    try:
+        return array("d", [0.0 if v is None else v for v in values]), None, 0
+    except TypeError:
+        pass
+    out = array("d", bytes(8 * n))
+    nulls = bytearray(n)
+    errors = 0
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        try:
+            out[i] = float(v)
+        except (ValueError, TypeError):
+            out[i] = _FLOAT_NULL
+            nulls[i] = 1
+            errors += 1
+    return out, nulls, errors
 
-def load_excel_data(file_path: str) -> list:
+
+def _convert_int(values, default):
+    n = len(values)
+    try:
+        # Fast path: every cell is already an integer
+        out = array("q", values)
+        if default is not None and 0 in out:
+            out = array("q", [v or default for v in out])
+        return out, None, 0
+    except (TypeError, OverflowError):
+        pass
+    out = array("q", bytes(8 * n))
+    nulls = bytearray(n)
+    errors = 0
+    for i, v in enumerate(values):
+        if v is None or v == "":
+            nulls[i] = 1
+            continue
+        try:
+            out[i] = int(v) if type(v) is int else int(float(v))
+        except (ValueError, TypeError, OverflowError):
+            nulls[i] = 1
+            errors += 1
+    if default is not None:
+        for i in range(n):
+            if nulls[i] or out[i] == 0:
+                out[i] = default
+                nulls[i] = 0
+    return out, nulls, errors
+
+
+def convert_rows(rows: list, row_numbers: list, source: str = None) -> ColumnBatch:
+    """Convert raw sheet rows into a ColumnBatch, one column at a time."""
+    row_count = len(rows)
+    width = max((len(row) for row in rows), default=0)
+    if any(len(row) != width for row in rows):
+        rows = [tuple(row) + (None,) * (width - len(row)) for row in rows]
+    raw_columns = list(zip(*rows))
+
+    columns, nulls, errors = {}, {}, {}
+    for idx, (name, _, kind, default) in enumerate(schema.COLUMNS):
+        if idx >= width:
+            # Column missing from the sheet entirely
+            columns[name] = [None] * row_count
+            continue
+        values = raw_columns[idx]
+        if kind == "text":
+            if default == "PR-{row}":
+                converted, mask, bad = _convert_text(values, None)
+                converted = [v or f"PR-{row_no}" for v, row_no in zip(converted, row_numbers)]
+            else:
+                converted, mask, bad = _convert_text(values, default)
+        elif kind == "float":
+            converted, mask, bad = _convert_float(values)
+        else:
+            converted, mask, bad = _convert_int(values, default)
+        columns[name] = converted
+        if mask is not None:
+            nulls[name] = mask
+        if bad:
+            errors[name] = bad
+    return ColumnBatch(columns, nulls, errors, row_count, source, width)
+
+
+def list_sheets(file_path: str) -> list:
+    # openpyxl is heavy to import; only pay for it when a workbook is read
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, read_only=True)
+    try:
+        return list(wb.sheetnames)
+    finally:
+        wb.close()
+
+
+def load_excel_columns(file_path: str, sheet_name: str = None) -> ColumnBatch:
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"Excel file not found: {file_path}")
-    
-    wb = load_workbook(file_path, data_only=True)
-    sheet = wb.active
-    
-    headers = [cell.value for cell in sheet[1]]
-    records = []
-    
-    for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-        if not any(row):
-            continue
-            
-        record = {
-            "year": safe_int(row[0]) or 2026,
-            "quarter": safe_str(row[1]) or "Q1",
-            "month": safe_str(row[2]) or "January",
-            "period": safe_str(row[3]) or "2026-01",
-            "date": safe_str(row[4]) or "2026-01-01",
-            "pr_number": safe_str(row[5]) or f"PR-{row_idx}",
-            "description": safe_str(row[6]) or "No description",
-            "department": safe_str(row[7]) or "Unknown",
-            "contact_person": safe_str(row[8]) or "Unknown",
-            "assign_to": safe_str(row[9]) or "Unassigned",
-            "budget": safe_float(row[10]),
-            "budget_q1": safe_float(row[11]),
-            "budget_q2": safe_float(row[12]),
-            "budget_q3": safe_float(row[13]),
-            "budget_q4": safe_float(row[14]),
-            "source_method": safe_str(row[15]) or "Unknown",
-            "status": safe_str(row[16]) or "Pending",
-            "supplier_details": safe_str(row[17]) if len(row) > 17 else None,
-            "supplier_rating": safe_str(row[18]) if len(row) > 18 else None,
-            "local_content_percentage": safe_float(row[19]) if len(row) > 19 else None,
-            "pr_approval_scope_input": safe_str(row[20]) if len(row) > 20 else None,
-            "approving_authority": safe_str(row[21]) if len(row) > 21 else None,
-            "planned": safe_str(row[22]) if len(row) > 22 else None,
-            "target_date": safe_str(row[23]) if len(row) > 23 else None,
-            "actual_project_start": safe_str(row[24]) if len(row) > 24 else None,
-            "sla": safe_int(row[25]) if len(row) > 25 else None,
-            "note": safe_str(row[26]) if len(row) > 26 else None,
-            "review_approval_scope_eval": safe_float(row[27]) if len(row) > 27 else None,
-            "floating": safe_float(row[28]) if len(row) > 28 else None,
-            "tender_submit_by_vendor": safe_float(row[29]) if len(row) > 29 else None,
-            "evaluation": safe_float(row[30]) if len(row) > 30 else None,
-            "award_approval": safe_float(row[31]) if len(row) > 31 else None,
-            "contract_and_po": safe_float(row[32]) if len(row) > 32 else None,
-            "pr_approval_scope_input_pd": safe_float(row[33]) if len(row) > 33 else None,
-            "review_approval_scope_eval_pd": safe_float(row[34]) if len(row) > 34 else None,
-            "floating_pd": safe_float(row[35]) if len(row) > 35 else None,
-            "tender_submit_by_vendor_pd": safe_float(row[36]) if len(row) > 36 else None,
-            "evaluation_pd": safe_float(row[37]) if len(row) > 37 else None,
-            "award_approval_pd": safe_float(row[38]) if len(row) > 38 else None,
-            "contract_and_po_pd": safe_float(row[39]) if len(row) > 39 else None,
-            "total_days_pd": safe_float(row[40]) if len(row) > 40 else None,
-            "review_approval_scope_eval_ad": safe_float(row[41]) if len(row) > 41 else None,
-            "floating_ad": safe_float(row[42]) if len(row) > 42 else None,
-            "tender_submit_by_vendor_ad": safe_float(row[43]) if len(row) > 43 else None,
-            "evaluation_ad": safe_float(row[44]) if len(row) > 44 else None,
-            "award_approval_ad": safe_float(row[45]) if len(row) > 45 else None,
-            "contract_and_po_ad": safe_float(row[46]) if len(row) > 46 else None,
-            "total_days_ad": safe_float(row[47]) if len(row) > 47 else None,
-            "review_approval_scope_eval_pd_sla": safe_float(row[48]) if len(row) > 48 else None,
-            "floating_pd_sla": safe_float(row[49]) if len(row) > 49 else None,
-            "tender_submit_by_vendor_pd_sla": safe_float(row[50]) if len(row) > 50 else None,
-            "evaluation_pd_sla": safe_float(row[51]) if len(row) > 51 else None,
-            "award_approval_pd_sla": safe_float(row[52]) if len(row) > 52 else None,
-            "contract_and_po_pd_sla": safe_float(row[53]) if len(row) > 53 else None,
-            "review_approval_scope_eval_ad_sla": safe_float(row[54]) if len(row) > 54 else None,
-            "floating_ad_sla": safe_float(row[55]) if len(row) > 55 else None,
-            "tender_submit_by_vendor_ad_sla": safe_float(row[56]) if len(row) > 56 else None,
-            "evaluation_ad_sla": safe_float(row[57]) if len(row) > 57 else None,
-            "award_approval_ad_sla": safe_float(row[58]) if len(row) > 58 else None,
-            "contract_and_po_ad_sla": safe_float(row[59]) if len(row) > 59 else None,
-            "review_approval_scope_eval_diff_sla": safe_float(row[60]) if len(row) > 60 else None,
-            "floating_diff_sla": safe_float(row[61]) if len(row) > 61 else None,
-            "tender_submit_by_vendor_diff_sla": safe_float(row[62]) if len(row) > 62 else None,
-            "evaluation_diff_sla": safe_float(row[63]) if len(row) > 63 else None,
-            "award_approval_diff_sla": safe_float(row[64]) if len(row) > 64 else None,
-            "contract_and_po_diff_sla": safe_float(row[65]) if len(row) > 65 else None,
-            "project_status": safe_int(row[66]) if len(row) > 66 else None,
-            "risk": safe_str(row[67]) if len(row) > 67 else None,  # TEXT: "Low", "Medium", "High"
-            "duration": safe_int(row[68]) if len(row) > 68 else None,
-            "last_status_date": safe_str(row[69]) if len(row) > 69 else None,
-            "status_duration": safe_int(row[70]) if len(row) > 70 else None,
-            "status_sla": safe_int(row[71]) if len(row) > 71 else None,
-            "status_co": safe_str(row[72]) if len(row) > 72 else None,
-            "escalate_48h": safe_str(row[73]) if len(row) > 73 else None,
-            "ceo_escalation": safe_str(row[74]) if len(row) > 74 else None,
-        }
-            
-        records.append(record)
-    
-    return records
+
+    from openpyxl import load_workbook
+    wb = load_workbook(file_path, data_only=True, read_only=True)
+    try:
+        sheet = wb[sheet_name] if sheet_name else wb.active
+        rows, row_numbers = [], []
+        for row_idx, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
+            if not any(row):
+                continue
+            rows.append(row)
+            row_numbers.append(row_idx)
+    finally:
+        wb.close()
+
+    source = f"{file_path}#{sheet_name}" if sheet_name else file_path
+    batch = convert_rows(rows, row_numbers, source=source)
+    for name, count in batch.errors.items():
+        print(f"⚠ {os.path.basename(source)}: {count} unparseable value(s) in column '{name}' loaded as NULL")
+    return batch
+
+
+def load_excel_data(file_path: str) -> list:
+    return load_excel_columns(file_path).records()
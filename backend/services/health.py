@@ -0,0 +1,101 @@
+# Probe state refreshed in the background, so /api/health and /api/ready
+# answer from memory instead of querying the database on every probe.
+import os
+import time
+import threading
+
+from backend.services import database, llm, metrics, startup
+
+HEALTH_REFRESH_SECONDS = float(os.environ.get("HEALTH_REFRESH_SECONDS", "10"))
+# Report not ready after this many consecutive failed database checks
+HEALTH_DB_FAILURES = int(os.environ.get("HEALTH_DB_FAILURES", "2"))
+
+_lock = threading.Lock()
+_snapshot = {
+    "record_count": None,
+    "db": None,
+    "db_latency_ms": None,
+    "db_error": None,
+    "db_failures": 0,
+    "checked_at": None,
+}
+_thread = {"thread": None}
+
+
+def refresh():
+    """Re-read the record count and database reachability (one query per interval)."""
+    fields = {"checked_at": time.time()}
+    started = time.perf_counter()
+    try:
+        fields["record_count"] = database.get_record_count()
+        fields.update(db="ok", db_error=None, db_failures=0,
+                      db_latency_ms=round((time.perf_counter() - started) * 1000, 1))
+    except Exception as e:
+        with _lock:
+            failures = _snapshot["db_failures"] + 1
+        fields.update(db="error", db_error=str(e), db_failures=failures)
+        metrics.inc("health_check_failures_total")
+    with _lock:
+        _snapshot.update(fields)
+
+
+def _loop():
+    while True:
+        if startup.is_ready():
+            try:
+                refresh()
+            except Exception as e:
+                print(f"⚠ Health refresh failed: {e}")
+        time.sleep(HEALTH_REFRESH_SECONDS)
+
+
+def start():
+    if _thread["thread"] is None:
+        _thread["thread"] = threading.Thread(target=_loop, name="health-refresh", daemon=True)
+        _thread["thread"].start()
+
+
+def snapshot() -> dict:
+    with _lock:
+        return dict(_snapshot)
+
+
+def readiness() -> tuple:
+    """(ready, details) from cached state only.
+
+    Not ready while loading, after repeated database failures, or while the
+    connection pool has callers queueing. An open LLM circuit only marks the
+    instance degraded: stats, search and direct queries still work, and every
+    instance shares the same upstream.
+    """
+    state = startup.status()
+    cached = snapshot()
+    engine = database.active_engine()
+    pool = database.pool_status() if engine == "postgres" else None
+    circuits = llm.circuit_state()
+
+    reasons = []
+    if not state["ready"]:
+        reasons.append(f"loading ({state['phase']})")
+    if cached["db_failures"] >= HEALTH_DB_FAILURES:
+        reasons.append(f"database: {cached['db_error']}")
+    if pool and pool["in_use"] >= pool["max"] and pool["waiting"] > 0:
+        reasons.append("database pool exhausted")
+
+    if reasons:
+        status = "not_ready"
+    elif not llm.is_available():
+        status = "degraded"
+    else:
+        status = "ready"
+    return not reasons, {
+        "status": status,
+        "reasons": reasons,
+        "engine": engine,
+        "recordCount": cached["record_count"],
+        "checkedAt": cached["checked_at"],
+        "db": {k: cached[k] for k in ("db", "db_latency_ms", "db_error")},
+        "pool": pool,
+        "llm": circuits,
+        "startup": state,
+    }
@@ -0,0 +1,110 @@
+import os
+import glob
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from backend.services import database, excel_loader
+
+WORKBOOK_EXTENSIONS = (".xlsx", ".xlsm")
+
+# Sheets narrower than the always-present leading columns (year .. status)
+# are summaries/pivots, not ERP exports
+MIN_SHEET_COLUMNS = 17
+
+
+def discover_workbooks(paths: list) -> list:
+    """Expand directories and glob patterns into a sorted list of workbooks."""
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = [os.path.join(path, name) for name in os.listdir(path)]
+        else:
+            candidates = glob.glob(path) or [path]
+        for candidate in candidates:
+            name = os.path.basename(candidate)
+            if name.lower().endswith(WORKBOOK_EXTENSIONS) and not name.startswith("~$"):
+                found.append(candidate)
+    return sorted(set(found))
+
+
+def _parse_sheet(file_path: str, sheet_name: str):
+    """Worker-process entry point: parse one sheet into a ColumnBatch."""
+    started = time.perf_counter()
+    batch = excel_loader.load_excel_columns(file_path, sheet_name)
+    if batch.row_count and batch.width < MIN_SHEET_COLUMNS:
+        print(f"Skipping {os.path.basename(batch.source)}: only {batch.width} columns")
+        batch = excel_loader.convert_rows([], [], source=batch.source)
+    return batch, time.perf_counter() - started
+
+
+def ingest(paths: list, workers: int = None, sheets: list = None, writer=None) -> list:
+    """Parse every sheet of every workbook in parallel and write through one writer.
+
+    Worker processes only parse; the calling process is the single writer,
+    inserting each sheet's batch as soon as it arrives so parsing and writing
+    overlap. writer(batch) returns the rows it inserted. Returns one report
+    per workbook.
+    """
+    writer = writer or database.insert_records
+    workbooks = discover_workbooks(paths)
+    if not workbooks:
+        print("No workbooks found")
+        return []
+
+    tasks = []
+    for path in workbooks:
+        for sheet in excel_loader.list_sheets(path):
+            if sheets and sheet not in sheets:
+                continue
+            tasks.append((path, sheet))
+
+    reports = {
+        path: {"file": path, "sheets": 0, "rows": 0, "duplicates": 0, "rejected": 0, "rejected_by_column": {},
+               "parse_seconds": 0.0, "write_seconds": 0.0, "errors": []}
+        for path in workbooks
+    }
+    workers = workers or os.cpu_count() or 1
+    print(f"Ingesting {len(tasks)} sheet(s) from {len(workbooks)} workbook(s) with {workers} worker(s)")
+    started = time.perf_counter()
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(_parse_sheet, path, sheet): (path, sheet) for path, sheet in tasks}
+        for future in as_completed(futures):
+            path, sheet = futures[future]
+            report = reports[path]
+            try:
+                batch, parse_seconds = future.result()
+            except Exception as e:
+                report["errors"].append(f"{sheet}: {e}")
+                print(f"⚠ {os.path.basename(path)}#{sheet}: {e}")
+                continue
+            report["parse_seconds"] += parse_seconds
+            if not batch.row_count:
+                continue
+            write_started = time.perf_counter()
+            try:
+                inserted = writer(batch)
+            except Exception as e:
+                report["errors"].append(f"{sheet}: {e}")
+                print(f"⚠ {os.path.basename(path)}#{sheet}: insert failed: {e}")
+                continue
+            report["write_seconds"] += time.perf_counter() - write_started
+            report["sheets"] += 1
+            report["rows"] += inserted
+            report["duplicates"] += batch.row_count - inserted
+            report["rejected"] += batch.rejected
+            for name, count in batch.errors.items():
+                report["rejected_by_column"][name] = report["rejected_by_column"].get(name, 0) + count
+
+    elapsed = time.perf_counter() - started
+    for report in reports.values():
+        busy = report["parse_seconds"] + report["write_seconds"]
+        report["rows_per_second"] = round(report["rows"] / busy, 1) if busy else 0.0
+        print(
+            f"  {os.path.basename(report['file'])}: {report['rows']} rows from {report['sheets']} sheet(s), "
+            f"{report['duplicates']} duplicate(s) skipped, {report['rejected']} rejected, parse {report['parse_seconds']:.2f}s, "
+            f"write {report['write_seconds']:.2f}s ({report['rows_per_second']} rows/s)"
+        )
+    total_rows = sum(r["rows"] for r in reports.values())
+    print(f"✓ Ingested {total_rows} rows in {elapsed:.2f}s ({total_rows / elapsed if elapsed else 0:.0f} rows/s)")
+    return list(reports.values())
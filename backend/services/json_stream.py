@@ -0,0 +1,55 @@
+# Incremental scanning of a JSON object that arrives in pieces (a streamed
+# json_object completion), so a field can be used before the rest of the
+# document - e.g. run the `sql` while the model is still writing the
+# `explanation`.
+import json
+
+
+class FieldScanner:
+    """Reports each top-level string field as soon as its closing quote arrives."""
+
+    def __init__(self):
+        self.text = ""
+        self.fields = {}
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = None
+        self._key = None
+
+    def feed(self, chunk: str) -> list:
+        """Add a chunk; return the (name, value) pairs completed by it."""
+        self.text += chunk
+        completed = []
+        text = self.text
+        for i in range(self._pos, len(text)):
+            ch = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._string_done(json.loads(text[self._start:i + 1]), completed)
+            elif ch == '"':
+                self._in_string = True
+                self._start = i
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+            elif ch == "," and self._depth == 1:
+                self._key = None
+        self._pos = len(text)
+        return completed
+
+    def _string_done(self, value: str, completed: list):
+        if self._key is None:
+            self._key = value
+            return
+        self.fields[self._key] = value
+        completed.append((self._key, value))
+        self._key = None
@@ -0,0 +1,525 @@
+import os
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import httpx
+from openai import OpenAI, AsyncOpenAI, APIStatusError, APIConnectionError, APITimeoutError
+
+from backend.services import metrics, usage
+
+# One keep-alive connection pool per process, shared by every call site
+OPENAI_TIMEOUT = float(os.environ.get("OPENAI_TIMEOUT", "30"))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", "5"))
+OPENAI_MAX_RETRIES = int(os.environ.get("OPENAI_MAX_RETRIES", "2"))
+OPENAI_RETRY_BASE_DELAY = float(os.environ.get("OPENAI_RETRY_BASE_DELAY", "0.5"))
+OPENAI_RETRY_MAX_DELAY = float(os.environ.get("OPENAI_RETRY_MAX_DELAY", "8"))
+OPENAI_POOL_SIZE = int(os.environ.get("OPENAI_POOL_SIZE", "20"))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "120"))
+
+# Model policy
+OPENAI_MODEL = os.environ.get("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_FALLBACK_MODEL = os.environ.get("OPENAI_FALLBACK_MODEL")
+OPENAI_FALLBACK_BASE_URL = os.environ.get("OPENAI_FALLBACK_BASE_URL")
+OPENAI_FALLBACK_API_KEY = os.environ.get("OPENAI_FALLBACK_API_KEY")
+# Send a duplicate request if the first has not answered after this many ms (0 = off)
+LLM_HEDGE_DELAY_MS = float(os.environ.get("LLM_HEDGE_DELAY_MS", "0"))
+# Share of the call deadline the primary may use before the fallback is tried
+LLM_PRIMARY_DEADLINE_SHARE = float(os.environ.get("LLM_PRIMARY_DEADLINE_SHARE", "0.6"))
+# Open the circuit after this many consecutive failed calls, for this many seconds
+LLM_BREAKER_THRESHOLD = int(os.environ.get("LLM_BREAKER_THRESHOLD", "5"))
+LLM_BREAKER_COOLDOWN = float(os.environ.get("LLM_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+# Only these say the endpoint itself is unhealthy; a 400/401/404 is the request's fault
+BREAKER_STATUS = {429}
+
+_lock = threading.Lock()
+_stats = {"requests": 0, "new_connections": 0, "retries": 0, "timeouts": 0, "failures": 0,
+          "hedges": 0, "hedge_wins": 0, "fallbacks": 0, "short_circuited": 0}
+_hedge_pool = ThreadPoolExecutor(max_workers=OPENAI_POOL_SIZE, thread_name_prefix="llm-hedge")
+
+
+class LLMError(Exception):
+    """An LLM call failed after retries or ran past its deadline."""
+
+
+class CircuitOpenError(LLMError):
+    """Every configured model endpoint is failing; callers should answer locally."""
+
+
+def _count(field: str, amount: int = 1):
+    with _lock:
+        _stats[field] += amount
+
+
+def _on_trace(event_name: str, info: dict):
+    if event_name == "connection.connect_tcp.complete":
+        _count("new_connections")
+        metrics.inc("llm_http_connections_total")
+
+
+async def _on_trace_async(event_name: str, info: dict):
+    _on_trace(event_name, info)
+
+
+class _TracingTransport(httpx.HTTPTransport):
+    def handle_request(self, request):
+        request.extensions["trace"] = _on_trace
+        _count("requests")
+        metrics.inc("llm_http_requests_total")
+        return super().handle_request(request)
+
+
+class _AsyncTracingTransport(httpx.AsyncHTTPTransport):
+    async def handle_async_request(self, request):
+        request.extensions["trace"] = _on_trace_async
+        _count("requests")
+        metrics.inc("llm_http_requests_total")
+        return await super().handle_async_request(request)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=OPENAI_POOL_SIZE,
+        max_keepalive_connections=OPENAI_POOL_SIZE,
+        keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> httpx.Timeout:
+    return httpx.Timeout(OPENAI_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT)
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed -> open (cooldown) -> half-open probe."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= LLM_BREAKER_COOLDOWN:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                # Let a single probe through after the cooldown
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+        metrics.set_gauge("llm_circuit_open", 0, target=self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= LLM_BREAKER_THRESHOLD:
+                if self.opened_at is None or self._probing:
+                    print(f"⚠ LLM circuit '{self.name}' opened after {self.failures} failure(s)")
+                self.opened_at = time.monotonic()
+            self._probing = False
+        if self.opened_at is not None:
+            metrics.set_gauge("llm_circuit_open", 1, target=self.name)
+
+    def record(self, error: Exception):
+        """Count a failed call against the breaker only if the endpoint is at fault."""
+        if _is_endpoint_failure(error):
+            self.record_failure()
+        else:
+            self.release()
+
+    def release(self):
+        """End a call without a verdict (bad request, abandoned stream), freeing the probe slot."""
+        with self._lock:
+            self._probing = False
+
+
+class _Target:
+    """A model + endpoint pair with its own clients and breaker."""
+
+    def __init__(self, name: str, model: str, base_url: str = None, api_key: str = None):
+        self.name = name
+        self.model = model
+        self.base_url = base_url
+        self.api_key = api_key
+        self.breaker = CircuitBreaker(name)
+        self._client = None
+        self._async_client = None
+
+    def client(self) -> OpenAI:
+        if self._client is None:
+            with _lock:
+                if self._client is None:
+                    self._client = OpenAI(
+                        api_key=self.api_key or os.environ.get("OPENAI_API_KEY"),
+                        base_url=self.base_url,
+                        max_retries=0,  # retries are handled below, with jitter and a deadline
+                        timeout=_timeout(),
+                        http_client=httpx.Client(
+                            transport=_TracingTransport(limits=_limits()), timeout=_timeout()
+                        ),
+                    )
+        return self._client
+
+    def async_client(self) -> AsyncOpenAI:
+        if self._async_client is None:
+            with _lock:
+                if self._async_client is None:
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.api_key or os.environ.get("OPENAI_API_KEY"),
+                        base_url=self.base_url,
+                        max_retries=0,
+                        timeout=_timeout(),
+                        http_client=httpx.AsyncClient(
+                            transport=_AsyncTracingTransport(limits=_limits()), timeout=_timeout()
+                        ),
+                    )
+        return self._async_client
+
+
+_primary = _Target("primary", OPENAI_MODEL)
+_fallback = None
+if OPENAI_FALLBACK_MODEL or OPENAI_FALLBACK_BASE_URL:
+    _fallback = _Target(
+        "fallback", OPENAI_FALLBACK_MODEL or OPENAI_MODEL,
+        OPENAI_FALLBACK_BASE_URL, OPENAI_FALLBACK_API_KEY
+    )
+
+
+def _targets() -> list:
+    return [_primary] + ([_fallback] if _fallback else [])
+
+
+def get_client() -> OpenAI:
+    """Process-wide OpenAI client for the primary model, created on first use."""
+    return _primary.client()
+
+
+def get_async_client() -> AsyncOpenAI:
+    return _primary.async_client()
+
+
+def _retry_delay(attempt: int, error: Exception) -> float:
+    """Full-jitter exponential backoff, honouring Retry-After when sent."""
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), OPENAI_RETRY_MAX_DELAY)
+        except ValueError:
+            pass
+    cap = min(OPENAI_RETRY_MAX_DELAY, OPENAI_RETRY_BASE_DELAY * (2 ** attempt))
+    return random.uniform(0, cap)
+
+
+def _is_retryable(error: Exception) -> bool:
+    if isinstance(error, (APIConnectionError, APITimeoutError)):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code in RETRYABLE_STATUS
+
+
+def _is_endpoint_failure(error: Exception) -> bool:
+    """Timeouts, connection errors, 429s and 5xx (also when wrapped in LLMError)."""
+    if isinstance(error, LLMError) and error.__cause__ is not None:
+        error = error.__cause__
+    if isinstance(error, (APIConnectionError, APITimeoutError, httpx.TransportError)):
+        return True
+    return isinstance(error, APIStatusError) and (error.status_code in BREAKER_STATUS or error.status_code >= 500)
+
+
+def _next_attempt(error: Exception, attempt: int, deadline: float):
+    """Return the backoff delay before retrying, or raise LLMError."""
+    if isinstance(error, APITimeoutError):
+        _count("timeouts")
+    remaining = deadline - time.monotonic()
+    if not _is_retryable(error) or attempt >= OPENAI_MAX_RETRIES or remaining <= 0:
+        _count("failures")
+        metrics.inc("llm_failures_total", error=type(error).__name__)
+        raise LLMError(f"{type(error).__name__}: {error}") from error
+    delay = _retry_delay(attempt, error)
+    if delay >= remaining:
+        _count("failures")
+        metrics.inc("llm_failures_total", error="DeadlineExceeded")
+        raise LLMError(f"Deadline exceeded retrying after {type(error).__name__}") from error
+    _count("retries")
+    metrics.inc("llm_retries_total", error=type(error).__name__)
+    return delay
+
+
+def _create(target: _Target, kwargs: dict, timeout: float):
+    response = target.client().chat.completions.create(model=target.model, timeout=timeout, **kwargs)
+    # Every attempt, including a losing hedge, is billed
+    usage.record(response)
+    return response
+
+
+def _hedged_create(target: _Target, kwargs: dict, deadline: float):
+    """One attempt, duplicated after LLM_HEDGE_DELAY_MS if still unanswered."""
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise APITimeoutError(request=httpx.Request("POST", "hedge://deadline"))
+    if LLM_HEDGE_DELAY_MS <= 0 or LLM_HEDGE_DELAY_MS / 1000 >= remaining:
+        return _create(target, kwargs, remaining)
+
+    first = _hedge_pool.submit(contextvars.copy_context().run, _create, target, kwargs, remaining)
+    done, _ = wait([first], timeout=LLM_HEDGE_DELAY_MS / 1000)
+    if done:
+        return first.result()
+
+    _count("hedges")
+    metrics.inc("llm_hedges_total", target=target.name)
+    remaining = deadline - time.monotonic()
+    second = _hedge_pool.submit(contextvars.copy_context().run, _create, target, kwargs, remaining)
+    pending = {first, second}
+    error = None
+    while pending:
+        done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                if future is second:
+                    _count("hedge_wins")
+                    metrics.inc("llm_hedge_wins_total", target=target.name)
+                return future.result()
+            error = future.exception()
+    raise error or APITimeoutError(request=httpx.Request("POST", "hedge://deadline"))
+
+
+def _call_target(target: _Target, kwargs: dict, deadline: float):
+    attempt = 0
+    while True:
+        try:
+            return _hedged_create(target, kwargs, deadline)
+        except Exception as e:
+            time.sleep(_next_attempt(e, attempt, deadline))
+            attempt += 1
+
+
+def _target_deadlines(timeout: float) -> list:
+    started = time.monotonic()
+    total = timeout or OPENAI_TIMEOUT
+    targets = _targets()
+    if len(targets) == 1:
+        return [(targets[0], started + total)]
+    return [
+        (targets[0], started + total * LLM_PRIMARY_DEADLINE_SHARE),
+        (targets[1], started + total),
+    ]
+
+
+def chat_completion(timeout: float = None, **kwargs):
+    """chat.completions.create behind the model policy.
+
+    Per target: a deadline, jittered retries and an optional hedged duplicate.
+    Across targets: primary first, then the fallback model/endpoint, each
+    guarded by a circuit breaker. Raises CircuitOpenError without calling out
+    when every breaker is open.
+    """
+    errors = []
+    for target, deadline in _target_deadlines(timeout):
+        if not target.breaker.allow():
+            continue
+        if target is not _primary:
+            _count("fallbacks")
+            metrics.inc("llm_fallbacks_total")
+        try:
+            response = _call_target(target, kwargs, deadline)
+        except LLMError as e:
+            target.breaker.record(e)
+            errors.append(e)
+            continue
+        target.breaker.record_success()
+        return response
+    return _raise_unavailable(errors)
+
+
+def _open_stream(target: _Target, kwargs: dict, deadline: float):
+    """Start a streamed completion; retried like _call_target until the response headers arrive."""
+    attempt = 0
+    while True:
+        try:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise APITimeoutError(request=httpx.Request("POST", "stream://deadline"))
+            return target.client().chat.completions.create(
+                model=target.model, timeout=remaining, stream=True,
+                stream_options={"include_usage": True}, **kwargs
+            )
+        except Exception as e:
+            time.sleep(_next_attempt(e, attempt, deadline))
+            attempt += 1
+
+
+def stream_completion(timeout: float = None, **kwargs):
+    """Streamed chat completion: yields content deltas as they arrive.
+
+    Same targets, deadlines, retries and breakers as chat_completion, but
+    failover only happens before the first chunk (a stream cannot be resumed
+    elsewhere) and there is no hedging. A stream that breaks midway raises
+    LLMError.
+    """
+    errors = []
+    for target, deadline in _target_deadlines(timeout):
+        if not target.breaker.allow():
+            continue
+        if target is not _primary:
+            _count("fallbacks")
+            metrics.inc("llm_fallbacks_total")
+        try:
+            stream = _open_stream(target, kwargs, deadline)
+        except LLMError as e:
+            target.breaker.record(e)
+            errors.append(e)
+            continue
+        finished = False
+        try:
+            for chunk in stream:
+                if chunk.usage is not None:
+                    usage.record(chunk)
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+            finished = True
+        except Exception as e:
+            target.breaker.record(e)
+            _count("failures")
+            metrics.inc("llm_failures_total", error="StreamInterrupted")
+            raise LLMError(f"Stream interrupted: {type(e).__name__}: {e}") from e
+        finally:
+            stream.close()
+            # Consumer went away (GeneratorExit, disconnect): no verdict, but free a half-open probe
+            if not finished:
+                target.breaker.release()
+        target.breaker.record_success()
+        return
+    _raise_unavailable(errors)
+
+
+def _raise_unavailable(errors: list):
+    if errors:
+        raise errors[-1]
+    _count("short_circuited")
+    metrics.inc("llm_short_circuited_total")
+    raise CircuitOpenError("All LLM circuits are open")
+
+
+async def _acreate(target: _Target, kwargs: dict, timeout: float):
+    response = await target.async_client().chat.completions.create(model=target.model, timeout=timeout, **kwargs)
+    usage.record(response)
+    return response
+
+
+async def _ahedged_create(target: _Target, kwargs: dict, deadline: float):
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise APITimeoutError(request=httpx.Request("POST", "hedge://deadline"))
+    if LLM_HEDGE_DELAY_MS <= 0 or LLM_HEDGE_DELAY_MS / 1000 >= remaining:
+        return await _acreate(target, kwargs, remaining)
+
+    first = asyncio.ensure_future(_acreate(target, kwargs, remaining))
+    done, _ = await asyncio.wait({first}, timeout=LLM_HEDGE_DELAY_MS / 1000)
+    if done:
+        return first.result()
+
+    _count("hedges")
+    metrics.inc("llm_hedges_total", target=target.name)
+    second = asyncio.ensure_future(_acreate(target, kwargs, deadline - time.monotonic()))
+    pending = {first, second}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(deadline - time.monotonic(), 0), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        _count("hedge_wins")
+                        metrics.inc("llm_hedge_wins_total", target=target.name)
+                    return task.result()
+                error = task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+    raise error or APITimeoutError(request=httpx.Request("POST", "hedge://deadline"))
+
+
+async def achat_completion(timeout: float = None, **kwargs):
+    """Async variant of chat_completion for use from async routes."""
+    errors = []
+    for target, deadline in _target_deadlines(timeout):
+        if not target.breaker.allow():
+            continue
+        if target is not _primary:
+            _count("fallbacks")
+            metrics.inc("llm_fallbacks_total")
+        attempt = 0
+        try:
+            while True:
+                try:
+                    response = await _ahedged_create(target, kwargs, deadline)
+                    break
+                except Exception as e:
+                    await asyncio.sleep(_next_attempt(e, attempt, deadline))
+                    attempt += 1
+        except LLMError as e:
+            target.breaker.record(e)
+            errors.append(e)
+            continue
+        except asyncio.CancelledError:
+            target.breaker.release()
+            raise
+        target.breaker.record_success()
+        return response
+    return _raise_unavailable(errors)
+
+
+def is_available() -> bool:
+    """False when every target's circuit is open (callers should answer locally)."""
+    return any(target.breaker.state != "open" for target in _targets())
+
+
+def circuit_state() -> dict:
+    return {
+        target.name: {"model": target.model, "state": target.breaker.state, "failures": target.breaker.failures}
+        for target in _targets()
+    }
+
+
+def connection_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+    requests = stats["requests"]
+    stats["reused_connections"] = max(requests - stats["new_connections"], 0)
+    stats["reuse_ratio"] = round(stats["reused_connections"] / requests, 3) if requests else None
+    stats["pool_size"] = OPENAI_POOL_SIZE
+    stats["keepalive_expiry"] = OPENAI_KEEPALIVE_EXPIRY
+    stats["hedge_delay_ms"] = LLM_HEDGE_DELAY_MS
+    stats["circuits"] = circuit_state()
+    return stats
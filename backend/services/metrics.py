@@ -0,0 +1,222 @@
+import os
+import json
+import inspect
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from functools import wraps
+
+# Print every request trace as a JSON line (clients can also ask per request
+# with the X-Debug-Trace header)
+TRACE_REQUESTS = os.environ.get("TRACE_REQUESTS", "").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 20, 100, 500, 1000, 5000, 10000)
+
+_lock = threading.Lock()
+_current_trace = contextvars.ContextVar("current_trace", default=None)
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class RequestTrace:
+    def __init__(self, method: str, path: str):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def to_dict(self) -> dict:
+        return {
+            "method": self.method,
+            "path": self.path,
+            "duration_ms": round(self.elapsed() * 1000, 2),
+            "spans": self.spans,
+        }
+
+
+# name -> labels tuple -> metric
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+def _labels_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def observe(name: str, value: float, buckets=LATENCY_BUCKETS, **labels):
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        key = _labels_key(labels)
+        if key not in series:
+            series[key] = Histogram(buckets)
+        series[key].observe(value)
+
+
+def inc(name: str, amount: float = 1, **labels):
+    with _lock:
+        series = _counters.setdefault(name, {})
+        key = _labels_key(labels)
+        series[key] = series.get(key, 0) + amount
+
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges.setdefault(name, {})[_labels_key(labels)] = value
+
+
+def start_trace(method: str, path: str):
+    trace = RequestTrace(method, path)
+    token = _current_trace.set(trace)
+    return trace, token
+
+
+def reset_trace(token):
+    _current_trace.reset(token)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def finish_trace(trace: RequestTrace, route: str, status_code: int, emit: bool = False):
+    """Record the request duration and optionally print the trace as JSON."""
+    duration = trace.elapsed()
+    observe("request_duration_seconds", duration, route=route, method=trace.method)
+    inc("requests_total", route=route, method=trace.method, status=str(status_code))
+    if emit or TRACE_REQUESTS:
+        payload = trace.to_dict()
+        payload["route"] = route
+        payload["status"] = status_code
+        print(f"[trace] {json.dumps(payload, default=str)}")
+
+
+@contextmanager
+def stage(name: str, **attrs):
+    """Time a pipeline stage and attach it to the current request trace."""
+    trace = _current_trace.get()
+    span = {"stage": name}
+    span.update(attrs)
+    token = _current_span.set(span)
+    started = time.perf_counter()
+    try:
+        yield span
+    except Exception as e:
+        span["error"] = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - started
+        _current_span.reset(token)
+        span["duration_ms"] = round(duration * 1000, 2)
+        if trace is not None:
+            span["offset_ms"] = round((started - trace.started) * 1000, 2)
+            trace.spans.append(span)
+        observe("stage_duration_seconds", duration, stage=name)
+        if "rows" in span:
+            observe("stage_rows", span["rows"], buckets=ROW_BUCKETS, stage=name)
+
+
+def timed(name: str):
+    """Decorator form of stage(); works on plain and async functions."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with stage(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def annotate(**attrs):
+    """Add attributes (rows, cache, ...) to the innermost active stage."""
+    span = _current_span.get()
+    if span is not None:
+        span.update(attrs)
+
+
+def record_llm_usage(response):
+    """Attach prompt/completion token counts from an OpenAI response."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    span = _current_span.get()
+    stage_name = span["stage"] if span else "unknown"
+    if span is not None:
+        span["prompt_tokens"] = span.get("prompt_tokens", 0) + prompt_tokens
+        span["completion_tokens"] = span.get("completion_tokens", 0) + completion_tokens
+    inc("llm_tokens_total", prompt_tokens, stage=stage_name, kind="prompt")
+    inc("llm_tokens_total", completion_tokens, stage=stage_name, kind="completion")
+
+
+def record_cache(cache: str, hit: bool):
+    annotate(cache="hit" if hit else "miss")
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def server_timing_header(trace: RequestTrace) -> str:
+    """Aggregate spans per stage into a Server-Timing header value."""
+    totals = {}
+    for span in trace.spans:
+        totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["duration_ms"]
+    parts = [f"{name};dur={dur:.1f}" for name, dur in totals.items()]
+    parts.append(f"total;dur={trace.elapsed() * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def _format_labels(key: tuple, extra: dict = None) -> str:
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ""
+    inner = ",".join(f'{k}="{str(v)}"' for k, v in items)
+    return "{" + inner + "}"
+
+
+def render_prometheus(prefix: str = "procbot_") -> str:
+    """Render all metrics in the Prometheus text exposition format."""
+    lines = []
+    with _lock:
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# TYPE {prefix}{name} histogram")
+            for key, hist in series.items():
+                for bound, count in zip(hist.buckets, hist.counts):
+                    lines.append(f"{prefix}{name}_bucket{_format_labels(key, {'le': bound})} {count}")
+                lines.append(f"{prefix}{name}_bucket{_format_labels(key, {'le': '+Inf'})} {hist.total}")
+                lines.append(f"{prefix}{name}_sum{_format_labels(key)} {hist.sum}")
+                lines.append(f"{prefix}{name}_count{_format_labels(key)} {hist.total}")
+        for name, series in sorted(_counters.items()):
+            lines.append(f"# TYPE {prefix}{name} counter")
+            for key, value in series.items():
+                lines.append(f"{prefix}{name}{_format_labels(key)} {value}")
+        for name, series in sorted(_gauges.items()):
+            lines.append(f"# TYPE {prefix}{name} gauge")
+            for key, value in series.items():
+                lines.append(f"{prefix}{name}{_format_labels(key)} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,21 @@
 import os
 import re
-from openai import OpenAI
-
-client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+import time
+import hashlib
+from backend.services import metrics, usage, llm, cache, json_stream, paraphrase
+from backend.services.resultset import as_text
+
+# Per-call deadlines (seconds), including retries
+SQL_TIMEOUT = float(os.environ.get("LLM_SQL_TIMEOUT", "20"))
+SUMMARY_TIMEOUT = float(os.environ.get("LLM_SUMMARY_TIMEOUT", "30"))
+FIX_TIMEOUT = float(os.environ.get("LLM_FIX_TIMEOUT", "15"))
+SUGGESTION_TIMEOUT = float(os.environ.get("LLM_SUGGESTION_TIMEOUT", "5"))
+
+# Ask for this many alternative queries per question (1 = a single query).
+# Candidates are checked with EXPLAIN and the first valid one is executed.
+SQL_CANDIDATES = int(os.environ.get("SQL_CANDIDATES", "1"))
+# Stream the SQL-generation call when a caller can act on the `sql` field early
+SQL_STREAMING = os.environ.get("SQL_STREAMING", "true").lower() in ("1", "true", "yes")
 
 SYSTEM_PROMPT = """You are a helpful procurement data analyst assistant. You help users query and understand procurement data from a PostgreSQL database.
 
@@ -91,7 +104,7 @@ SLA VARIANCE (Diff):
 - contract_and_po_diff_sla (real) - Contract and PO SLA difference
 
 RISK & STATUS TRACKING:
-- project_status (integer) - Project status code (5-15, higher=higher priority)
+- project_status (text) - Project status: "Completed", "Green", "Yellow", "Red" or "Blue" (TEXT values, not numeric)
 - risk (text) - Risk level: "Low", "Medium", "High", "Critical", or "None" (TEXT values, not numeric)
 - duration (integer) - Project duration
 - last_status_date (text) - Last status update date
@@ -141,6 +154,10 @@ IMPORTANT QUERY RULES:
 10. **Supplier substitution queries**: Generate query to show suppliers by rating, then explain analysis needed
 11. **Correlation/prediction queries**: Generate data extraction query, then explain statistical analysis needed
 12. planned values: "Yes"/"No", status values: 'Approved', 'Cancelled', 'Completed', 'In Progress', 'On Hold', 'Pending', 'Under Review'
+13. **Text search on description, supplier_details, note** (indexed - prefer these over ILIKE '%...%'):
+   - Topics/keywords (matches plurals and word forms): to_tsvector('english', description) @@ websearch_to_tsquery('english', 'cloud services')
+   - Names or words that may be misspelled (typo-tolerant): 'suplier-658' <% supplier_details, ranked with ORDER BY word_similarity('suplier-658', supplier_details) DESC
+   - Use the column name directly inside to_tsvector (no COALESCE or concatenation)
 
 EXAMPLE QUERIES (use these as reference):
 - "Total budget": SELECT SUM(budget) FROM procurement_records
@@ -156,6 +173,8 @@ EXAMPLE QUERIES (use these as reference):
 - "SLA breaches": SELECT pr_number, evaluation_diff_sla FROM procurement_records WHERE evaluation_diff_sla < 0
 - "PRs in evaluation": SELECT pr_number, status_duration FROM procurement_records WHERE status = 'Under Review'
 - "Q3 budget": SELECT department, SUM(budget_q3) FROM procurement_records WHERE year = 2024 GROUP BY department
+- "Security projects": SELECT pr_number, description, department, budget FROM procurement_records WHERE to_tsvector('english', description) @@ websearch_to_tsquery('english', 'security')
+- "PRs for supplier Suplier-65" (possible typo): SELECT pr_number, supplier_details, description, budget FROM procurement_records WHERE 'Suplier-65' <% supplier_details ORDER BY word_similarity('Suplier-65', supplier_details) DESC
 
 When the user asks a question about procurement data:
 1. Understand their intent in ANY language they use
@@ -182,6 +201,27 @@ If the user's question cannot be answered with a SQL query or is just a greeting
 
 IMPORTANT: Only generate SELECT queries. Never generate INSERT, UPDATE, DELETE, DROP, or any other modifying queries."""
 
+CANDIDATES_PROMPT = """Instead of a single query, return up to {count} alternative candidate queries, best first:
+{{
+  "candidates": [
+    {{"sql": "SELECT ...", "explanation": "Brief explanation in the user's language"}},
+    {{"sql": "SELECT ...", "explanation": "..."}}
+  ]
+}}
+Alternatives must differ in how they interpret or construct the query (columns, casts, grouping, filters), not only in formatting. Each one is checked against the database before execution, so include safer variants (e.g. without casts) when unsure.
+If the message cannot be answered with SQL, return {{"sql": null, "explanation": "..."}} as usual."""
+
+# Cached SQL outlives a deploy; changing the prompts or the model starts a fresh keyspace
+PROMPT_VERSION = hashlib.sha256(
+    "\0".join((SYSTEM_PROMPT, CANDIDATES_PROMPT, llm.OPENAI_MODEL)).encode()
+).hexdigest()[:12]
+
+BUDGET_EXHAUSTED_MESSAGE = "The AI usage budget for this request has been reached. Please ask fewer questions at once or try again later."
+LLM_UNAVAILABLE_MESSAGE = "The AI service is temporarily unavailable. Please try again in a moment."
+LLM_UNAVAILABLE_MESSAGE_AR = "خدمة الذكاء الاصطناعي غير متاحة مؤقتًا. يرجى المحاولة مرة أخرى بعد قليل."
+BUDGET_EXHAUSTED_MESSAGE_AR = "تم الوصول إلى حد استخدام الذكاء الاصطناعي لهذا الطلب. يرجى طرح أسئلة أقل في المرة الواحدة أو المحاولة لاحقًا."
+
+@metrics.timed("split_questions")
 def split_questions(message: str) -> list[str]:
     """Split message into individual questions if multiple questions detected."""
     # Split by newlines first
@@ -202,7 +242,43 @@ def split_questions(message: str) -> list[str]:
     # Otherwise return as single question
     return [message]
 
-def process_chat(message: str, language: str = "en", history: list = None) -> dict:
+def _history_key(history: list) -> list:
+    if not history:
+        return []
+    return [(msg.get("role"), msg.get("content")) for msg in history[-10:]]
+
+def _stream_json(on_sql, **kwargs) -> str:
+    """Stream a json_object completion, calling on_sql(sql) as soon as the field is complete."""
+    started = time.perf_counter()
+    scanner = json_stream.FieldScanner()
+    for delta in llm.stream_completion(**kwargs):
+        for name, value in scanner.feed(delta):
+            if name == "sql" and value:
+                metrics.annotate(sql_ready_ms=round((time.perf_counter() - started) * 1000, 1))
+                on_sql(value)
+    metrics.annotate(streamed=True)
+    return scanner.text
+
+@metrics.timed("process_chat")
+def process_chat(message: str, language: str = "en", history: list = None, on_sql=None) -> dict:
+    """Generate SQL (and an explanation) for a question.
+
+    on_sql, if given, is called with the generated SQL while the rest of the
+    response is still streaming, so the caller can start executing it.
+    """
+    sql_key = cache.key(message.strip(), language, _history_key(history), SQL_CANDIDATES, PROMPT_VERSION)
+    cached = cache.get("sql", sql_key)
+    if cached is not None:
+        return cached
+    if not history:
+        reused = paraphrase.lookup(message, language)
+        if reused is not None:
+            return reused
+    if not usage.allow("sql"):
+        return {
+            "sql": None,
+            "explanation": BUDGET_EXHAUSTED_MESSAGE_AR if language == "ar" else BUDGET_EXHAUSTED_MESSAGE
+        }
     try:
         # Build conversation messages with history for context
         messages = [{"role": "system", "content": SYSTEM_PROMPT}]
@@ -217,32 +293,57 @@ def process_chat(message: str, language: str = "en", history: list = None) -> di
                 if role and content:
                     messages.append({"role": role, "content": content})
         
+        if SQL_CANDIDATES > 1:
+            messages.append({"role": "system", "content": CANDIDATES_PROMPT.format(count=SQL_CANDIDATES)})
+        
         # Add current user message
         messages.append({"role": "user", "content": f"User's language preference: {language}\n\nUser message: {message}"})
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        request = dict(
+            timeout=SQL_TIMEOUT,
             messages=messages,
             response_format={"type": "json_object"},
             temperature=0.3,
-            max_tokens=1000
+            max_tokens=max(1000, 500 * SQL_CANDIDATES)
         )
-        
-        content = response.choices[0].message.content
+        if on_sql is not None and SQL_STREAMING and SQL_CANDIDATES == 1:
+            content = _stream_json(on_sql, **request)
+        else:
+            content = llm.chat_completion(**request).choices[0].message.content
         import json
         result = json.loads(content)
         
-        return {
+        candidates = [c for c in result.get("candidates") or [] if isinstance(c, dict) and c.get("sql")]
+        if candidates:
+            result = candidates[0]
+        generated = {
             "sql": result.get("sql"),
             "explanation": result.get("explanation", "")
         }
+        if len(candidates) > 1:
+            generated["candidates"] = [c["sql"] for c in candidates[:SQL_CANDIDATES]]
+        if history:
+            # Depends on the conversation; never reused for another question
+            generated["contextual"] = True
+        cache.put("sql", sql_key, generated)
+        return generated
+    except llm.LLMError as e:
+        print(f"⚠ SQL generation failed: {e}")
+        metrics.annotate(error="LLMError")
+        return {
+            "sql": None,
+            "explanation": LLM_UNAVAILABLE_MESSAGE_AR if language == "ar" else LLM_UNAVAILABLE_MESSAGE
+        }
     except Exception as e:
+        metrics.annotate(error=type(e).__name__)
         return {
             "sql": None,
             "explanation": f"Error processing your request: {str(e)}"
         }
 
+@metrics.timed("generate_response")
 def generate_response(query_results: list, original_question: str, language: str = "en") -> str:
+    metrics.annotate(rows=len(query_results))
     if not query_results:
         # Detect if question is in Arabic or English
         is_arabic = language == "ar" or any(ord(c) >= 0x0600 and ord(c) <= 0x06FF for c in original_question)
@@ -260,10 +361,6 @@ def generate_response(query_results: list, original_question: str, language: str
             if is_arabic:
                 return "لا توجد طلبات شراء في مرحلة التقييم لأكثر من 30 يومًا. الحد الأقصى في البيانات الحالية هو 30 يومًا. حاول البحث عن '> 25 يومًا' (11 طلبًا) أو '> 20 يومًا' (21 طلبًا) بدلاً من ذلك."
             return "No PRs found in evaluation for more than 30 days. The maximum duration in current data is 30 days. Try searching for '> 25 days' (11 PRs) or '> 20 days' (21 PRs) instead."
-        elif "John Smith" in original_question or "XYZ" in original_question:
-            if is_arabic:
-                return "لم يتم العثور على سجلات بهذا الاسم أو رقم الطلب. يرجى التحقق من الاسم/الرقم الدقيق أو محاولة تصفح السجلات المتاحة."
-            return "No records found with that specific name or PR number. Please check the exact name/number or try browsing available records."
         elif "my department" in original_question.lower() or "قسمي" in original_question or "إدارتي" in original_question:
             if is_arabic:
                 return "يرجى تحديد اسم القسم (مثل: تقنية المعلومات، المالية، الموارد البشرية، المبيعات، التسويق، البحث والتطوير، العمليات، القانونية، المشتريات، الهندسة)."
@@ -277,13 +374,22 @@ def generate_response(query_results: list, original_question: str, language: str
                 return "لا توجد سجلات تطابق معايير البحث. حاول تعديل الفلاتر أو التحقق من نطاقات البيانات المتاحة (الأعوام 2024-2025)."
             return "No records match your query criteria. Try adjusting your filters or checking available data ranges (years 2024-2025)."
     
+    # Send all results to AI for accurate analysis (up to 100 records for display)
+    display_limit = 100
+    answer_key = cache.key(original_question, language, len(query_results), query_results[:display_limit])
+    cached = cache.get("answer", answer_key)
+    if cached is not None:
+        return cached
+    
+    if not usage.allow("summary"):
+        return render_local_response(query_results, original_question, language)
+    
     try:
-        # Send all results to AI for accurate analysis (up to 100 records for display)
-        display_limit = 100
-        all_data_str = str(query_results[:display_limit])
+        # Header once, then one line per row (not one dict repr per row)
+        all_data_str = as_text(query_results[:display_limit])
         
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = llm.chat_completion(
+            timeout=SUMMARY_TIMEOUT,
             messages=[
                 {"role": "system", "content": f"""You are a data analyst providing ACCURATE, CLEAR responses.
 
@@ -305,16 +411,61 @@ If >20 records: Show first 20 rows in table and state "Showing 20 of X total res
 If ≤20 records: Show ALL rows
 
 Format numbers clearly with commas and proper alignment."""},
-                {"role": "user", "content": f"Question: {original_question}\n\nData: {all_data_str}\n\nTotal records: {len(query_results)}\n\nProvide accurate response with table if applicable."}
+                {"role": "user", "content": f"Question: {original_question}\n\nData:\n{all_data_str}\n\nTotal records: {len(query_results)}\n\nProvide accurate response with table if applicable."}
             ],
             temperature=0.1,
             max_tokens=1500
         )
         
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        cache.put("answer", answer_key, answer)
+        return answer
+    except llm.LLMError as e:
+        # Still answer with the data we have
+        print(f"⚠ Summary generation failed: {e}")
+        metrics.annotate(error="LLMError")
+        return render_local_response(query_results, original_question, language)
     except Exception as e:
+        metrics.annotate(error=type(e).__name__)
         return f"Found {len(query_results)} records. Error generating summary: {str(e)}"
 
+def _format_cell(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+def render_markdown_table(rows: list, limit: int = None, max_columns: int = None) -> str:
+    """Render result rows as a markdown table without calling the model."""
+    if not rows:
+        return ""
+    columns = list(rows[0].keys())
+    if max_columns:
+        columns = columns[:max_columns]
+    shown = rows[:limit] if limit else rows
+    lines = [
+        "| " + " | ".join(columns) + " |",
+        "|" + "|".join("---" for _ in columns) + "|",
+    ]
+    for row in shown:
+        lines.append("| " + " | ".join(_format_cell(row.get(col)) for col in columns) + " |")
+    return "\n".join(lines)
+
+def render_local_response(query_results: list, original_question: str, language: str = "en") -> str:
+    """Plain summary + table used when the model is unavailable or over budget."""
+    total = len(query_results)
+    is_arabic = language == "ar" or any(ord(c) >= 0x0600 and ord(c) <= 0x06FF for c in original_question)
+    if is_arabic:
+        parts = ["**النتائج**", f"تم العثور على {total} سجل."]
+    else:
+        parts = ["**Results**", f"Found {total} record{'s' if total != 1 else ''}."]
+    parts.append(render_markdown_table(query_results, limit=20, max_columns=8))
+    if total > 20:
+        parts.append(f"Showing 20 of {total} total results")
+    return "\n\n".join(parts)
+
+@metrics.timed("validate_sql")
 def validate_sql(sql: str) -> bool:
     if not sql:
         return False
@@ -340,8 +491,11 @@ def validate_sql(sql: str) -> bool:
     
     return True
 
+@metrics.timed("fix_failed_query")
 def fix_failed_query(failed_sql: str, error_message: str, original_question: str, language: str = "en") -> dict:
     """Try to fix a failed SQL query based on the error message."""
+    if not usage.allow("fix"):
+        return {"sql": None, "explanation": "Could not fix query"}
     try:
         fix_prompt = f"""The following SQL query failed with an error. Please fix it.
 
@@ -361,8 +515,8 @@ Generate the corrected SQL query. Return JSON format:
   "explanation": "What was fixed"
 }}"""
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = llm.chat_completion(
+            timeout=FIX_TIMEOUT,
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": fix_prompt}
@@ -375,7 +529,8 @@ Generate the corrected SQL query. Return JSON format:
         import json
         result = json.loads(response.choices[0].message.content)
         return result
-    except:
+    except Exception as e:
+        print(f"⚠ Query repair failed: {e}")
         return {"sql": None, "explanation": "Could not fix query"}
 
 def generate_error_response(error_message: str, original_question: str, language: str = "en") -> str:
@@ -394,8 +549,11 @@ def generate_error_response(error_message: str, original_question: str, language
     else:
         return f"I encountered an error processing your request. Please try rephrasing your question or breaking it into smaller parts. If the issue persists, try asking about specific aspects like 'Show me IT department PRs' or 'What's the total budget for 2024?'"
 
+@metrics.timed("generate_query_suggestions")
 def generate_query_suggestions(partial_input: str, language: str = "en", conversation_context: list = None) -> list:
     """Generate smart query completion suggestions based on partial user input."""
+    if not usage.allow("suggestions"):
+        return []
     try:
         # Build context from conversation
         context_str = ""
@@ -438,8 +596,8 @@ Examples of GOOD autocomplete:
 Return ONLY valid JSON object with "suggestions" array:
 {{"suggestions": ["completion 1", "completion 2", "completion 3", "completion 4", "completion 5"]}}"""
 
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
+        response = llm.chat_completion(
+            timeout=SUGGESTION_TIMEOUT,
             messages=[
                 {"role": "system", "content": "You are a query suggestion assistant. Return only a valid JSON array of 5 string suggestions."},
                 {"role": "user", "content": prompt}
@@ -0,0 +1,314 @@
+# Reuse of the SQL generated for earlier questions. Every answered standalone
+# question is indexed as a TF-IDF vector over its words and character
+# trigrams, after folding domain terms and entity aliases to one spelling
+# ("PRs" / "procurement requests" / "طلبات الشراء" -> pr, "عالية" -> high).
+# A new question whose cosine similarity to one already answered clears
+# PARAPHRASE_THRESHOLD reuses that SQL instead of another model call, but only
+# if both ask about the same numbers, the same known values (department,
+# status, risk, supplier, contact) and the same qualifiers (top/last/count,
+# months, negations). Everything scoring above PARAPHRASE_NEAR_MISS that is
+# not reused is kept as a near miss (/admin/paraphrase) for tuning.
+import os
+import re
+import math
+import time
+import threading
+from collections import Counter, OrderedDict, deque
+
+from backend.services import entities, metrics, query_log
+
+PARAPHRASE_ENABLED = os.environ.get("PARAPHRASE_ENABLED", "true").lower() in ("1", "true", "yes")
+PARAPHRASE_THRESHOLD = float(os.environ.get("PARAPHRASE_THRESHOLD", "0.8"))
+# Scores from here up to the threshold are recorded as near misses
+PARAPHRASE_NEAR_MISS = float(os.environ.get("PARAPHRASE_NEAR_MISS", "0.55"))
+PARAPHRASE_MAX_ENTRIES = int(os.environ.get("PARAPHRASE_MAX_ENTRIES", "5000"))
+# Answered questions loaded from the query log after each data load
+PARAPHRASE_SEED = int(os.environ.get("PARAPHRASE_SEED", "2000"))
+
+SIMILARITY_BUCKETS = (0.3, 0.4, 0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1.0)
+_TRIGRAM_WEIGHT = 0.5
+_CANDIDATES = 50
+
+_ARABIC_DIGITS = str.maketrans("٠١٢٣٤٥٦٧٨٩", "0123456789")
+# Domain terms folded to one token before anything else (order matters)
+_TERMS = [
+    (r"(?:procurement|purchase|purchasing)\s+requests?|prs?|requests?|طلبات\s+الشراء|طلبات\s+شراء"
+     r"|طلب\s+الشراء|طلب\s+شراء|الطلبات|طلبات", "pr"),
+    (r"how\s+many|number\s+of|كم\s+عدد|عدد|كم", "count"),
+    (r"المخاطر|مخاطر|الخطورة|خطورة|المخاطرة", "risk"),
+    (r"الميزانيات|الميزانية|ميزانية", "budget"),
+    (r"departments?|الإدارات|الأقسام|الإدارة|إدارة|القسم|قسم", "department"),
+    (r"suppliers?|vendors?|الموردين|موردين|المورد|مورد", "supplier"),
+    (r"الحالة|حالة", "status"),
+    (r"إجمالي|اجمالي|مجموع", "total"),
+    (r"above|over|greater\s+than|more\s+than|exceeding|فوق|أكثر\s+من|اكثر\s+من", "gt"),
+    (r"below|under(?!\s+review)|less\s+than|fewer\s+than|تحت|أقل\s+من|اقل\s+من", "lt"),
+    (r"highest|largest|biggest|most|أعلى|أكبر|أكثر", "top"),
+    (r"lowest|smallest|least|أقل|أصغر", "bottom"),
+    (r"escalations?|escalated|تصعيد|التصعيد|المصعدة", "escalation"),
+    # Risk adjectives with the article ("المخاطر العالية") as the aliases spell them
+    (r"ال(عالية|عالي|مرتفعة|متوسطة|متوسط|منخفضة|منخفض|حرجة|حرج)", r"\1"),
+]
+_TERMS = [(re.compile(r"(?<!\w)(?:" + pattern + r")(?!\w)"), f" {token} ") for pattern, token in _TERMS]
+_ALIASES = {alias: canonical.casefold() for column in entities.ALIASES.values() for alias, canonical in column.items()}
+_ALIAS_PATTERN = re.compile(
+    r"(?<!\w)(" + "|".join(map(re.escape, sorted(_ALIASES, key=len, reverse=True))) + r")(?!\w)"
+)
+
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "by", "per", "in", "on", "to", "is", "are", "was", "were", "what",
+    "which", "show", "me", "list", "all", "please", "give", "get", "display", "find", "tell", "with",
+    "that", "have", "has", "and", "can", "you", "i", "we", "our", "there", "do", "does", "any",
+    "ما", "ماذا", "هي", "هو", "هل", "في", "من", "على", "اعرض", "عرض", "أعطني", "اعطني", "لي",
+    "التي", "الذي", "ذات", "مع", "جميع", "كل", "و", "حسب", "لكل",
+}
+# Words that change the answer without changing much of the text
+_QUALIFIERS = {
+    "top", "bottom", "count", "total", "sum", "average", "avg", "mean", "min", "max", "minimum", "maximum",
+    "last", "this", "next", "previous", "current", "first", "latest", "oldest", "newest", "recent",
+    "gt", "lt", "before", "after", "between",
+    "not", "no", "without", "except", "yes", "ascending", "descending",
+    "today", "yesterday", "week", "month", "quarter", "year",
+    "january", "february", "march", "april", "may", "june", "july", "august", "september",
+    "october", "november", "december",
+    "آخر", "الماضي", "الماضية", "الحالي", "الحالية", "القادم", "القادمة", "قبل", "بعد",
+    "ليس", "غير", "بدون", "لا", "متوسط", "اليوم", "الأسبوع", "الشهر", "الربع", "السنة", "العام",
+}
+_WORD = re.compile(r"\w+")
+_NUMBER = re.compile(r"(\d[\d,]*(?:\.\d+)?)(?:\s*(k|m|thousand|million|ألف|الف|مليون)(?!\w))?")
+_MULTIPLIERS = {"k": 1e3, "thousand": 1e3, "ألف": 1e3, "الف": 1e3, "m": 1e6, "million": 1e6, "مليون": 1e6}
+
+
+class _Question:
+    __slots__ = ("key", "question", "language", "sql", "tf", "numbers", "values", "qualifiers", "hits")
+
+    def __init__(self, question: str, language: str, sql: str = None):
+        self.key = " ".join(question.casefold().split())
+        self.question = question
+        self.language = language
+        self.sql = sql
+        text = self.key.translate(_ARABIC_DIGITS)
+        self.numbers = _numbers(text)
+        for pattern, token in _TERMS:
+            text = pattern.sub(token, text)
+        # Values are read before aliases are folded so 'procurement requests' is not a department
+        self.values = entities.mentions(text)
+        text = _ALIAS_PATTERN.sub(lambda m: _ALIASES[m.group(1)], text)
+        # 'finance department' / 'قسم المالية' say no more than 'finance'
+        for column, value in self.values:
+            if column == "department":
+                name = re.escape(value.casefold())
+                text = re.sub(rf"department\s+({name})(?!\w)|(?<!\w)({name})\s+department", f" {value.casefold()} ", text)
+        words = [_stem(w) for w in _WORD.findall(text) if w not in _STOPWORDS and not w.isdigit()]
+        self.qualifiers = frozenset(w for w in words if w in _QUALIFIERS)
+        tf = Counter("w:" + w for w in words)
+        for w in words:
+            padded = f"#{w}#"
+            for i in range(len(padded) - 2):
+                tf["c:" + padded[i:i + 3]] += _TRIGRAM_WEIGHT
+        self.tf = tf
+        self.hits = 0
+
+
+def _stem(word: str) -> str:
+    if word.isascii():
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            return word[:-1]
+        return word
+    if len(word) > 4 and word.startswith("ال"):
+        return word[2:]
+    return word
+
+
+def _numbers(text: str) -> frozenset:
+    values = set()
+    for digits, suffix in _NUMBER.findall(text):
+        try:
+            value = float(digits.replace(",", "")) * _MULTIPLIERS.get(suffix, 1)
+        except ValueError:
+            continue
+        values.add(int(value) if value.is_integer() else value)
+    return frozenset(values)
+
+
+_lock = threading.Lock()
+_index = OrderedDict()  # key -> _Question, least recently used first
+_postings = {}  # feature -> set of keys
+_df = Counter()
+_near_misses = deque(maxlen=200)
+_stats = Counter()
+
+
+def _add(entry: _Question):
+    if entry.key in _index:
+        _remove(entry.key)
+    _index[entry.key] = entry
+    for feature in entry.tf:
+        _postings.setdefault(feature, set()).add(entry.key)
+        _df[feature] += 1
+    while len(_index) > PARAPHRASE_MAX_ENTRIES:
+        _remove(next(iter(_index)))
+
+
+def _remove(key: str):
+    entry = _index.pop(key, None)
+    if entry is None:
+        return
+    for feature in entry.tf:
+        keys = _postings.get(feature)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del _postings[feature]
+        _df[feature] -= 1
+        if _df[feature] <= 0:
+            del _df[feature]
+
+
+def _weights(tf: Counter, count: int) -> dict:
+    return {f: w * (math.log((count + 1) / (_df.get(f, 0) + 1)) + 1) for f, w in tf.items()}
+
+
+def _best(query: _Question):
+    """(entry, cosine similarity) of the closest indexed question, or (None, 0.0)."""
+    count = len(_index)
+    # Candidates share a reasonably rare feature; the common ones only add to the score
+    common = max(50, count // 10)
+    overlap = Counter()
+    for feature in query.tf:
+        keys = _postings.get(feature, ())
+        if len(keys) <= common:
+            for key in keys:
+                overlap[key] += 1
+    if not overlap:
+        return None, 0.0
+    q = _weights(query.tf, count)
+    q_norm = math.sqrt(sum(w * w for w in q.values()))
+    best, best_score = None, 0.0
+    for key, _ in overlap.most_common(_CANDIDATES):
+        entry = _index[key]
+        d = _weights(entry.tf, count)
+        d_norm = math.sqrt(sum(w * w for w in d.values()))
+        score = sum(w * d[f] for f, w in q.items() if f in d) / (q_norm * d_norm or 1)
+        if score > best_score:
+            best, best_score = entry, score
+    return best, min(best_score, 1.0)
+
+
+def _mismatch(query: _Question, entry: _Question):
+    """Which parameter differs between two close questions, or None."""
+    if query.numbers != entry.numbers:
+        return "numbers"
+    if query.values != entry.values:
+        return "values"
+    if query.qualifiers != entry.qualifiers:
+        return "qualifiers"
+    return None
+
+
+def lookup(question: str, language: str = "en"):
+    """A process_chat result reusing the SQL of an equivalent earlier question, or None."""
+    if not PARAPHRASE_ENABLED or not _index:
+        return None
+    with metrics.stage("paraphrase_lookup") as span:
+        try:
+            query = _Question(question, language)
+        except Exception as e:
+            print(f"⚠ Paraphrase lookup skipped: {e}")
+            return None
+        with _lock:
+            entry, score = _best(query)
+        span["score"] = round(score, 3)
+        if entry is None or score < PARAPHRASE_NEAR_MISS:
+            return _record("miss")
+        metrics.observe("paraphrase_similarity", score, buckets=SIMILARITY_BUCKETS)
+        reason = "below_threshold" if score < PARAPHRASE_THRESHOLD else _mismatch(query, entry)
+        if reason:
+            _near_misses.append({
+                "at": time.time(), "question": question, "language": language,
+                "matched": entry.question, "score": round(score, 3), "reason": reason,
+            })
+            return _record("near_miss" if reason == "below_threshold" else "rejected", reason)
+        with _lock:
+            entry.hits += 1
+            if entry.key in _index:
+                _index.move_to_end(entry.key)
+        metrics.annotate(paraphrase_score=round(score, 3))
+        _record("hit")
+        return {"sql": entry.sql, "explanation": "", "paraphrase": {"question": entry.question, "score": round(score, 3)}}
+
+
+def _record(result: str, reason: str = None):
+    _stats[result] += 1
+    if reason and reason != "below_threshold":
+        _stats[f"rejected_{reason}"] += 1
+    metrics.inc("paraphrase_lookups_total", result=result)
+    return None
+
+
+def remember(question: str, language: str, sql: str):
+    """Index an answered question (replacing an older entry for the same text)."""
+    if not PARAPHRASE_ENABLED or not sql or not question.strip():
+        return
+    key = " ".join(question.casefold().split())
+    with _lock:
+        existing = _index.get(key)
+        if existing is not None and existing.sql == sql:
+            _index.move_to_end(key)
+            return
+    try:
+        entry = _Question(question, language, sql)
+    except Exception as e:
+        print(f"⚠ Paraphrase index skipped a question: {e}")
+        return
+    with _lock:
+        _add(entry)
+    metrics.set_gauge("paraphrase_entries", len(_index))
+
+
+def forget(question: str):
+    with _lock:
+        _remove(" ".join(question.casefold().split()))
+    metrics.set_gauge("paraphrase_entries", len(_index))
+
+
+def _on_logged(row: dict):
+    """query_log listener: learn from answered questions, drop entries whose SQL stopped working."""
+    if not PARAPHRASE_ENABLED:
+        return
+    reused = row.get("paraphrase")
+    if reused and row["outcome"] in ("fixed", "failed", "error", "invalid"):
+        forget(reused["question"])
+        _stats["invalidated"] += 1
+        metrics.inc("paraphrase_invalidated_total")
+    if row["outcome"] in ("ok", "fixed") and not row.get("contextual"):
+        remember(row["question"], row["language"], row["fixed_sql"] or row["sql"])
+
+
+query_log.on_finish(_on_logged)
+
+
+def rebuild():
+    """Seed the index from the query log (registered with startup.after_load)."""
+    if not PARAPHRASE_ENABLED:
+        return
+    try:
+        answered = query_log.answered_questions(PARAPHRASE_SEED)
+    except Exception as e:
+        print(f"⚠ Paraphrase index not seeded: {e}")
+        return
+    # Oldest first, so the most recent questions end up most recently used
+    for item in reversed(answered):
+        remember(item["question"], item["language"], item["sql"])
+    print(f"✓ Paraphrase index: {len(_index)} questions")
+
+
+def status(limit: int = 50) -> dict:
+    return {
+        "enabled": PARAPHRASE_ENABLED,
+        "threshold": PARAPHRASE_THRESHOLD,
+        "near_miss_threshold": PARAPHRASE_NEAR_MISS,
+        "entries": len(_index),
+        "lookups": dict(_stats),
+        "near_misses": list(reversed(_near_misses))[:limit],
+    }
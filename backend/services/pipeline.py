@@ -0,0 +1,200 @@
+import os
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services import database, entities, metrics, openai_client, query_log, reports, stage_analytics
+
+# Candidates whose planner cost exceeds this are skipped (0 = no limit; Postgres only)
+SQL_MAX_COST = float(os.environ.get("SQL_MAX_COST", "0"))
+
+_explain_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="explain")
+_early_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="early-sql")
+
+
+class EarlyExecution:
+    """on_sql callback for process_chat: starts the query while the model is still writing.
+
+    The generated SQL is validated and canonicalized as usual and sent to the
+    database right away; take() hands over the rows if the final result
+    turns out to be the same query.
+    """
+
+    def __init__(self, on_ready=None):
+        self.on_ready = on_ready
+        self.raw = None
+        self.prepared = None
+        self._future = None
+
+    def __call__(self, sql: str):
+        try:
+            if not openai_client.validate_sql(sql):
+                return
+            self.prepared = entities.canonicalize(sql)
+            self.raw = sql
+            self._future = _early_pool.submit(
+                contextvars.copy_context().run, database.execute_query, self.prepared[0]
+            )
+            if self.on_ready:
+                self.on_ready(self.prepared[0])
+        except Exception as e:
+            print(f"⚠ Early execution skipped: {e}")
+
+    def matches(self, sql: str) -> bool:
+        return self._future is not None and sql == self.raw
+
+    def _usable(self, sql: str) -> bool:
+        if self._future is None:
+            return False
+        if sql != self.prepared[0]:
+            metrics.inc("sql_early_execution_total", result="discarded")
+            return False
+        return True
+
+    def take(self, sql: str):
+        """Rows of the early run if it executed `sql` (raising its error), else None."""
+        if not self._usable(sql):
+            return None
+        with metrics.stage("early_sql_wait"):
+            rows = self._future.result()
+        metrics.inc("sql_early_execution_total", result="used")
+        return rows
+
+    async def atake(self, sql: str):
+        """take() for async callers: awaits the early run without blocking the event loop."""
+        if not self._usable(sql):
+            return None
+        with metrics.stage("early_sql_wait"):
+            rows = await asyncio.wrap_future(self._future)
+        metrics.inc("sql_early_execution_total", result="used")
+        return rows
+
+
+def _check_candidate(sql: str):
+    """None when the query plans within SQL_MAX_COST, else the reason it was rejected."""
+    try:
+        cost = database.explain(sql)
+    except Exception as e:
+        return str(e)
+    if SQL_MAX_COST and cost is not None and cost > SQL_MAX_COST:
+        return f"Estimated cost {cost:.0f} exceeds SQL_MAX_COST {SQL_MAX_COST:.0f}"
+    return None
+
+
+@metrics.timed("select_candidate")
+def select_candidate(candidates: list):
+    """EXPLAIN every candidate in parallel and pick the first (in model order) that passes.
+
+    Returns (sql, None), or (first candidate, its error) when all of them fail.
+    """
+    futures = [
+        _explain_pool.submit(contextvars.copy_context().run, _check_candidate, sql)
+        for sql in candidates
+    ]
+    errors = [future.result() for future in futures]
+    metrics.annotate(candidates=len(candidates), rejected=sum(1 for e in errors if e))
+    for index, (sql, error) in enumerate(zip(candidates, errors)):
+        if error is None:
+            metrics.inc("sql_candidates_total", result="first" if index == 0 else "alternative")
+            return sql, None
+    metrics.inc("sql_candidates_total", result="all_failed")
+    return candidates[0], errors[0]
+
+
+def prepare_sql(result: dict, log, early: EarlyExecution = None) -> tuple:
+    """Validate, choose among candidates and canonicalize the SQL of a process_chat result.
+
+    Returns (sql, unresolved, error): sql is None when nothing valid was
+    generated; error is set when every candidate already failed EXPLAIN.
+    """
+    sql = result.get("sql")
+    log.update(sql=sql, contextual=bool(result.get("contextual")))
+    if result.get("paraphrase"):
+        log.update(paraphrase=result["paraphrase"], outcome="paraphrase")
+    if not sql:
+        return None, [], None
+    candidates = [c for c in result.get("candidates") or [sql] if openai_client.validate_sql(c)]
+    log["valid"] = bool(candidates)
+    if not candidates:
+        log["outcome"] = "invalid"
+        return None, [], None
+    error = None
+    if len(candidates) > 1:
+        sql, error = select_candidate(candidates)
+    else:
+        sql = candidates[0]
+    if early is not None and early.matches(sql):
+        sql, rewrites, unresolved = early.prepared
+    else:
+        sql, rewrites, unresolved = entities.canonicalize(sql)
+    log.update(sql=sql, rewrites=rewrites)
+    return sql, unresolved, error
+
+
+def render_answer(data, message: str, language: str, unresolved: list = None) -> str:
+    """Rendered answer; an empty result caused by an unknown value names it instead of asking the model."""
+    if not data and unresolved:
+        return entities.describe_unresolved(unresolved, language)
+    return openai_client.generate_response(data, message, language)
+
+
+def answer_question(message: str, language: str = "en", history: list = None) -> dict:
+    """Question -> SQL -> rows -> rendered answer, with one repair attempt on a failing query.
+
+    Shared by /api/chat and background callers (cache warm-up) so both go
+    through the same cache keys. Questions matching a precomputed report are
+    answered from its snapshot and stage/SLA questions by stage_analytics.
+    Every call is recorded in the query log.
+    """
+    with query_log.entry(message, language) as log:
+        snapshot = reports.match(message, language) if not history else None
+        if snapshot is not None:
+            log.update(sql=snapshot["sql"], valid=True, row_count=snapshot["row_count"], outcome="report")
+            return {"response": snapshot["response"], "sql": snapshot["sql"], "data": snapshot["data"]}
+        analysis = stage_analytics.answer(message, language) if not history else None
+        if analysis is not None:
+            log.update(valid=True, row_count=len(analysis["data"]), outcome="analytics")
+            return {"response": analysis["response"], "sql": None, "data": analysis["data"]}
+
+        early = EarlyExecution()
+        result = openai_client.process_chat(message, language, history, on_sql=early)
+        explanation = result.get("explanation", "")
+        sql, unresolved, error_msg = prepare_sql(result, log, early)
+
+        if not sql:
+            return {"response": explanation, "sql": None, "data": None}
+
+        if error_msg is None:
+            try:
+                data = early.take(sql)
+                if data is None:
+                    data = database.execute_query(sql)
+                log["row_count"] = len(data)
+                response_text = render_answer(data, message, language, unresolved)
+                return {"response": response_text, "sql": sql, "data": data[:100],
+                        "rewrites": log["rewrites"] or None}
+            except Exception as e:
+                error_msg = str(e)
+
+        # The query failed (or every candidate failed EXPLAIN): try to fix it
+        log["error"] = error_msg
+        fixed_result = openai_client.fix_failed_query(sql, error_msg, message, language)
+
+        if fixed_result.get("sql"):
+            log["fixed_sql"] = fixed_result["sql"]
+            try:
+                data = database.execute_query(fixed_result["sql"])
+                log["row_count"] = len(data)
+                log["outcome"] = "fixed"
+                response_text = openai_client.generate_response(data, message, language)
+                return {"response": response_text, "sql": fixed_result["sql"], "data": data[:100]}
+            except Exception:
+                pass
+
+        # If still failing, return helpful error
+        log["outcome"] = "failed"
+        return {
+            "response": openai_client.generate_error_response(error_msg, message, language),
+            "sql": sql,
+            "data": None
+        }
@@ -0,0 +1,368 @@
+# Workload log: one entry per answered question with the generated (and
+# repaired) SQL, outcome, row count, per-stage timings and token usage.
+# Request threads only append to an in-memory buffer; a background thread
+# flushes it to Postgres in batches, so logging never adds a round trip.
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from psycopg2.extras import execute_values
+
+from backend.services import database, metrics, usage
+
+QUERY_LOG_ENABLED = os.environ.get("QUERY_LOG_ENABLED", "true").lower() in ("1", "true", "yes")
+QUERY_LOG_BATCH_SIZE = int(os.environ.get("QUERY_LOG_BATCH_SIZE", "200"))
+QUERY_LOG_FLUSH_SECONDS = float(os.environ.get("QUERY_LOG_FLUSH_SECONDS", "2"))
+# Entries waiting for a flush; the oldest are dropped when writes fall behind
+QUERY_LOG_BUFFER = int(os.environ.get("QUERY_LOG_BUFFER", "10000"))
+# Recent entries kept in memory for reporting when Postgres is unavailable
+QUERY_LOG_RECENT = int(os.environ.get("QUERY_LOG_RECENT", "5000"))
+
+DDL = """
+CREATE TABLE IF NOT EXISTS query_log (
+    id BIGSERIAL PRIMARY KEY,
+    created_at TIMESTAMPTZ NOT NULL,
+    endpoint TEXT,
+    tenant TEXT,
+    question TEXT,
+    language TEXT,
+    sql TEXT,
+    fixed_sql TEXT,
+    sql_shape TEXT,
+    shape_hash TEXT,
+    valid BOOLEAN,
+    outcome TEXT,
+    error TEXT,
+    row_count INTEGER,
+    duration_ms REAL,
+    stages JSONB,
+    cache_hits INTEGER,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    cost_usd REAL,
+    rewrites JSONB,
+    contextual BOOLEAN
+);
+ALTER TABLE query_log ADD COLUMN IF NOT EXISTS rewrites JSONB;
+ALTER TABLE query_log ADD COLUMN IF NOT EXISTS contextual BOOLEAN;
+CREATE INDEX IF NOT EXISTS query_log_created_at_idx ON query_log (created_at);
+CREATE INDEX IF NOT EXISTS query_log_shape_hash_idx ON query_log (shape_hash)
+"""
+
+COLUMNS = [
+    "created_at", "endpoint", "tenant", "question", "language", "sql", "fixed_sql",
+    "sql_shape", "shape_hash", "valid", "outcome", "error", "row_count", "duration_ms",
+    "stages", "cache_hits", "prompt_tokens", "completion_tokens", "cost_usd", "rewrites",
+    "contextual",
+]
+_JSON_COLUMNS = {"stages", "rewrites"}
+
+_buffer = deque()
+_recent = deque(maxlen=QUERY_LOG_RECENT)
+_wakeup = threading.Event()
+_lock = threading.Lock()
+_flusher = None
+_listeners = []
+_stats = {"logged": 0, "flushed": 0, "dropped": 0, "flush_errors": 0}
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+
+
+def sql_shape(sql: str) -> str:
+    """SQL with literals replaced by ?, so the same query with new values groups together."""
+    if not sql:
+        return None
+    shape = _STRING_LITERAL.sub("?", sql)
+    shape = _NUMBER_LITERAL.sub("?", shape)
+    shape = _IN_LIST.sub("(?)", shape)
+    return " ".join(shape.lower().split()).rstrip(";")
+
+
+class _Entry(dict):
+    """A log entry being filled in; tracks where in the trace/usage it started."""
+
+    def __init__(self, question: str, language: str):
+        super().__init__(question=question, language=language, sql=None, fixed_sql=None,
+                         valid=None, outcome=None, error=None, row_count=None, rewrites=None,
+                         contextual=False)
+        self.started = time.perf_counter()
+        self.done = False
+        trace = metrics.current_trace()
+        self.trace = trace
+        self.span_index = len(trace.spans) if trace else 0
+        self.request = usage.current_request()
+        req = self.request
+        self.usage_start = (req.prompt_tokens, req.completion_tokens, req.cost_usd) if req else (0, 0, 0.0)
+
+
+def start(question: str, language: str = "en") -> _Entry:
+    return _Entry(question, language)
+
+
+def on_finish(callback):
+    """Call callback(row) with every completed entry (in the request thread; keep it cheap)."""
+    _listeners.append(callback)
+
+
+def finish(entry: _Entry, **fields):
+    """Complete an entry (stage timings, token deltas) and queue it for writing."""
+    if not QUERY_LOG_ENABLED or entry is None or entry.done:
+        return
+    entry.done = True
+    entry.update(fields)
+    if entry["outcome"] is None:
+        entry["outcome"] = "ok" if entry["sql"] else "no_sql"
+
+    stages, cache_hits = {}, 0
+    if entry.trace is not None:
+        for span in entry.trace.spans[entry.span_index:]:
+            stages[span["stage"]] = round(stages.get(span["stage"], 0.0) + span["duration_ms"], 2)
+            if span.get("cache") == "hit":
+                cache_hits += 1
+    req = entry.request
+    prompt0, completion0, cost0 = entry.usage_start
+    executed_sql = entry["fixed_sql"] or entry["sql"]
+    shape = sql_shape(executed_sql)
+    row = {
+        **entry,
+        "created_at": datetime.now(timezone.utc),
+        "endpoint": req.endpoint if req else "background",
+        "tenant": req.tenant if req else "system",
+        "sql_shape": shape,
+        "shape_hash": hashlib.md5(shape.encode()).hexdigest()[:16] if shape else None,
+        "duration_ms": round((time.perf_counter() - entry.started) * 1000, 2),
+        "stages": stages,
+        "cache_hits": cache_hits,
+        "prompt_tokens": (req.prompt_tokens - prompt0) if req else 0,
+        "completion_tokens": (req.completion_tokens - completion0) if req else 0,
+        "cost_usd": round(req.cost_usd - cost0, 6) if req else 0.0,
+    }
+    _submit(row)
+    for callback in _listeners:
+        try:
+            callback(row)
+        except Exception as e:
+            print(f"⚠ Query log listener failed: {e}")
+
+
+@contextmanager
+def entry(question: str, language: str = "en"):
+    """with query_log.entry(q, lang) as e: e["sql"] = ... - logged on exit."""
+    current = start(question, language)
+    try:
+        yield current
+    except Exception as e:
+        current["outcome"] = "error"
+        current["error"] = current["error"] or str(e)
+        raise
+    finally:
+        finish(current)
+
+
+def _submit(row: dict):
+    global _flusher
+    with _lock:
+        if len(_buffer) >= QUERY_LOG_BUFFER:
+            _buffer.popleft()
+            _stats["dropped"] += 1
+            metrics.inc("query_log_dropped_total")
+        _buffer.append(row)
+        _recent.append(row)
+        _stats["logged"] += 1
+        if _flusher is None or not _flusher.is_alive():
+            _flusher = threading.Thread(target=_flush_loop, name="query-log-flusher", daemon=True)
+            _flusher.start()
+        pending = len(_buffer)
+    metrics.set_gauge("query_log_buffered", pending)
+    if pending >= QUERY_LOG_BATCH_SIZE:
+        _wakeup.set()
+
+
+def _take_batch() -> list:
+    with _lock:
+        count = min(len(_buffer), QUERY_LOG_BATCH_SIZE)
+        return [_buffer.popleft() for _ in range(count)]
+
+
+def flush() -> int:
+    """Write everything buffered so far; entries are discarded while Postgres is down."""
+    written = 0
+    while True:
+        batch = _take_batch()
+        if not batch:
+            break
+        if not database.db_available:
+            # Kept in the in-memory recent window only
+            continue
+        values = [
+            tuple(json.dumps(row[c]) if c in _JSON_COLUMNS else row[c] for c in COLUMNS)
+            for row in batch
+        ]
+        try:
+            with metrics.stage("query_log_flush", rows=len(batch)), database.get_cursor() as cursor:
+                execute_values(
+                    cursor, f"INSERT INTO query_log ({', '.join(COLUMNS)}) VALUES %s", values,
+                    page_size=QUERY_LOG_BATCH_SIZE
+                )
+        except Exception as e:
+            _stats["flush_errors"] += 1
+            metrics.inc("query_log_flush_errors_total")
+            print(f"⚠ Query log flush failed ({len(batch)} entries dropped): {e}")
+            continue
+        written += len(batch)
+    if written:
+        _stats["flushed"] += written
+        metrics.inc("query_log_flushed_total", written)
+    metrics.set_gauge("query_log_buffered", len(_buffer))
+    return written
+
+
+def _flush_loop():
+    while True:
+        _wakeup.wait(QUERY_LOG_FLUSH_SECONDS)
+        _wakeup.clear()
+        try:
+            flush()
+        except Exception as e:
+            print(f"⚠ Query log flusher error: {e}")
+
+
+def _summarise(rows: list, limit: int) -> dict:
+    """Group in-memory entries by SQL shape (reporting fallback without Postgres)."""
+    groups = {}
+    for row in rows:
+        if not row["sql_shape"]:
+            continue
+        group = groups.setdefault(row["shape_hash"], {
+            "shape_hash": row["shape_hash"], "sql_shape": row["sql_shape"],
+            "example_question": row["question"], "durations": [], "rows": []
+        })
+        group["durations"].append(row["duration_ms"])
+        group["rows"].append(row["row_count"] or 0)
+    shapes = []
+    for group in groups.values():
+        durations = sorted(group.pop("durations"))
+        row_counts = group.pop("rows")
+        group.update(
+            count=len(durations),
+            avg_ms=round(sum(durations) / len(durations), 2),
+            p95_ms=round(durations[min(int(0.95 * len(durations)), len(durations) - 1)], 2),
+            max_ms=round(durations[-1], 2),
+            avg_rows=round(sum(row_counts) / len(row_counts), 1),
+        )
+        shapes.append(group)
+    outcomes = {}
+    for row in rows:
+        outcomes[row["outcome"]] = outcomes.get(row["outcome"], 0) + 1
+    return {
+        "source": "memory",
+        "entries": len(rows),
+        "outcomes": outcomes,
+        "most_frequent": sorted(shapes, key=lambda g: -g["count"])[:limit],
+        "slowest": sorted(shapes, key=lambda g: -g["p95_ms"])[:limit],
+    }
+
+
+_SHAPES_SQL = """
+    SELECT shape_hash, MIN(sql_shape) AS sql_shape, MIN(question) AS example_question,
+           COUNT(*) AS count, ROUND(AVG(duration_ms)::numeric, 2)::float AS avg_ms,
+           ROUND(percentile_cont(0.95) WITHIN GROUP (ORDER BY duration_ms)::numeric, 2)::float AS p95_ms,
+           MAX(duration_ms) AS max_ms, ROUND(AVG(COALESCE(row_count, 0))::numeric, 1)::float AS avg_rows
+    FROM query_log
+    WHERE created_at >= NOW() - make_interval(days => %s) AND shape_hash IS NOT NULL
+    GROUP BY shape_hash
+    ORDER BY {order} DESC
+    LIMIT %s
+"""
+
+
+def report(days: int = 7, limit: int = 20) -> dict:
+    """Most frequent and slowest SQL shapes, plus outcome counts."""
+    if not database.db_available:
+        cutoff = time.time() - days * 86400
+        with _lock:
+            rows = [row for row in _recent if row["created_at"].timestamp() >= cutoff]
+        return {**_summarise(rows, limit), "days": days, "log": dict(_stats)}
+    flush()
+    with database.get_cursor() as cursor:
+        cursor.execute(_SHAPES_SQL.format(order="count"), (days, limit))
+        most_frequent = cursor.fetchall()
+        cursor.execute(_SHAPES_SQL.format(order="p95_ms"), (days, limit))
+        slowest = cursor.fetchall()
+        cursor.execute(
+            "SELECT outcome, COUNT(*) AS count FROM query_log "
+            "WHERE created_at >= NOW() - make_interval(days => %s) GROUP BY outcome",
+            (days,)
+        )
+        outcomes = {row["outcome"]: row["count"] for row in cursor.fetchall()}
+    return {
+        "source": "postgres",
+        "days": days,
+        "entries": sum(outcomes.values()),
+        "outcomes": outcomes,
+        "most_frequent": [dict(row) for row in most_frequent],
+        "slowest": [dict(row) for row in slowest],
+        "log": dict(_stats),
+    }
+
+
+def frequent_questions(limit: int) -> list:
+    """Most asked questions that produced an answer (cache warm-up source)."""
+    if not database.db_available:
+        counts = {}
+        with _lock:
+            rows = list(_recent)
+        for row in rows:
+            if row["outcome"] == "ok" and row["endpoint"] != "warmup":
+                counts[row["question"]] = counts.get(row["question"], 0) + 1
+        return [q for q, _ in sorted(counts.items(), key=lambda item: -item[1])][:limit]
+    with database.get_cursor() as cursor:
+        cursor.execute(
+            """SELECT MIN(question) AS question, COUNT(*) AS count FROM query_log
+               WHERE outcome = 'ok' AND endpoint <> 'warmup'
+                 AND created_at >= NOW() - INTERVAL '30 days'
+               GROUP BY lower(btrim(question))
+               ORDER BY count DESC
+               LIMIT %s""",
+            (limit,)
+        )
+        return [row["question"] for row in cursor.fetchall()]
+
+
+def answered_questions(limit: int) -> list:
+    """Most recent distinct standalone questions with the SQL that answered them, newest first."""
+    if not database.db_available:
+        seen, answered = set(), []
+        with _lock:
+            rows = list(_recent)
+        for row in reversed(rows):
+            sql = row["fixed_sql"] or row["sql"]
+            key = " ".join(row["question"].casefold().split())
+            if row["outcome"] in ("ok", "fixed") and sql and not row.get("contextual") and key not in seen:
+                seen.add(key)
+                answered.append({"question": row["question"], "language": row["language"], "sql": sql})
+        return answered[:limit]
+    with database.get_cursor() as cursor:
+        cursor.execute(
+            """SELECT question, language, sql FROM (
+                   SELECT DISTINCT ON (lower(btrim(question))) question, language,
+                          COALESCE(fixed_sql, sql) AS sql, created_at
+                   FROM query_log
+                   WHERE outcome IN ('ok', 'fixed') AND COALESCE(fixed_sql, sql) IS NOT NULL
+                     AND contextual IS NOT TRUE
+                     AND created_at >= NOW() - INTERVAL '30 days'
+                   ORDER BY lower(btrim(question)), created_at DESC
+               ) latest
+               ORDER BY created_at DESC
+               LIMIT %s""",
+            (limit,)
+        )
+        return [dict(row) for row in cursor.fetchall()]
@@ -0,0 +1,354 @@
+# Precomputed answers for the questions asked every morning. A configured set
+# of report queries runs after each data load and on a cron-like schedule; the
+# rows and the rendered answer are stored in the shared cache so every worker
+# sees them, and a chat question that matches a report is answered from the
+# snapshot without generating SQL or calling the model.
+import os
+import re
+import json
+import time
+import threading
+from datetime import datetime
+
+from backend.services import cache, database, metrics, openai_client, startup, usage
+from backend.services.resultset import ResultSet
+
+REPORTS_ENABLED = os.environ.get("REPORTS_ENABLED", "true").lower() in ("1", "true", "yes")
+# Cron expression in server local time: minute hour day month weekday (empty = after loads only)
+REPORTS_SCHEDULE = os.environ.get("REPORTS_SCHEDULE", "0 6 * * *").strip()
+# Languages each report is rendered in
+REPORTS_LANGUAGES = [l.strip() for l in os.environ.get("REPORTS_LANGUAGES", "en").split(",") if l.strip()]
+# Extra report definitions (JSON list of {name, title, sql, questions}); same name replaces a built-in
+REPORTS_FILE = os.environ.get("REPORTS_FILE")
+# Snapshots outlive one schedule period so there is no gap before the next run
+REPORTS_TTL = int(os.environ.get("REPORTS_TTL", str(26 * 3600)))
+# Rows stored with each snapshot (the answer is rendered from all of them)
+REPORTS_MAX_ROWS = int(os.environ.get("REPORTS_MAX_ROWS", "100"))
+
+# How often the scheduler checks the clock and the data version
+_POLL_SECONDS = 30
+
+_STAGES = [
+    ("Review & approval of scope", "review_approval_scope_eval"),
+    ("Floating", "floating"),
+    ("Tender submission", "tender_submit_by_vendor"),
+    ("Evaluation", "evaluation"),
+    ("Award approval", "award_approval"),
+    ("Contract & PO", "contract_and_po"),
+]
+
+# *_diff_sla below zero means the stage took longer than its SLA
+_SLA_BREACHES_SQL = "\nUNION ALL\n".join(
+    f"SELECT '{label}' AS stage, "
+    f"SUM(CASE WHEN {column}_diff_sla < 0 THEN 1 ELSE 0 END) AS breaches, "
+    f"AVG(CASE WHEN {column}_diff_sla < 0 THEN -{column}_diff_sla END) AS avg_days_over "
+    f"FROM procurement_records"
+    for label, column in _STAGES
+) + "\nORDER BY breaches DESC"
+
+REPORTS = [
+    {
+        "name": "sla_breaches_by_stage",
+        "title": "SLA breaches by stage",
+        "sql": _SLA_BREACHES_SQL,
+        "questions": [
+            "SLA breaches by stage",
+            "SLA breaches per stage",
+            "How many SLA breaches per stage?",
+            "Which stages breach SLA?",
+            "SLA violations by stage",
+            "تجاوزات SLA حسب المرحلة",
+        ],
+    },
+    {
+        "name": "escalations_48h",
+        "title": "PRs flagged for 48-hour escalation",
+        "sql": (
+            "SELECT pr_number, department, status, assign_to, escalate_48h, ceo_escalation "
+            "FROM procurement_records WHERE escalate_48h = 'Yes' ORDER BY pr_number"
+        ),
+        "questions": [
+            "48h escalation",
+            "48h escalations",
+            "48-hour escalations",
+            "PRs with 48h escalation",
+            "Which PRs need 48-hour escalation?",
+            "escalate_48h items",
+            "تصعيد 48 ساعة",
+        ],
+    },
+    {
+        "name": "ceo_escalations",
+        "title": "PRs escalated to the CEO",
+        "sql": (
+            "SELECT pr_number, department, status, risk, budget, ceo_escalation "
+            "FROM procurement_records WHERE ceo_escalation LIKE 'Escalated%' ORDER BY budget DESC"
+        ),
+        "questions": [
+            "CEO escalations",
+            "CEO escalation items",
+            "ceo_escalation items",
+            "Which PRs are escalated to the CEO?",
+            "PRs escalated to CEO",
+            "تصعيدات الرئيس التنفيذي",
+        ],
+    },
+    {
+        "name": "high_risk_by_department",
+        "title": "High-risk PRs by department",
+        "sql": (
+            "SELECT department, COUNT(*) AS high_risk_prs, "
+            "SUM(CASE WHEN risk = 'Critical' THEN 1 ELSE 0 END) AS critical_prs, "
+            "SUM(budget) AS total_budget "
+            "FROM procurement_records WHERE risk IN ('High', 'Critical') "
+            "GROUP BY department ORDER BY high_risk_prs DESC"
+        ),
+        "questions": [
+            "High-risk PRs by department",
+            "High-risk PRs per department",
+            "High-risk projects by department",
+            "Which departments have the most high-risk PRs?",
+            "المشاريع عالية المخاطر حسب الإدارة",
+        ],
+    },
+]
+
+# Filler that does not change which report a question asks for
+_STOPWORDS = {
+    "a", "an", "the", "of", "for", "by", "per", "in", "on", "to", "is", "are", "what",
+    "show", "me", "list", "all", "please", "give", "get", "display", "current", "our",
+    "ما", "هي", "هل", "في", "اعرض", "عرض",
+}
+_WORD = re.compile(r"\w+")
+
+_lock = threading.Lock()
+_run_lock = threading.Lock()
+_state = {"phase": "idle", "runs": 0, "data_version": None, "last_run": None, "seconds": None, "errors": {}}
+# (name, language) -> snapshot produced by this worker
+_snapshots = {}
+_thread = {"thread": None}
+
+
+def _terms(text: str) -> frozenset:
+    return frozenset(w for w in _WORD.findall(text.casefold()) if w not in _STOPWORDS)
+
+
+def _load_definitions() -> list:
+    reports = {report["name"]: report for report in REPORTS}
+    if REPORTS_FILE and os.path.exists(REPORTS_FILE):
+        try:
+            with open(REPORTS_FILE, encoding="utf-8") as f:
+                for report in json.load(f):
+                    reports[report["name"]] = report
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"⚠ Could not read REPORTS_FILE {REPORTS_FILE}: {e}")
+    valid = []
+    for report in reports.values():
+        if not openai_client.validate_sql(report.get("sql")) or not report.get("questions"):
+            print(f"⚠ Report '{report.get('name')}' skipped: needs a read-only SELECT and at least one question")
+            continue
+        valid.append(report)
+    return valid
+
+
+def _build_index(reports: list) -> dict:
+    """Question term set -> report name. A chat question matches a report when it
+    uses exactly the same words as one of its questions, ignoring order and filler."""
+    index = {}
+    for report in reports:
+        for question in report["questions"]:
+            terms = _terms(question)
+            if index.get(terms, report["name"]) != report["name"]:
+                print(f"⚠ Report question '{question}' also matches '{index[terms]}'; keeping the first")
+                continue
+            index[terms] = report["name"]
+    return index
+
+
+_definitions = _load_definitions()
+_index = _build_index(_definitions)
+
+
+def _cron_field(spec: str, low: int, high: int) -> set:
+    values = set()
+    for part in spec.split(","):
+        part, _, step = part.partition("/")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step else start
+        if start < low or end > high:
+            raise ValueError(f"'{spec}' is outside {low}-{high}")
+        values.update(range(start, end + 1, int(step or 1)))
+    return values
+
+
+def parse_schedule(expression: str) -> list:
+    """Five cron fields -> sets of minutes, hours, days, months and weekdays (0 = Sunday)."""
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"expected 5 fields (minute hour day month weekday), got '{expression}'")
+    bounds = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+    schedule = [_cron_field(field, low, high) for field, (low, high) in zip(fields, bounds)]
+    if 7 in schedule[4]:
+        schedule[4].add(0)
+    return schedule
+
+
+def _due(schedule: list, now: datetime) -> bool:
+    minutes, hours, days, months, weekdays = schedule
+    return (now.minute in minutes and now.hour in hours and now.day in days
+            and now.month in months and now.isoweekday() % 7 in weekdays)
+
+
+def _update(**fields):
+    with _lock:
+        _state.update(fields)
+
+
+def status() -> dict:
+    with _lock:
+        state = dict(_state, errors=dict(_state["errors"]))
+    version = database.get_data_version()
+    return {
+        **state,
+        "enabled": REPORTS_ENABLED,
+        "schedule": REPORTS_SCHEDULE or None,
+        "languages": REPORTS_LANGUAGES,
+        "reports": [
+            {
+                "name": report["name"],
+                "title": report["title"],
+                "questions": report["questions"],
+                "snapshots": {
+                    language: {k: snapshot[k] for k in ("row_count", "generated_at", "seconds")}
+                    for (name, language), snapshot in list(_snapshots.items())
+                    if name == report["name"] and snapshot["data_version"] == version
+                },
+            }
+            for report in _definitions
+        ],
+    }
+
+
+def build_snapshot(report: dict, language: str) -> dict:
+    """Run one report query and render its answer."""
+    started = time.perf_counter()
+    token = usage.begin_request("reports", "system")
+    try:
+        version = database.get_data_version()
+        data = database.execute_query(report["sql"])
+        response = openai_client.generate_response(data, report["title"], language)
+    finally:
+        usage.end_request(token)
+    return {
+        "name": report["name"],
+        "title": report["title"],
+        "language": language,
+        "sql": report["sql"],
+        "data": data[:REPORTS_MAX_ROWS],
+        "row_count": len(data),
+        "response": response,
+        "data_version": version,
+        "generated_at": time.time(),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def run(claim: str = "load") -> int:
+    """Refresh every snapshot; returns how many were built.
+
+    claim names the occasion (a data load or a schedule slot): the first worker
+    to claim it does the work and the others serve what it stored. None forces a run.
+    """
+    if not REPORTS_ENABLED or not _definitions:
+        return 0
+    if not _run_lock.acquire(blocking=False):
+        return 0
+    try:
+        version = database.get_data_version()
+        if claim is not None:
+            claim_key = cache.key("claim", claim)
+            if not cache.claim("report", claim_key, {"pid": os.getpid(), "at": time.time()}, ttl=REPORTS_TTL):
+                _update(phase="skipped", data_version=version)
+                return 0
+
+        _update(phase="running")
+        started = time.perf_counter()
+        built, errors = 0, {}
+        for report in _definitions:
+            for language in REPORTS_LANGUAGES:
+                try:
+                    snapshot = build_snapshot(report, language)
+                except Exception as e:
+                    print(f"⚠ Report '{report['name']}' ({language}) failed: {e}")
+                    errors[f"{report['name']}:{language}"] = str(e)
+                    metrics.inc("report_runs_total", report=report["name"], result="error")
+                    continue
+                _snapshots[(report["name"], language)] = snapshot
+                cache.put("report", cache.key(report["name"], language), snapshot, ttl=REPORTS_TTL)
+                metrics.inc("report_runs_total", report=report["name"], result="ok")
+                built += 1
+        elapsed = time.perf_counter() - started
+        with _lock:
+            _state.update(phase="done", data_version=version, last_run=time.time(),
+                          seconds=round(elapsed, 2), errors=errors)
+            _state["runs"] += 1
+        print(f"✓ Reports: {built} snapshot(s) built in {elapsed:.1f}s (data version {version})")
+        return built
+    finally:
+        _run_lock.release()
+
+
+def match(question: str, language: str = "en"):
+    """The current snapshot answering `question`, or None."""
+    if not REPORTS_ENABLED:
+        return None
+    name = _index.get(_terms(question))
+    if name is None:
+        return None
+    snapshot = _snapshots.get((name, language))
+    if (snapshot is None or snapshot["data_version"] != database.get_data_version()
+            or snapshot["generated_at"] + REPORTS_TTL < time.time()):
+        # Built by another worker, or this one's copy is stale
+        snapshot = cache.get("report", cache.key(name, language))
+        if snapshot is not None:
+            snapshot["data"] = ResultSet.from_json(snapshot["data"])
+    metrics.inc("report_answers_total", report=name, result="hit" if snapshot else "missing")
+    return snapshot
+
+
+def _loop(schedule):
+    last_slot = None
+    while True:
+        time.sleep(_POLL_SECONDS)
+        if not startup.is_ready():
+            continue
+        now = datetime.now()
+        slot = now.strftime("%Y-%m-%dT%H:%M")
+        try:
+            if schedule and slot != last_slot and _due(schedule, now):
+                last_slot = slot
+                run(claim=f"schedule:{slot}")
+            elif database.get_data_version() != _state["data_version"]:
+                # Data changed without a restart (e.g. an import into Postgres)
+                run(claim="load")
+        except Exception as e:
+            print(f"⚠ Report scheduler: {e}")
+
+
+def start():
+    """Start the scheduler thread (snapshots after loads come from the after_load hook)."""
+    if not REPORTS_ENABLED or _thread["thread"] is not None:
+        return
+    schedule = None
+    if REPORTS_SCHEDULE:
+        try:
+            schedule = parse_schedule(REPORTS_SCHEDULE)
+        except ValueError as e:
+            print(f"⚠ Invalid REPORTS_SCHEDULE, reports refresh after data loads only: {e}")
+    _thread["thread"] = threading.Thread(target=_loop, args=(schedule,), name="reports", daemon=True)
+    _thread["thread"].start()
@@ -0,0 +1,125 @@
+# Compact query results: the column names once plus one tuple per row, as the
+# database driver returns them. Rows are handed out as small read-only mapping
+# views over the tuple (row["budget"], row.get(...), dict(row)), so code
+# written for dict rows keeps working, but no per-row dict is built unless
+# something asks for one (the JSON response rows, mostly).
+from collections.abc import Mapping, Sequence
+from operator import itemgetter
+
+
+class Row(Mapping):
+    """Read-only view of one result row."""
+
+    __slots__ = ("_index", "_values")
+
+    def __init__(self, index: dict, values: tuple):
+        self._index = index
+        self._values = values
+
+    def __getitem__(self, name):
+        return self._values[self._index[name]]
+
+    def get(self, name, default=None):
+        position = self._index.get(name)
+        return default if position is None else self._values[position]
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class ResultSet(Sequence):
+    """Column names plus a list of value tuples; indexing gives Row views, slicing a ResultSet."""
+
+    __slots__ = ("columns", "rows", "_index")
+
+    def __init__(self, columns, rows: list):
+        self.columns = tuple(columns)
+        self.rows = rows
+        # Duplicate names resolve to the last column, like a dict row would
+        self._index = {name: position for position, name in enumerate(self.columns)}
+
+    @classmethod
+    def from_dicts(cls, rows: list) -> "ResultSet":
+        if not rows:
+            return cls((), [])
+        columns = list(rows[0].keys())
+        getter = itemgetter(*columns)
+        if len(columns) == 1:
+            return cls(columns, [(getter(row),) for row in rows])
+        return cls(columns, [getter(row) for row in rows])
+
+    @classmethod
+    def from_json(cls, value) -> "ResultSet":
+        """Inverse of to_json(); also accepts a plain list of row objects."""
+        if isinstance(value, dict):
+            return cls(value["columns"], [tuple(row) for row in value["rows"]])
+        return cls.from_dicts(value or [])
+
+    def to_json(self) -> dict:
+        return {"columns": list(self.columns), "rows": self.rows}
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            return ResultSet._shared(self, self.rows[item])
+        return Row(self._index, self.rows[item])
+
+    def __iter__(self):
+        index = self._index
+        for values in self.rows:
+            yield Row(index, values)
+
+    def __repr__(self):
+        return f"<ResultSet {len(self.rows)} rows x {len(self.columns)} columns>"
+
+    @staticmethod
+    def _shared(source: "ResultSet", rows: list) -> "ResultSet":
+        result = ResultSet.__new__(ResultSet)
+        result.columns = source.columns
+        result.rows = rows
+        result._index = source._index
+        return result
+
+    def project(self, columns: list = None) -> "ResultSet":
+        """Only the given columns, in that order; raises ValueError for one the result does not have."""
+        if not columns:
+            return self
+        unknown = [c for c in columns if c not in self._index]
+        if unknown:
+            raise ValueError(f"Unknown column(s): {', '.join(unknown)}. Available: {', '.join(self.columns)}")
+        names = list(dict.fromkeys(columns))
+        if names == list(self.columns):
+            return self
+        positions = [self._index[name] for name in names]
+        getter = itemgetter(*positions)
+        if len(positions) == 1:
+            return ResultSet(names, [(getter(values),) for values in self.rows])
+        return ResultSet(names, [getter(values) for values in self.rows])
+
+    def dicts(self) -> list:
+        """The rows as plain dicts (for JSON objects); builds one dict per row."""
+        columns = self.columns
+        return [dict(zip(columns, values)) for values in self.rows]
+
+
+def _cell(value) -> str:
+    if value is None:
+        return "NULL"
+    return str(value).replace("|", "\\|").replace("\n", " ")
+
+
+def as_text(rows) -> str:
+    """Rows as a compact pipe-separated table for prompts: the header once, then one line per row."""
+    if not isinstance(rows, ResultSet):
+        rows = ResultSet.from_dicts(list(rows))
+    lines = [" | ".join(rows.columns)]
+    lines += [" | ".join(_cell(value) for value in values) for values in rows.rows]
+    return "\n".join(lines)
@@ -0,0 +1,103 @@
+# Single source of truth for the procurement_records layout: the Excel column
+# order, the Postgres column types and the conversion applied on load.
+#
+# Each entry is (name, sql_type, kind, default). Columns are listed in
+# workbook order. kind is "int", "float" or "text"; default replaces an empty
+# cell ("{row}" is formatted with the sheet row number). Float cells that are
+# empty load as 0.0; cells that cannot be converted load as NULL and are
+# counted as rejects.
+TABLE_NAME = "procurement_records"
+
+COLUMNS = [
+    ("year", "INTEGER", "int", 2026),
+    ("quarter", "TEXT", "text", "Q1"),
+    ("month", "TEXT", "text", "January"),
+    ("period", "TEXT", "text", "2026-01"),
+    ("date", "TEXT", "text", "2026-01-01"),
+    ("pr_number", "TEXT UNIQUE", "text", "PR-{row}"),
+    ("description", "TEXT", "text", "No description"),
+    ("department", "TEXT", "text", "Unknown"),
+    ("contact_person", "TEXT", "text", "Unknown"),
+    ("assign_to", "TEXT", "text", "Unassigned"),
+    ("budget", "REAL", "float", None),
+    ("budget_q1", "REAL", "float", None),
+    ("budget_q2", "REAL", "float", None),
+    ("budget_q3", "REAL", "float", None),
+    ("budget_q4", "REAL", "float", None),
+    ("source_method", "TEXT", "text", "Unknown"),
+    ("status", "TEXT", "text", "Pending"),
+    ("supplier_details", "TEXT", "text", None),
+    ("supplier_rating", "TEXT", "text", None),
+    ("local_content_percentage", "REAL", "float", None),
+    ("pr_approval_scope_input", "TEXT", "text", None),
+    ("approving_authority", "TEXT", "text", None),
+    ("planned", "TEXT", "text", None),
+    ("target_date", "TEXT", "text", None),
+    ("actual_project_start", "TEXT", "text", None),
+    ("sla", "INTEGER", "int", None),
+    ("note", "TEXT", "text", None),
+    ("review_approval_scope_eval", "REAL", "float", None),
+    ("floating", "REAL", "float", None),
+    ("tender_submit_by_vendor", "REAL", "float", None),
+    ("evaluation", "REAL", "float", None),
+    ("award_approval", "REAL", "float", None),
+    ("contract_and_po", "REAL", "float", None),
+    ("pr_approval_scope_input_pd", "REAL", "float", None),
+    ("review_approval_scope_eval_pd", "REAL", "float", None),
+    ("floating_pd", "REAL", "float", None),
+    ("tender_submit_by_vendor_pd", "REAL", "float", None),
+    ("evaluation_pd", "REAL", "float", None),
+    ("award_approval_pd", "REAL", "float", None),
+    ("contract_and_po_pd", "REAL", "float", None),
+    ("total_days_pd", "REAL", "float", None),
+    ("review_approval_scope_eval_ad", "REAL", "float", None),
+    ("floating_ad", "REAL", "float", None),
+    ("tender_submit_by_vendor_ad", "REAL", "float", None),
+    ("evaluation_ad", "REAL", "float", None),
+    ("award_approval_ad", "REAL", "float", None),
+    ("contract_and_po_ad", "REAL", "float", None),
+    ("total_days_ad", "REAL", "float", None),
+    ("review_approval_scope_eval_pd_sla", "REAL", "float", None),
+    ("floating_pd_sla", "REAL", "float", None),
+    ("tender_submit_by_vendor_pd_sla", "REAL", "float", None),
+    ("evaluation_pd_sla", "REAL", "float", None),
+    ("award_approval_pd_sla", "REAL", "float", None),
+    ("contract_and_po_pd_sla", "REAL", "float", None),
+    ("review_approval_scope_eval_ad_sla", "REAL", "float", None),
+    ("floating_ad_sla", "REAL", "float", None),
+    ("tender_submit_by_vendor_ad_sla", "REAL", "float", None),
+    ("evaluation_ad_sla", "REAL", "float", None),
+    ("award_approval_ad_sla", "REAL", "float", None),
+    ("contract_and_po_ad_sla", "REAL", "float", None),
+    ("review_approval_scope_eval_diff_sla", "REAL", "float", None),
+    ("floating_diff_sla", "REAL", "float", None),
+    ("tender_submit_by_vendor_diff_sla", "REAL", "float", None),
+    ("evaluation_diff_sla", "REAL", "float", None),
+    ("award_approval_diff_sla", "REAL", "float", None),
+    ("contract_and_po_diff_sla", "REAL", "float", None),
+    ("project_status", "TEXT", "text", None),  # TEXT: "Completed", "Red", "Yellow", ...
+    ("risk", "TEXT", "text", None),  # TEXT: "Low", "Medium", "High"
+    ("duration", "INTEGER", "int", None),
+    ("last_status_date", "TEXT", "text", None),
+    ("status_duration", "INTEGER", "int", None),
+    ("status_sla", "INTEGER", "int", None),
+    ("status_co", "TEXT", "text", None),
+    ("escalate_48h", "TEXT", "text", None),
+    ("ceo_escalation", "TEXT", "text", None),
+]
+
+COLUMN_NAMES = [name for name, _, _, _ in COLUMNS]
+
+
+def create_table_sql() -> str:
+    lines = ["    id SERIAL PRIMARY KEY"]
+    lines += [f"    {name} {sql_type}" for name, sql_type, _, _ in COLUMNS]
+    return f"\nCREATE TABLE IF NOT EXISTS {TABLE_NAME} (\n" + ",\n".join(lines) + "\n)\n"
+
+
+def insert_sql() -> str:
+    """INSERT for psycopg2.extras.execute_values (single VALUES %s placeholder)."""
+    return (
+        f"INSERT INTO {TABLE_NAME} ({', '.join(COLUMN_NAMES)}) VALUES %s "
+        "ON CONFLICT (pr_number) DO NOTHING"
+    )
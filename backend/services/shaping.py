@@ -0,0 +1,95 @@
+# Response shaping for result sets: optional column projection and a columnar
+# encoding ({"columns": [...], "data": [[...], ...]}) that sends each column
+# name once instead of once per row, serialized without FastAPI's per-value
+# jsonable_encoder pass.
+import json
+import datetime
+from decimal import Decimal
+from operator import itemgetter
+
+from fastapi.responses import Response
+
+from backend.services import metrics
+from backend.services.resultset import ResultSet, Row
+
+try:
+    import orjson
+except ImportError:  # optional: several times faster on large result sets
+    orjson = None
+
+FORMATS = ("rows", "columnar")
+
+
+def _columns_of(rows: list, columns: list = None) -> list:
+    available = list(rows[0].keys())
+    if not columns:
+        return available
+    unknown = [c for c in columns if c not in available]
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(unknown)}. Available: {', '.join(available)}")
+    return list(dict.fromkeys(columns))
+
+
+def shape(rows: list, columns: list = None, format: str = "rows") -> dict:
+    """{"data": ...} for a result set, plus "columns" in columnar format.
+
+    rows: a list of objects (only the requested columns when given).
+    columnar: column names once and one array per row.
+    Raises ValueError for a column the result does not have.
+    """
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format '{format}'. Use one of: {', '.join(FORMATS)}")
+    if isinstance(rows, ResultSet):
+        return _shape_result_set(rows, columns, format)
+    rows = rows or []
+    if not rows:
+        return {"data": [], "columns": list(columns or [])} if format == "columnar" else {"data": []}
+    names = _columns_of(rows, columns)
+    if format == "columnar":
+        if len(names) == 1:
+            getter = itemgetter(names[0])
+            return {"columns": names, "data": [[getter(row)] for row in rows]}
+        getter = itemgetter(*names)
+        return {"columns": names, "data": [list(getter(row)) for row in rows]}
+    if columns:
+        return {"data": [{name: row[name] for name in names} for row in rows]}
+    return {"data": [dict(row) for row in rows]}
+
+
+def _shape_result_set(rows: ResultSet, columns: list, format: str) -> dict:
+    # Projection works on the value tuples; dicts are only built for "rows"
+    if not rows and format == "columnar":
+        return {"data": [], "columns": list(columns or rows.columns)}
+    projected = rows.project(columns) if rows else rows
+    if format == "columnar":
+        return {"columns": list(projected.columns), "data": [list(values) for values in projected.rows]}
+    return {"data": projected.dicts()}
+
+
+def _default(value):
+    if isinstance(value, Decimal):
+        # Same as FastAPI's encoder: integral decimals as int, others as float
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, ResultSet):
+        return value.dicts()
+    if isinstance(value, Row):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(payload) -> bytes:
+    with metrics.stage("serialize"):
+        if orjson is not None:
+            return orjson.dumps(payload, default=_default, option=orjson.OPT_NON_STR_KEYS)
+        return json.dumps(payload, default=_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class RowsJSONResponse(Response):
+    """JSON response for large row payloads (bypasses jsonable_encoder)."""
+
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,489 @@
+# SLA and workflow-stage analytics computed directly over NumPy arrays. The
+# planned (*_pd), actual (*_ad) and SLA-delta (*_diff_sla) days of the six
+# procurement stages are loaded once per data version into n x 6 matrices,
+# and per-stage percentiles, breach rates, critical-path contribution,
+# department/supplier breakdowns and at-risk forecasts are all array
+# operations. Exposed as GET /api/analytics/stages and as a tool the chat
+# pipeline calls for stage/SLA questions, answered without the model.
+import os
+import re
+import threading
+import warnings
+
+import numpy as np
+
+from backend.services import database, entities, metrics
+from backend.services.resultset import ResultSet
+
+# Answer stage/SLA chat questions from the arrays instead of generated SQL
+STAGE_ANALYTICS_CHAT = os.environ.get("STAGE_ANALYTICS_CHAT", "true").lower() in ("1", "true", "yes")
+
+# Column prefix, English and Arabic name, in workflow order
+STAGES = [
+    ("review_approval_scope_eval", "Review & approval of scope", "مراجعة واعتماد النطاق"),
+    ("floating", "Floating", "الطرح"),
+    ("tender_submit_by_vendor", "Tender submission", "تقديم العطاءات"),
+    ("evaluation", "Evaluation", "التقييم"),
+    ("award_approval", "Award & approval", "الترسية والاعتماد"),
+    ("contract_and_po", "Contract & PO", "العقد وأمر الشراء"),
+]
+PERCENTILES = (50, 90, 95)
+# Statuses with nothing left to forecast
+CLOSED_STATUSES = ("Completed", "Cancelled")
+GROUP_COLUMNS = {"department": "department", "supplier": "supplier_details"}
+# Departments with fewer closed PRs than this forecast with the overall overrun ratio
+_MIN_HISTORY = 5
+# Results kept per data version for repeated questions
+_MAX_RESULTS = 256
+
+_lock = threading.Lock()
+_frame = {"version": None}
+_results = {}
+
+
+def _codes(values) -> tuple:
+    """(categories, code per row) for a text column; NULL becomes ''."""
+    return np.unique(np.array(["" if v is None else str(v) for v in values], dtype=object), return_inverse=True)
+
+
+def refresh():
+    """Load the stage columns into arrays (registered with startup.after_load)."""
+    version = database.get_data_version()
+    prefixes = [stage for stage, _, _ in STAGES]
+    columns = (["pr_number", "department", "supplier_details", "status", "sla", "status_duration", "status_sla"]
+               + [f"{p}_pd" for p in prefixes] + [f"{p}_ad" for p in prefixes] + [f"{p}_diff_sla" for p in prefixes])
+    with metrics.stage("stage_analytics_load") as span:
+        rows = database.execute_query(f"SELECT {', '.join(columns)} FROM procurement_records")
+        values = dict(zip(columns, zip(*rows.rows))) if rows.rows else {c: () for c in columns}
+        matrix = lambda suffix: np.array([values[f"{p}_{suffix}"] for p in prefixes], dtype=float).T.reshape(-1, len(STAGES))
+        frame = {
+            "version": version,
+            "count": len(rows),
+            "pr_number": np.array(values["pr_number"], dtype=object),
+            "planned": matrix("pd"),
+            "actual": matrix("ad"),
+            "diff": matrix("diff_sla"),
+            "sla": np.array(values["sla"], dtype=float),
+            "status_duration": np.array(values["status_duration"], dtype=float),
+            "status_sla": np.array(values["status_sla"], dtype=float),
+        }
+        for column in ("department", "supplier_details", "status"):
+            frame[column] = _codes(values[column])
+        _forecast(frame)
+        span["rows"] = frame["count"]
+    with _lock:
+        _frame.clear()
+        _frame.update(frame)
+        _results.clear()
+    print(f"✓ Stage analytics loaded: {frame['count']} PRs x {len(STAGES)} stages")
+
+
+def _current() -> dict:
+    if _frame["version"] != database.get_data_version():
+        refresh()
+    return _frame
+
+
+def _number(value, digits: int = 1):
+    value = float(value)
+    return None if np.isnan(value) else round(value, digits)
+
+
+def _rate(part, whole):
+    return round(float(part) / float(whole) * 100, 1) if whole else None
+
+
+def _percentiles(values: np.ndarray, percentiles=PERCENTILES) -> np.ndarray:
+    """Per-column percentiles ignoring NaN, identical to np.nanpercentile (linear).
+
+    Day counts are whole numbers, so the ranks are read off a cumulative
+    histogram in linear time instead of partially sorting every column.
+    """
+    result = np.full((len(percentiles), values.shape[1]), np.nan)
+    for i in range(values.shape[1]):
+        column = values[:, i]
+        if np.isnan(column).any():
+            column = column[~np.isnan(column)]
+        if not len(column):
+            continue
+        low, high = column.min(), column.max()
+        if high - low > 100_000 or not (column == np.floor(column)).all():
+            result[:, i] = np.percentile(column, percentiles)
+            continue
+        cumulative = np.cumsum(np.bincount((column - low).astype(np.int64)))
+        positions = np.asarray(percentiles, dtype=float) / 100 * (len(column) - 1)
+        below = np.floor(positions)
+        lower = np.searchsorted(cumulative, below, side="right") + low
+        upper = np.searchsorted(cumulative, np.ceil(positions), side="right") + low
+        result[:, i] = lower + (upper - lower) * (positions - below)
+    return result
+
+
+def _filter(frame: dict, column: str, literal: str) -> tuple:
+    """(row mask, stored value) for a filter value, resolved like SQL literals are."""
+    canonical, _ = entities.resolve(column, literal)
+    categories, codes = frame[column]
+    position = np.searchsorted(categories, canonical) if canonical is not None else len(categories)
+    if position >= len(categories) or categories[position] != canonical:
+        closest = ", ".join(entities.suggestions(column, literal))
+        raise ValueError(f"Unknown {column} '{literal}'. Closest matches: {closest}")
+    return codes == position, canonical
+
+
+def analyze(department: str = None, supplier: str = None, status: str = None,
+            group_by: str = None, top: int = 10) -> dict:
+    """Stage statistics for the PRs matching the filters; raises ValueError for an unknown value or group."""
+    if group_by is not None and group_by not in GROUP_COLUMNS:
+        raise ValueError(f"group_by must be one of: {', '.join(GROUP_COLUMNS)}")
+    frame = _current()
+    key = (frame["version"], department, supplier, status, group_by, top)
+    cached = _results.get(key)
+    if cached is not None:
+        metrics.record_cache("stage_analytics", True)
+        return cached
+    metrics.record_cache("stage_analytics", False)
+    mask = np.ones(frame["count"], dtype=bool)
+    filters = {"department": department, "supplier": supplier, "status": status}
+    for name, column in (("department", "department"), ("supplier", "supplier_details"), ("status", "status")):
+        if filters[name]:
+            selected, filters[name] = _filter(frame, column, filters[name])
+            mask &= selected
+
+    with metrics.stage("stage_analytics", rows=int(mask.sum())), warnings.catch_warnings():
+        # Empty selections and all-NULL stages give NaN (reported as null)
+        warnings.simplefilter("ignore", RuntimeWarning)
+        # Views instead of copies when nothing is filtered out
+        rows = slice(None) if mask.all() else mask
+        planned, actual, diff = frame["planned"][rows], frame["actual"][rows], frame["diff"][rows]
+        delay = actual - planned
+        recorded = ~np.isnan(diff)
+        breached = diff < 0
+        late = np.clip(np.nan_to_num(delay), 0, None)
+        # The stage that added the most delay to each PR that ran late at all
+        delayed = late.sum(axis=1) > 0
+        bottleneck = np.bincount(late[delayed].argmax(axis=1), minlength=len(STAGES))
+
+        actual_pct = _percentiles(actual)
+        delay_pct = _percentiles(delay)
+        planned_median = _percentiles(planned, (50,))[0]
+        cycle_days = np.nansum(actual, axis=0)
+        total_late = late.sum()
+        stages = []
+        for i, (name, label, label_ar) in enumerate(STAGES):
+            stages.append({
+                "stage": name,
+                "label": label,
+                "label_ar": label_ar,
+                "prs": int(recorded[:, i].sum()),
+                "planned_median": _number(planned_median[i]),
+                **{f"actual_p{p}": _number(actual_pct[j, i]) for j, p in enumerate(PERCENTILES)},
+                "delay_mean": _number(np.nanmean(delay[:, i])),
+                **{f"delay_p{p}": _number(delay_pct[j, i]) for j, p in enumerate(PERCENTILES)},
+                "breaches": int(breached[:, i].sum()),
+                "breach_rate": _rate(breached[:, i].sum(), recorded[:, i].sum()),
+                "overrun_mean": _number(np.nanmean(np.where(breached[:, i], -diff[:, i], np.nan))),
+                "share_of_cycle": _rate(cycle_days[i], cycle_days.sum()),
+                "share_of_delay": _rate(late[:, i].sum(), total_late),
+                "bottleneck_prs": int(bottleneck[i]),
+                "bottleneck_rate": _rate(bottleneck[i], delayed.sum()),
+            })
+
+        any_breach = breached.any(axis=1)
+        total_delay = np.nansum(delay, axis=1)
+        result = {
+            "filters": filters,
+            "prs": int(mask.sum()),
+            "overall": {
+                "breached_prs": int(any_breach.sum()),
+                "breach_rate": _rate(any_breach.sum(), mask.sum()),
+                "cycle_days_median": _number(_percentiles(np.nansum(actual, axis=1)[:, None], (50,))[0, 0]),
+                "delay_median": _number(_percentiles(total_delay[:, None], (50,))[0, 0]),
+                "bottleneck_stage": STAGES[int(late.sum(axis=0).argmax())][0] if total_late else None,
+            },
+            "stages": stages,
+            "at_risk": _at_risk(frame, mask, top),
+        }
+        if group_by:
+            result["group_by"] = group_by
+            result["groups"] = _groups(frame, GROUP_COLUMNS[group_by], rows, breached, recorded, delay, top)
+    with _lock:
+        if len(_results) >= _MAX_RESULTS:
+            _results.clear()
+        _results[key] = result
+    return result
+
+
+def _groups(frame, column, rows, breached, recorded, delay, top) -> list:
+    categories, codes = frame[column]
+    codes = codes[rows]
+    size = len(categories)
+    count = np.bincount(codes, minlength=size)
+    breached_prs = np.bincount(codes, weights=breached.any(axis=1), minlength=size)
+    total_delay = np.nansum(delay, axis=1)
+    delay_sum = np.bincount(codes, weights=total_delay, minlength=size)
+    # Per group x stage breach counts and recorded counts
+    stage_breaches = np.stack([np.bincount(codes, weights=breached[:, i], minlength=size) for i in range(len(STAGES))], axis=1)
+    stage_recorded = np.stack([np.bincount(codes, weights=recorded[:, i], minlength=size) for i in range(len(STAGES))], axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        stage_rates = np.where(stage_recorded > 0, stage_breaches / stage_recorded, 0)
+        rates = np.where(count > 0, breached_prs / count, 0)
+    present = np.flatnonzero(count)
+    # Most breached PRs first, so single-PR groups at 100% do not crowd the top
+    ranked = present[np.lexsort((-rates[present], -breached_prs[present]))][:top]
+    groups = []
+    for g in ranked:
+        worst = int(stage_rates[g].argmax())
+        groups.append({
+            "group": categories[g] or None,
+            "prs": int(count[g]),
+            "breached_prs": int(breached_prs[g]),
+            "breach_rate": _rate(breached_prs[g], count[g]),
+            "delay_mean": _number(delay_sum[g] / count[g]),
+            "worst_stage": STAGES[worst][0],
+            "worst_stage_breach_rate": _rate(stage_breaches[g, worst], stage_recorded[g, worst]),
+        })
+    return groups
+
+
+def _forecast(frame: dict):
+    """Projected total days of every PR and the flags at-risk answers filter on.
+
+    Stages without an actual duration yet are projected as planned days times
+    the department's historical actual/planned ratio on closed PRs.
+    """
+    planned, actual = frame["planned"], frame["actual"]
+    status_categories, status_codes = frame["status"]
+    closed = np.isin(status_categories, CLOSED_STATUSES)[status_codes]
+    _, departments = frame["department"]
+    size = int(departments.max()) + 1 if len(departments) else 0
+    done = ~np.isnan(planned) & ~np.isnan(actual) & closed[:, None]
+    planned_done = np.bincount(departments, weights=np.where(done, planned, 0).sum(axis=1), minlength=size)
+    actual_done = np.bincount(departments, weights=np.where(done, actual, 0).sum(axis=1), minlength=size)
+    history = np.bincount(departments, weights=closed, minlength=size)
+    overall = actual_done.sum() / planned_done.sum() if planned_done.sum() else 1.0
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio = np.where((history >= _MIN_HISTORY) & (planned_done > 0), actual_done / planned_done, overall)
+    projected = np.nansum(np.where(np.isnan(actual), planned * ratio[departments][:, None], actual), axis=1)
+    frame.update(
+        open=~closed,
+        projected=projected,
+        over_sla=~closed & (projected > frame["sla"]),
+        overdue=~closed & (frame["status_duration"] > frame["status_sla"]),
+    )
+
+
+def _at_risk(frame, mask, top) -> dict:
+    """Open PRs forecast to miss their SLA or already overdue in their current status."""
+    status_categories, status_codes = frame["status"]
+    _, departments = frame["department"]
+    projected = frame["projected"]
+    open_prs = mask & frame["open"]
+    over_sla = mask & frame["over_sla"]
+    overdue = mask & frame["overdue"]
+    at_risk = np.flatnonzero(over_sla | overdue)
+    # Worst first: furthest over SLA, then longest overdue in status
+    excess = (projected - frame["sla"])[at_risk]
+    waiting = (frame["status_duration"] - frame["status_sla"])[at_risk]
+    order = at_risk[np.lexsort((-np.nan_to_num(waiting), -np.nan_to_num(excess)))][:top]
+    department_names = frame["department"][0]
+    return {
+        "open_prs": int(open_prs.sum()),
+        "at_risk": len(at_risk),
+        "over_sla": int(over_sla.sum()),
+        "overdue_in_status": int(overdue.sum()),
+        "top": [{
+            "pr_number": frame["pr_number"][i],
+            "department": department_names[departments[i]] or None,
+            "status": status_categories[status_codes[i]] or None,
+            "projected_days": _number(projected[i]),
+            "sla": _number(frame["sla"][i]),
+            "status_duration": _number(frame["status_duration"][i]),
+            "status_sla": _number(frame["status_sla"][i]),
+            "reasons": [reason for reason, flag in (("over_sla", over_sla[i]), ("overdue_in_status", overdue[i])) if flag],
+        } for i in order],
+    }
+
+
+# Chat tool: which stage/SLA questions it answers and how it reads them. Only
+# aggregate wording (stages, bottlenecks, percentiles, breach rates, at-risk
+# counts) is taken; "late"/"delayed" on its own describes records to list
+_CONTEXT = re.compile(
+    r"\b(stages?|sla|bottlenecks?|critical path|percentiles?|p(?:50|90|95)|at[\s-]risk)\b"
+    r"|مرحلة|مراحل|المراحل|اختناق",
+    re.IGNORECASE,
+)
+_INTENTS = [
+    ("at_risk", re.compile(r"\bat[\s-]risk\b|\bforecast|\bpredict|likely to (?:breach|miss|be late)|will (?:breach|miss)"
+                           r"|معرضة|متوقع|توقع", re.IGNORECASE)),
+    ("bottlenecks", re.compile(r"\bbottlenecks?\b|critical path|slowest stages?|longest stages?"
+                               r"|(?:most|biggest|longest|largest)\s+delays?|اختناق|المسار الحرج|أبطأ",
+                               re.IGNORECASE)),
+    ("breaches", re.compile(r"\bbreach|\bcompliance\b|\b(?:over|exceed\w*|miss\w*)\s+(?:the\s+)?sla|تجاوز", re.IGNORECASE)),
+    ("delays", re.compile(r"\bdelays?\b|\blate\b|\boverruns?\b|\bpercentiles?\b|\bp(?:50|90|95)\b|\bdistribution\b"
+                          r"|\bhow long\b|تأخير|التأخير|مدة", re.IGNORECASE)),
+]
+_GROUPS = [
+    ("department", re.compile(r"\b(?:by|per|each|across)\s+departments?\b|\bdepartments\b"
+                              r"|\b(?:which|what)\s+(?:\w+\s+)?department\b|\bdepartment\s+(?:with|has|had)\b"
+                              r"|حسب الإدارة|لكل إدارة|الإدارات|أي إدارة", re.IGNORECASE)),
+    ("supplier", re.compile(r"\b(?:by|per|each|across)\s+(?:suppliers?|vendors?)\b|\bsuppliers\b|\bvendors\b"
+                            r"|\b(?:which|what)\s+(?:\w+\s+)?(?:supplier|vendor)\b|\b(?:supplier|vendor)\s+(?:with|has|had)\b"
+                            r"|حسب المورد|لكل مورد|الموردين|أي مورد", re.IGNORECASE)),
+]
+# Ranking something other than stages, departments or suppliers ("which contact
+# person...", "most breaches per buyer"): the stage breakdown cannot name it
+_RANKED = re.compile(
+    r"\b(?:which|who|whose)\b|\b(?:most|least|highest|lowest|worst|best)\b[^?.]*\b(?:per|by|each)\s+(?!stages?\b)\w+"
+    r"|(?:^|\s)أي\s",
+    re.IGNORECASE,
+)
+_STAGE_RANKED = re.compile(r"\b(?:which|what)\s+(?:\w+\s+){0,2}stages?\b|أي مرحلة|أي المراحل", re.IGNORECASE)
+# Questions about particular PRs or thresholds are left to generated SQL
+_SPECIFIC = re.compile(r"\bPR-\d|\b(?!p(?:50|90|95)\b)\w*\d", re.IGNORECASE)
+# "show/list/which PRs ..." asks for records; it stays with SQL unless it names
+# a per-stage aggregate
+_LISTING = re.compile(
+    r"\b(?:show|list|display|give me|find|get|which)\s+(?:\w+\s+){0,3}?"
+    r"(?:prs?|purchase requests?|requests|projects?|records|orders)\b"
+    r"|^\s*(?:اعرض|أظهر|عرض|قائمة|ما هي الطلبات|أي الطلبات)",
+    re.IGNORECASE,
+)
+_AGGREGATE = re.compile(
+    r"\bstages?\b|\bbottlenecks?\b|critical path|\bpercentiles?\b|\bp(?:50|90|95)\b|\bdistribution\b"
+    r"|\bbreach rates?\b|\bcompliance\b|مرحلة|مراحل|المراحل|اختناق|نسبة",
+    re.IGNORECASE,
+)
+
+
+def _intent(question: str):
+    if not _CONTEXT.search(question) or _SPECIFIC.search(question):
+        return None
+    if _LISTING.search(question) and not _AGGREGATE.search(question):
+        return None
+    return next((name for name, pattern in _INTENTS if pattern.search(question)), None)
+
+
+def _parse(question: str):
+    intent = _intent(question)
+    if intent is None:
+        return None
+    group_by = next((name for name, pattern in _GROUPS if pattern.search(question)), None)
+    if group_by is None and _RANKED.search(question) and not _STAGE_RANKED.search(question):
+        return None
+    filters = {}
+    for column, value in entities.mentions(question):
+        key = {"department": "department", "supplier_details": "supplier", "status": "status"}.get(column)
+        if key and key != group_by:
+            filters.setdefault(key, value)
+    return intent, group_by, filters
+
+
+def answer(question: str, language: str = "en"):
+    """Answer a stage/SLA question from the arrays ({response, sql, data}), or None if it is not one."""
+    if not STAGE_ANALYTICS_CHAT:
+        return None
+    try:
+        parsed = _parse(question)
+        if parsed is None:
+            return None
+        intent, group_by, filters = parsed
+        result = analyze(group_by=group_by, **filters)
+    except Exception as e:
+        print(f"⚠ Stage analytics skipped: {e}")
+        return None
+    metrics.inc("stage_analytics_answers_total", intent=intent)
+    response, rows = _render(intent, result, language)
+    return {"response": response, "sql": None, "data": ResultSet.from_dicts(rows), "analytics": intent}
+
+
+def _days(value) -> str:
+    return "n/a" if value is None else f"{value:+g}"
+
+
+def _plain(value) -> str:
+    return "n/a" if value is None else f"{value:g}"
+
+
+def _render(intent: str, result: dict, language: str) -> tuple:
+    arabic = language == "ar"
+    scope = ", ".join(v for v in result["filters"].values() if v)
+    label = (lambda s: s["label_ar"]) if arabic else (lambda s: s["label"])
+    stages = result["stages"]
+    overall = result["overall"]
+    if arabic:
+        header = f"({result['prs']} طلب شراء{'، ' + scope if scope else ''})"
+    else:
+        header = f"({result['prs']} PRs{', ' + scope if scope else ''})"
+
+    if intent == "at_risk":
+        risk = result["at_risk"]
+        if arabic:
+            lines = [f"**{risk['at_risk']} من {risk['open_prs']} طلبات مفتوحة معرضة لتجاوز SLA** {header}",
+                     f"- متوقع تجاوز SLA الإجمالي: {risk['over_sla']}",
+                     f"- متأخرة في حالتها الحالية: {risk['overdue_in_status']}"]
+        else:
+            lines = [f"**{risk['at_risk']} of {risk['open_prs']} open PRs are at risk** {header}",
+                     f"- Forecast to exceed their SLA: {risk['over_sla']}",
+                     f"- Overdue in their current status: {risk['overdue_in_status']}"]
+        for pr in risk["top"]:
+            lines.append(f"- {pr['pr_number']} ({pr['department']}, {pr['status']}): "
+                         f"{_plain(pr['projected_days'])} / {_plain(pr['sla'])} SLA, "
+                         f"{_plain(pr['status_duration'])} / {_plain(pr['status_sla'])} status")
+        return "\n".join(lines), risk["top"]
+
+    if intent == "bottlenecks":
+        ordered = sorted(stages, key=lambda s: -(s["share_of_delay"] or 0))
+        title = "**مراحل الاختناق**" if arabic else "**Bottleneck stages**"
+        lines = [f"{title} {header}"]
+        for n, s in enumerate(ordered, 1):
+            if arabic:
+                lines.append(f"{n}. {label(s)}: {s['share_of_delay']}% من التأخير، الأبطأ في {s['bottleneck_prs']} طلب "
+                             f"({s['bottleneck_rate']}%)، الوسيط {s['actual_p50']} يوم (المخطط {s['planned_median']})")
+            else:
+                lines.append(f"{n}. {label(s)}: {s['share_of_delay']}% of total delay, the worst stage for "
+                             f"{s['bottleneck_prs']} PRs ({s['bottleneck_rate']}%), median {s['actual_p50']} days "
+                             f"(planned {s['planned_median']})")
+    elif intent == "breaches":
+        ordered = sorted(stages, key=lambda s: -(s["breach_rate"] or 0))
+        if arabic:
+            lines = [f"**تجاوزات SLA حسب المرحلة** {header}",
+                     f"{overall['breached_prs']} طلب ({overall['breach_rate']}%) تجاوز SLA في مرحلة واحدة على الأقل."]
+        else:
+            lines = [f"**SLA breaches by stage** {header}",
+                     f"{overall['breached_prs']} PRs ({overall['breach_rate']}%) breached at least one stage SLA."]
+        for n, s in enumerate(ordered, 1):
+            if arabic:
+                lines.append(f"{n}. {label(s)}: {s['breach_rate']}% ({s['breaches']} من {s['prs']})، "
+                             f"متوسط التجاوز {s['overrun_mean']} يوم")
+            else:
+                lines.append(f"{n}. {label(s)}: {s['breach_rate']}% ({s['breaches']} of {s['prs']}), "
+                             f"average overrun {s['overrun_mean']} days")
+    else:
+        ordered = stages
+        if arabic:
+            lines = [f"**التأخير حسب المرحلة (الفعلي ناقص المخطط، بالأيام)** {header}",
+                     f"وسيط مدة الدورة {overall['cycle_days_median']} يوم، ووسيط التأخير الإجمالي {_days(overall['delay_median'])}."]
+        else:
+            lines = [f"**Delay by stage (actual minus planned days)** {header}",
+                     f"Median cycle {overall['cycle_days_median']} days, median total delay {_days(overall['delay_median'])}."]
+        for s in ordered:
+            lines.append(f"- {label(s)}: p50 {_days(s['delay_p50'])}, p90 {_days(s['delay_p90'])}, "
+                         f"p95 {_days(s['delay_p95'])}; " + (f"الفعلي p50 {s['actual_p50']} / p90 {s['actual_p90']}"
+                                                             if arabic else
+                                                             f"actual p50 {s['actual_p50']} / p90 {s['actual_p90']} days"))
+
+    rows = [{k: v for k, v in s.items() if k != "label_ar"} for s in ordered]
+    if result.get("groups"):
+        lines.append("")
+        lines.append(("**حسب " + ("الإدارة" if result["group_by"] == "department" else "المورد") + "**")
+                     if arabic else f"**By {result['group_by']}**")
+        for g in result["groups"]:
+            worst = next(s for s in stages if s["stage"] == g["worst_stage"])
+            if arabic:
+                lines.append(f"- {g['group']}: {g['breach_rate']}% من {g['prs']} طلب تجاوزت SLA، "
+                             f"أسوأ مرحلة {label(worst)} ({g['worst_stage_breach_rate']}%)، متوسط التأخير {_days(g['delay_mean'])}")
+            else:
+                lines.append(f"- {g['group']}: {g['breach_rate']}% of {g['prs']} PRs breached, worst stage "
+                             f"{label(worst)} ({g['worst_stage_breach_rate']}%), average delay {_days(g['delay_mean'])} days")
+        rows = result["groups"]
+    return "\n".join(lines), rows
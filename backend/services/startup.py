@@ -0,0 +1,112 @@
+import time
+import threading
+from datetime import datetime, timezone
+
+from backend.services import database, excel_loader
+
+# Background bootstrap: uvicorn starts accepting traffic immediately (liveness)
+# while the database is initialised and the workbook ingested here. Readiness
+# flips only once an engine has data to serve.
+_lock = threading.Lock()
+_state = {
+    "phase": "starting",
+    "ready": False,
+    "engine": None,
+    "rows_loaded": 0,
+    "rows_total": None,
+    "rejected": 0,
+    "error": None,
+    "started_at": None,
+    "finished_at": None,
+    "seconds": None,
+}
+_after_load = []
+
+
+def _update(**fields):
+    with _lock:
+        _state.update(fields)
+
+
+def status() -> dict:
+    with _lock:
+        return dict(_state)
+
+
+def is_ready() -> bool:
+    with _lock:
+        return _state["ready"]
+
+
+def after_load(callback):
+    """Register a callable run (in the bootstrap thread) once data is loaded."""
+    _after_load.append(callback)
+    return callback
+
+
+def _progress(rows_done: int):
+    _update(rows_loaded=rows_done)
+
+
+def _load_excel(excel_path: str):
+    _update(phase="parsing")
+    batch = excel_loader.load_excel_columns(excel_path)
+    _update(rows_total=len(batch), rejected=batch.rejected)
+    print(f"Loaded {len(batch)} records from Excel ({batch.rejected} rejected values)")
+    return batch
+
+
+def run_initial_load(excel_path: str):
+    """Initialise the database and load the workbook if needed (blocking)."""
+    started = time.perf_counter()
+    _update(phase="connecting", started_at=datetime.now(timezone.utc).isoformat())
+    try:
+        database.init_database()
+
+        if database.use_embedded():
+            print(f"Loading embedded engine from Excel file (READ_ENGINE={database.READ_ENGINE})...")
+            batch = _load_excel(excel_path)
+            _update(phase="loading")
+            database.load_embedded(batch)
+            _update(rows_loaded=database.get_record_count())
+        elif database.db_available:
+            _update(phase="checking")
+            count = database.get_record_count()
+            if count == 0:
+                print("Database is empty, loading data from Excel file...")
+                batch = _load_excel(excel_path)
+                _update(phase="inserting")
+                database.insert_records(batch, progress=_progress)
+                print(f"Successfully imported {len(batch)} procurement records")
+            else:
+                print(f"Database already has {count} records")
+                _update(rows_loaded=count, rows_total=count)
+        else:
+            print("Skipping database data loading since database is not available")
+            _update(phase="unavailable", error="No database engine available")
+            return
+
+        _update(phase="ready", ready=True, engine=database.active_engine())
+    except Exception as e:
+        print(f"Error loading Excel data: {e}")
+        _update(phase="failed", error=str(e))
+        return
+    finally:
+        _update(
+            finished_at=datetime.now(timezone.utc).isoformat(),
+            seconds=round(time.perf_counter() - started, 3)
+        )
+
+    for callback in _after_load:
+        try:
+            callback()
+        except Exception as e:
+            print(f"⚠ Post-load task {getattr(callback, '__name__', callback)} failed: {e}")
+
+
+def start_background_load(excel_path: str) -> threading.Thread:
+    thread = threading.Thread(
+        target=run_initial_load, args=(excel_path,), name="initial-load", daemon=True
+    )
+    thread.start()
+    return thread
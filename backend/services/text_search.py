@@ -0,0 +1,140 @@
+# Indexed text search over the free-text columns. In Postgres this is pg_trgm
+# (typo-tolerant similarity, also speeds up ILIKE '%..%') plus per-column
+# full-text GIN indexes; the functions below reproduce the same operators in
+# Python for the embedded engine.
+import os
+import re
+from functools import lru_cache
+
+SEARCH_COLUMNS = ["description", "supplier_details", "note"]
+
+# Same defaults as pg_trgm.similarity_threshold / word_similarity_threshold
+SIMILARITY_THRESHOLD = float(os.environ.get("SEARCH_SIMILARITY_THRESHOLD", "0.3"))
+WORD_SIMILARITY_THRESHOLD = float(os.environ.get("SEARCH_WORD_SIMILARITY_THRESHOLD", "0.6"))
+
+TS_CONFIG = "english"
+
+
+def tsvector(column: str) -> str:
+    return f"to_tsvector('{TS_CONFIG}', {column})"
+
+
+def postgres_ddl() -> list:
+    """Extension and index statements, run after the table exists (each may fail on its own)."""
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for column in SEARCH_COLUMNS:
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS procurement_{column}_trgm_idx "
+            f"ON procurement_records USING gin ({column} gin_trgm_ops)"
+        )
+        # Expression indexes are only used when the query repeats the expression
+        # exactly: this is the form the SQL prompt teaches (and _search_sql uses)
+        statements.append(f"DROP INDEX IF EXISTS procurement_{column}_fts_idx")
+        statements.append(
+            f"CREATE INDEX IF NOT EXISTS procurement_{column}_tsv_idx "
+            f"ON procurement_records USING gin ({tsvector(column)})"
+        )
+    return statements
+
+
+_WORD = re.compile(r"[^\W_]+", re.UNICODE)
+
+
+@lru_cache(maxsize=4096)
+def _trigrams(text: str) -> frozenset:
+    """pg_trgm trigram set: lower-cased words padded with two spaces before, one after."""
+    grams = set()
+    for word in _WORD.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def similarity(a, b) -> float:
+    if a is None or b is None:
+        return 0.0
+    ta, tb = _trigrams(str(a)), _trigrams(str(b))
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+def word_similarity(needle, haystack) -> float:
+    """Best match of `needle` against any run of consecutive words in `haystack`."""
+    if needle is None or haystack is None:
+        return 0.0
+    target = _trigrams(str(needle))
+    if not target:
+        return 0.0
+    words = _WORD.findall(str(haystack).lower())
+    span = max(len(_WORD.findall(str(needle))), 1)
+    best = 0.0
+    for size in range(1, span + 1):
+        for start in range(0, max(len(words) - size + 1, 1)):
+            window = _trigrams(" ".join(words[start:start + size]))
+            if window:
+                best = max(best, len(target & window) / len(target))
+    return best
+
+
+def _stem(word: str) -> str:
+    """Rough English stemming so 'laptops' matches 'laptop' like to_tsvector('english')."""
+    if len(word) <= 3:
+        return word
+    if word.endswith("ies"):
+        word = word[:-3] + "y"
+    elif word.endswith(("sses", "xes", "zes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith("ss"):
+        word = word[:-1]
+    for suffix in ("ing", "ed"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    # service / serviced / servicing share one stem
+    return word[:-1] if word.endswith("e") and len(word) > 4 else word
+
+
+def fts_match(document, query) -> bool:
+    """to_tsvector(doc) @@ websearch_to_tsquery(query): every query term present (or-groups allowed)."""
+    if document is None or query is None:
+        return False
+    terms = {_stem(w) for w in _WORD.findall(str(document).lower())}
+    text = str(query).lower()
+    for group in re.split(r"\s+or\s+", text):
+        required = [_stem(w) for w in _WORD.findall(re.sub(r'-\w+', '', group))]
+        excluded = [_stem(w[1:]) for w in re.findall(r'-\w+', group)]
+        if required and all(w in terms for w in required) and not any(w in terms for w in excluded):
+            return True
+    return False
+
+
+def prefilter(query: str):
+    """Lower-cased substrings of which every row matching `query` contains at least one.
+
+    Covers both operators. word_similarity at the threshold needs a shared
+    inner trigram once the padded edge trigrams alone cannot reach it; failing
+    that, a shared " ab"/"yz " edge (the word's first or last two letters) once
+    the "  a" trigrams alone cannot. fts_match needs a query stem, which is a
+    prefix of the stemmed word (minus the final "y" that "ies" became). None
+    when the query admits no such bound.
+    """
+    grams = _trigrams(str(query))
+    needed = WORD_SIMILARITY_THRESHOLD * len(grams)
+    inner = {g for g in grams if " " not in g}
+    starts = {g for g in grams if g.startswith("  ")}
+    if not grams or len(starts) >= needed:
+        return None
+    if len(grams) - len(inner) < needed:
+        similar = inner
+    else:
+        similar = {g.strip() for g in grams if g not in starts}
+    stems = {_stem(w) for w in _WORD.findall(re.sub(r"-\w+", "", str(query).lower()))}
+    stems = {stem[:-1] if stem.endswith("y") else stem for stem in stems}
+    terms = similar | stems
+    # SQLite lower() only folds ASCII, so anything else must be caseless
+    if "" in terms or not all(t.isascii() or t == t.upper() for t in terms):
+        return None
+    # A term containing a shorter one adds nothing to the OR
+    return sorted(t for t in terms if not any(o != t and o in t for o in terms))
+
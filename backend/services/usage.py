@@ -0,0 +1,195 @@
+import os
+import hashlib
+import threading
+import contextvars
+from datetime import datetime, timedelta, timezone
+
+from backend.services import metrics
+
+# Token budgets (0 disables a budget)
+TOKEN_BUDGET_PER_REQUEST = int(os.environ.get("TOKEN_BUDGET_PER_REQUEST", "20000"))
+TOKEN_BUDGET_PER_TENANT_DAILY = int(os.environ.get("TOKEN_BUDGET_PER_TENANT_DAILY", "0"))
+# Days of per-endpoint/tenant/model totals kept for /admin/usage
+USAGE_RETENTION_DAYS = int(os.environ.get("USAGE_RETENTION_DAYS", "7"))
+
+# USD per 1M tokens (input, output)
+MODEL_PRICES = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+}
+DEFAULT_PRICE = (
+    float(os.environ.get("OPENAI_PRICE_INPUT_PER_1M", "0.15")),
+    float(os.environ.get("OPENAI_PRICE_OUTPUT_PER_1M", "0.60")),
+)
+
+_lock = threading.Lock()
+_current_request = contextvars.ContextVar("current_usage_request", default=None)
+
+# (day, endpoint, tenant, model) -> totals
+_totals = {}
+# (day, tenant) -> tokens, today only (daily budget checks)
+_tenant_tokens = {}
+_current_day = {"day": None}
+
+
+class RequestUsage:
+    def __init__(self, endpoint: str, tenant: str):
+        self.endpoint = endpoint
+        self.tenant = tenant
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+        self.degraded = []
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "degraded": self.degraded,
+        }
+
+
+def tenant_from_headers(headers, client_host: str = None) -> str:
+    """Identify the caller by API key (hashed) or client address; never by spoofable headers."""
+    api_key = headers.get("x-api-key") or ""
+    auth = headers.get("authorization") or ""
+    if not api_key and auth.lower().startswith("bearer "):
+        api_key = auth[7:]
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    return "ip:" + (client_host or "unknown")
+
+
+def begin_request(endpoint: str, tenant: str):
+    return _current_request.set(RequestUsage(endpoint, tenant))
+
+
+def end_request(token):
+    _current_request.reset(token)
+
+
+def current_request():
+    return _current_request.get()
+
+
+def _today() -> str:
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+def estimate_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    price_in, price_out = DEFAULT_PRICE
+    # Longest matching prefix: "gpt-4o-mini-2024-07-18" is gpt-4o-mini, not gpt-4o
+    matches = [name for name in MODEL_PRICES if model and model.startswith(name)]
+    if matches:
+        price_in, price_out = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * price_in + completion_tokens * price_out) / 1_000_000
+
+
+def record(response):
+    """Account the usage block of an OpenAI response to the current request."""
+    metrics.record_llm_usage(response)
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+    completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+    model = getattr(response, "model", None) or "unknown"
+    cost = estimate_cost(model, prompt_tokens, completion_tokens)
+    metrics.inc("llm_cost_usd_total", cost, model=model)
+
+    req = _current_request.get()
+    endpoint = req.endpoint if req else "background"
+    tenant = req.tenant if req else "system"
+    if req is not None:
+        req.calls += 1
+        req.prompt_tokens += prompt_tokens
+        req.completion_tokens += completion_tokens
+        req.cost_usd += cost
+
+    day = _today()
+    key = (day, endpoint, tenant, model)
+    with _lock:
+        if _current_day["day"] != day:
+            _roll_over(day)
+        _tenant_tokens[(day, tenant)] = _tenant_tokens.get((day, tenant), 0) + prompt_tokens + completion_tokens
+        totals = _totals.setdefault(key, {
+            "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0
+        })
+        totals["calls"] += 1
+        totals["prompt_tokens"] += prompt_tokens
+        totals["completion_tokens"] += completion_tokens
+        totals["cost_usd"] += cost
+
+
+def _roll_over(day: str):
+    """New UTC day: drop yesterday's budget counters and totals past the retention (caller holds _lock)."""
+    _current_day["day"] = day
+    for key in [k for k in _tenant_tokens if k[0] != day]:
+        del _tenant_tokens[key]
+    cutoff = (datetime.strptime(day, "%Y-%m-%d") - timedelta(days=max(USAGE_RETENTION_DAYS, 1) - 1)).strftime("%Y-%m-%d")
+    for key in [k for k in _totals if k[0] < cutoff]:
+        del _totals[key]
+
+
+def tenant_tokens_today(tenant: str) -> int:
+    with _lock:
+        return _tenant_tokens.get((_today(), tenant), 0)
+
+
+def allow(purpose: str) -> bool:
+    """Check the request and tenant budgets before an LLM call.
+
+    Returns False when a budget is exhausted; the caller is expected to
+    degrade (local rendering, skipping the call) instead of failing.
+    """
+    req = _current_request.get()
+    if req is None:
+        return True
+    exhausted = None
+    if TOKEN_BUDGET_PER_REQUEST and req.total_tokens >= TOKEN_BUDGET_PER_REQUEST:
+        exhausted = "request"
+    elif TOKEN_BUDGET_PER_TENANT_DAILY and tenant_tokens_today(req.tenant) >= TOKEN_BUDGET_PER_TENANT_DAILY:
+        exhausted = "tenant"
+    if exhausted:
+        req.degraded.append(purpose)
+        metrics.inc("llm_budget_degraded_total", purpose=purpose, budget=exhausted)
+        print(f"⚠ Token budget ({exhausted}) exhausted for {req.tenant} - degrading {purpose}")
+        return False
+    return True
+
+
+def summary(group_by: str = "endpoint", day: str = None) -> dict:
+    """Aggregate recorded usage by endpoint, tenant, model or day."""
+    index = {"day": 0, "endpoint": 1, "tenant": 2, "model": 3}.get(group_by, 1)
+    groups = {}
+    with _lock:
+        items = list(_totals.items())
+    for key, totals in items:
+        if day and key[0] != day:
+            continue
+        group = groups.setdefault(key[index], {
+            "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0
+        })
+        for field in group:
+            group[field] += totals[field]
+    for group in groups.values():
+        group["total_tokens"] = group["prompt_tokens"] + group["completion_tokens"]
+        group["cost_usd"] = round(group["cost_usd"], 6)
+    return {
+        "group_by": group_by,
+        "day": day,
+        "budgets": {
+            "per_request_tokens": TOKEN_BUDGET_PER_REQUEST,
+            "per_tenant_daily_tokens": TOKEN_BUDGET_PER_TENANT_DAILY,
+        },
+        "groups": groups,
+    }
@@ -0,0 +1,135 @@
+import os
+import re
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from backend.services import cache, database, metrics, pipeline, query_log, usage
+
+# Pre-answer the most common questions after each load so the first users
+# after a deploy hit the shared cache instead of paying full LLM latency.
+WARMUP_ENABLED = os.environ.get("WARMUP_ENABLED", "true").lower() in ("1", "true", "yes")
+# Comma-separated question sources, tried in order until WARMUP_MAX_QUESTIONS
+WARMUP_SOURCES = [s.strip() for s in os.environ.get("WARMUP_SOURCES", "file,log,guide").split(",") if s.strip()]
+WARMUP_MAX_QUESTIONS = int(os.environ.get("WARMUP_MAX_QUESTIONS", "25"))
+# Questions answered at once; kept low so live traffic keeps the LLM pool
+WARMUP_CONCURRENCY = int(os.environ.get("WARMUP_CONCURRENCY", "2"))
+WARMUP_LANGUAGE = os.environ.get("WARMUP_LANGUAGE", "en")
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+WARMUP_GUIDE_PATH = os.environ.get("WARMUP_GUIDE_PATH", os.path.join(_ROOT, "QUESTIONS_GUIDE.md"))
+# Optional curated list, one question per line ('#' comments allowed)
+WARMUP_QUESTIONS_FILE = os.environ.get("WARMUP_QUESTIONS_FILE")
+
+# Numbered guide entries: 12. **"How many projects are completed?"**
+_GUIDE_QUESTION = re.compile(r'^\s*\d+\.\s+\*\*"(.+?)"\*\*')
+
+_lock = threading.Lock()
+_state = {"phase": "idle", "questions": 0, "warmed": 0, "failed": 0, "seconds": None, "sources": []}
+_sources = {}
+
+
+def register_source(name: str, provider):
+    """Add a question source: provider(limit) -> list of question strings."""
+    _sources[name] = provider
+    return provider
+
+
+def status() -> dict:
+    with _lock:
+        return dict(_state)
+
+
+def _update(**fields):
+    with _lock:
+        _state.update(fields)
+
+
+def guide_questions(limit: int) -> list:
+    if not os.path.exists(WARMUP_GUIDE_PATH):
+        return []
+    questions = []
+    with open(WARMUP_GUIDE_PATH, encoding="utf-8") as f:
+        for line in f:
+            match = _GUIDE_QUESTION.match(line)
+            # Skip templates such as "What is the total budget for [Department]?"
+            if match and "[" not in match.group(1):
+                questions.append(match.group(1))
+    return questions[:limit]
+
+
+def file_questions(limit: int) -> list:
+    if not WARMUP_QUESTIONS_FILE or not os.path.exists(WARMUP_QUESTIONS_FILE):
+        return []
+    with open(WARMUP_QUESTIONS_FILE, encoding="utf-8") as f:
+        lines = [line.strip() for line in f]
+    return [line for line in lines if line and not line.startswith("#")][:limit]
+
+
+register_source("guide", guide_questions)
+register_source("file", file_questions)
+register_source("log", query_log.frequent_questions)
+
+
+def collect_questions(limit: int = None) -> list:
+    limit = limit or WARMUP_MAX_QUESTIONS
+    questions, seen = [], set()
+    for name in WARMUP_SOURCES:
+        provider = _sources.get(name)
+        if provider is None:
+            print(f"⚠ Unknown warm-up source '{name}'")
+            continue
+        try:
+            candidates = provider(limit)
+        except Exception as e:
+            print(f"⚠ Warm-up source '{name}' failed: {e}")
+            continue
+        for question in candidates:
+            normalized = " ".join(question.lower().split())
+            if normalized not in seen:
+                seen.add(normalized)
+                questions.append(question)
+        if len(questions) >= limit:
+            break
+    return questions[:limit]
+
+
+def _warm_one(question: str) -> bool:
+    # Each question is accounted (and budgeted) like a request of its own
+    token = usage.begin_request("warmup", "system")
+    started = time.perf_counter()
+    try:
+        pipeline.answer_question(question, WARMUP_LANGUAGE)
+        metrics.observe("warmup_question_seconds", time.perf_counter() - started)
+        metrics.inc("warmup_questions_total", result="ok")
+        return True
+    except Exception as e:
+        print(f"⚠ Warm-up failed for '{question}': {e}")
+        metrics.inc("warmup_questions_total", result="error")
+        return False
+    finally:
+        usage.end_request(token)
+
+
+def run():
+    """Warm the shared cache; registered with startup.after_load."""
+    if not WARMUP_ENABLED:
+        return
+    # One worker per data version does the work; the others find the claim
+    claim = cache.key("warmup", WARMUP_LANGUAGE)
+    if not cache.claim("warmup", claim, {"pid": os.getpid(), "at": time.time()}, ttl=cache.CACHE_TTLS["answer"]):
+        print("Cache warm-up already done by another worker for this data version")
+        _update(phase="skipped")
+        return
+
+    questions = collect_questions()
+    _update(phase="running", questions=len(questions), warmed=0, failed=0, sources=WARMUP_SOURCES)
+    print(f"Warming cache with {len(questions)} question(s), concurrency {WARMUP_CONCURRENCY} "
+          f"(data version {database.get_data_version()})")
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=WARMUP_CONCURRENCY, thread_name_prefix="warmup") as pool:
+        results = list(pool.map(_warm_one, questions))
+    elapsed = time.perf_counter() - started
+    warmed = sum(results)
+    _update(phase="done", warmed=warmed, failed=len(results) - warmed, seconds=round(elapsed, 2))
+    print(f"✓ Cache warm-up: {warmed}/{len(questions)} question(s) in {elapsed:.1f}s")
@@ -0,0 +1,153 @@
+"""Synthetic ERP workbooks in the sample's 75-column layout, at any size.
+
+    python -m benchmarks.generate_dataset --rows 100000 --out benchmarks/data/erp-100k.xlsx
+
+Values follow the sample workbook in attached_assets: the same categories,
+ranges and cell types (including its text "Project Status" colours, which
+load as NULL like the real export), planned stage days mirrored into the
+stage columns, totals that add up and budgets split across quarters.
+Deterministic for a given --seed.
+"""
+import os
+import time
+import random
+import argparse
+from datetime import date, timedelta
+
+HEADERS = [
+    "Year", "Quarter", "Month", "Period", "Date", "PR NO.", "Description", "Department",
+    "Contact person", "Assign to", "Budget", "Budget Q1", "Budget Q2", "Budget Q3", "Budget Q4",
+    "Source method", "Status", "Supplier details", "Supplier rating", "Local content percentage",
+    "PR approval / scope input", "Approving authority", "Planned (yes / no)",
+    "Target date as per RFX", "Actual Project Start", "SLA", "Note",
+    "Review & approval scope & eval.", "Floating", "Tender submit by vendor", "Evaluation",
+    "Award & Approval", "Contract and PO", "PR approval / scope input(PD)",
+    "Review & approval scope & eval.(PD)", "Floating(PD)", "Tender submit by vendor(PD)",
+    "Evaluation(PD)", "Award & Approval(PD)", "Contract and PO(PD)", "Total Days (PD)",
+    "Review & approval scope & eval.(AD)", "Floating(AD)", "Tender submit by vendor(AD)",
+    "Evaluation(AD)", "Award & Approval(AD)", "Contract and PO(AD)", "Total Days (AD)",
+    "Review & approval scope & eval. (PD) SLA", "Floating (PD) SLA",
+    "Tender submit by vendor (PD) SLA", "Evaluation (PD) SLA", "Award & Approval (PD) SLA",
+    "Contract and PO (PD) SLA", "Review & approval scope & eval. (AD) SLA", "Floating (AD) SLA",
+    "Tender submit by vendor (AD)SLA", "Evaluation (AD) SLA", "Award & Approval (AD) SLA",
+    "Contract and PO (AD) SLA", "Review & approval scope & eval. Diff SLA", "Floating Diff SLA",
+    "Tender submit by vendor DiffSLA", "Evaluation Diff SLA", "Award & Approval Diff SLA",
+    "Contract and PO Diff SLA", "Project Status", "Risk", "Duration", "Last status date",
+    "Status duration", "Status SLA", "Status Co.", "48H Escalate?", "CEO Escalation/Action Statement",
+]
+
+MONTHS = ["January", "February", "March", "April", "May", "June", "July", "August",
+          "September", "October", "November", "December"]
+DESCRIPTIONS = [
+    "Cloud Services Subscription", "Consulting Services", "Equipment Purchase", "Facility Maintenance",
+    "Hardware Procurement", "IT Infrastructure Upgrade", "Marketing Campaign", "Office Supplies",
+    "Professional Services", "Security Systems", "Software License Renewal", "Training Services",
+]
+DEPARTMENTS = ["Engineering", "Finance", "HR", "IT", "Legal", "Marketing", "Operations",
+               "Procurement", "R&D", "Sales"]
+CONTACTS = ["David Wilson", "Emily Davis", "Jennifer Martinez", "John Smith", "Lisa Anderson",
+            "Mary Rodriguez", "Michael Brown", "Robert Taylor", "Sarah Johnson", "William Garcia"]
+TEAMS = [f"Team {letter}" for letter in "ABCDEF"]
+SOURCE_METHODS = ["Direct Purchase", "Framework Agreement", "RFP", "RFQ", "Spot Buy", "Tender"]
+STATUSES = ["Approved", "Cancelled", "Completed", "In Progress", "On Hold", "Pending", "Under Review"]
+RATINGS = ["A", "A+", "B", "B+", "C", "C+"]
+AUTHORITIES = ["CEO", "CFO", "COO", "Director Procurement", "VP Finance", "VP Operations"]
+PROJECT_STATUSES = ["Blue", "Completed", "Green", "Red", "Yellow"]
+RISKS = ["Critical", "High", "Low", "Medium", "None"]
+CEO_STATEMENTS = [
+    "Approved - Proceed as planned", "Delayed - Resource allocation required",
+    "Escalated - Priority project", "N/A", "On track - No action needed",
+    "Under review - Additional information required",
+]
+# Planned days per stage: review, floating, tender, evaluation, award, contract
+STAGE_DAYS = [(3, 10), (5, 15), (10, 30), (5, 15), (3, 10), (2, 7)]
+YEARS = (2024, 2025)
+
+
+def generate_rows(count: int, seed: int = 2026):
+    """Yield `count` rows (tuples in HEADERS order)."""
+    rng = random.Random(seed)
+    randint, choice, uniform = rng.randint, rng.choice, rng.uniform
+    # Zero-padded like the sample (PR-2024-0001), wider once 4 digits run out
+    width = max(4, len(str(count)))
+    iso = date.isoformat
+    day = timedelta(days=1)
+
+    for seq in range(1, count + 1):
+        year = choice(YEARS)
+        month = randint(1, 12)
+        quarter = (month - 1) // 3 + 1
+        start = date(year, month, 1)
+        pr_number = f"PR-{year}-{seq:0{width}d}"
+
+        budget = round(uniform(10000, 500000), 2)
+        shares = [uniform(0.1, 0.4) for _ in range(3)]
+        q1, q2, q3 = (round(budget * share / (sum(shares) + uniform(0.3, 0.6)), 2) for share in shares)
+        q4 = round(budget - q1 - q2 - q3, 2)
+
+        planned = [randint(low, high) for low, high in STAGE_DAYS]
+        actual = [max(1, days + randint(-4, 9)) for days in planned]
+        planned_sla = [days + randint(-1, 4) for days in planned]
+        actual_sla = [days + randint(-1, 4) for days in planned]
+        # Negative = the stage took longer than its SLA
+        diff_sla = [sla - days for sla, days in zip(planned_sla, actual)]
+
+        yield (
+            year, f"Q{quarter}", MONTHS[month - 1], f"{year}-Q{quarter}", iso(start), pr_number,
+            choice(DESCRIPTIONS), choice(DEPARTMENTS), choice(CONTACTS), choice(TEAMS),
+            budget, q1, q2, q3, q4,
+            choice(SOURCE_METHODS), choice(STATUSES), f"Supplier-{randint(1, 999)}", choice(RATINGS),
+            round(uniform(20, 100), 1),
+            iso(start + randint(1, 7) * day), choice(AUTHORITIES), choice(("Yes", "No")),
+            iso(start + randint(30, 120) * day), iso(start + randint(3, 15) * day),
+            randint(30, 120), f"Project note for {pr_number}",
+            *planned,
+            randint(3, 10), *planned, sum(planned),
+            *actual, sum(actual),
+            *planned_sla, *actual_sla, *diff_sla,
+            choice(PROJECT_STATUSES), choice(RISKS), randint(30, 180),
+            iso(start + randint(10, 90) * day), randint(5, 30), randint(20, 45),
+            choice(("Yes", "No")), choice(("Yes", "No")), choice(CEO_STATEMENTS),
+        )
+
+
+def write_workbook(path: str, rows: int, sheets: int = 1, seed: int = 2026) -> dict:
+    """Write `rows` rows split evenly over `sheets` sheets; returns size and timing."""
+    from openpyxl import Workbook
+
+    started = time.perf_counter()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    wb = Workbook(write_only=True)
+    generated = generate_rows(rows, seed)
+    per_sheet = -(-rows // sheets)
+    for index in range(sheets):
+        sheet = wb.create_sheet("ERP Data" if sheets == 1 else f"ERP Data {index + 1}")
+        sheet.append(HEADERS)
+        for _, row in zip(range(per_sheet), generated):
+            sheet.append(row)
+    wb.save(path)
+    return {
+        "path": path,
+        "rows": rows,
+        "sheets": sheets,
+        "bytes": os.path.getsize(path),
+        "seconds": round(time.perf_counter() - started, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic ERP workbook")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--out", required=True, help="Path of the .xlsx to write")
+    parser.add_argument("--sheets", type=int, default=1, help="Split the rows over this many sheets")
+    parser.add_argument("--seed", type=int, default=2026)
+    args = parser.parse_args()
+    if args.rows > 1_048_575 * args.sheets:
+        raise SystemExit("Excel sheets hold at most 1,048,575 data rows; use more --sheets")
+    result = write_workbook(args.out, args.rows, args.sheets, args.seed)
+    print(f"✓ Wrote {result['rows']} rows to {result['path']} "
+          f"({result['bytes'] / 1e6:.1f} MB, {result['seconds']}s)")
+
+
+if __name__ == "__main__":
+    main()
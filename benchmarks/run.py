@@ -0,0 +1,239 @@
+"""Ingestion and query benchmarks at several dataset sizes.
+
+    python -m benchmarks.run --rows 10000 100000 1000000 --record
+
+For each size a synthetic workbook is generated once into benchmarks/data/
+(see generate_dataset.py), then a fresh process measures:
+
+- parse: excel_loader.load_excel_columns time, rows/s and peak RSS
+- load: embedded engine build time and peak RSS
+- ingest (--postgres): ingestion.ingest into Postgres, rows/s
+- queries: get_stats, search_records and representative generated queries,
+  median/p95 over --repeat runs with the result cache off, per engine
+
+--postgres TRUNCATEs procurement_records in BENCH_DATABASE_URL (never
+DATABASE_URL), so point it at a scratch database. --record appends the run
+to benchmarks/results.jsonl for comparison over time.
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+from benchmarks import generate_dataset
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(BENCH_DIR, "data")
+RESULTS_PATH = os.path.join(BENCH_DIR, "results.jsonl")
+
+# Shapes the model generates most often (see the examples in the SQL prompt)
+QUERIES = {
+    "budget_by_department": (
+        "SELECT department, SUM(budget) AS total FROM procurement_records "
+        "GROUP BY department ORDER BY total DESC"
+    ),
+    "status_counts": "SELECT status, COUNT(*) AS count FROM procurement_records GROUP BY status",
+    "monthly_trend": (
+        "SELECT year, month, COUNT(*) AS prs, SUM(budget) AS budget FROM procurement_records "
+        "GROUP BY year, month ORDER BY year, month"
+    ),
+    "high_risk_top_100": (
+        "SELECT pr_number, department, budget, risk FROM procurement_records "
+        "WHERE risk IN ('High', 'Critical') ORDER BY budget DESC LIMIT 100"
+    ),
+    "top_10_budget": "SELECT pr_number, description, budget FROM procurement_records ORDER BY budget DESC LIMIT 10",
+    "stuck_in_review": (
+        "SELECT pr_number, department, status_duration FROM procurement_records "
+        "WHERE status = 'Under Review' AND status_duration > 25"
+    ),
+    "escalations_48h": (
+        "SELECT pr_number, department, status, escalate_48h, ceo_escalation FROM procurement_records "
+        "WHERE escalate_48h = 'Yes'"
+    ),
+    "description_ilike": (
+        "SELECT pr_number, description, budget FROM procurement_records WHERE description ILIKE '%security%'"
+    ),
+    "pr_lookup": "SELECT * FROM procurement_records WHERE pr_number = '{pr_number}'",
+    "select_star_1000": "SELECT * FROM procurement_records LIMIT 1000",
+}
+
+
+def _label(rows: int) -> str:
+    for size, suffix in ((1_000_000, "m"), (1_000, "k")):
+        if rows >= size and rows % size == 0:
+            return f"{rows // size}{suffix}"
+    return str(rows)
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _timings(fn, repeat: int, size: str = "rows") -> dict:
+    """Median/p95 of fn(); len() of its result is recorded under `size` (rows, or bytes for payloads)."""
+    samples, count = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+        count = len(result) if hasattr(result, "__len__") else None
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 2),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+        size: count,
+    }
+
+
+def _query_suite(database, shaping, pr_number: str, repeat: int) -> dict:
+    results = {
+        "get_stats": _timings(database.get_stats, repeat),
+        "search_records": _timings(lambda: database.search_records("security systems"), repeat),
+    }
+    for name, sql in QUERIES.items():
+        sql = sql.format(pr_number=pr_number)
+        results[name] = _timings(lambda: database.execute_query(sql), repeat)
+    wide = database.execute_query(QUERIES["select_star_1000"])
+    results["serialize_1000_rows"] = _timings(lambda: shaping.dumps(shaping.shape(wide)), repeat, size="bytes")
+    return results
+
+
+def measure(path: str, repeat: int, postgres: bool) -> dict:
+    """Child-process side: every number comes from one fresh interpreter."""
+    from backend.services import database, excel_loader, ingestion, shaping
+
+    result = {"file_mb": round(os.path.getsize(path) / 1e6, 1)}
+    started = time.perf_counter()
+    batch = excel_loader.load_excel_columns(path)
+    parse_seconds = time.perf_counter() - started
+    result.update(
+        rows=len(batch),
+        parse_seconds=round(parse_seconds, 2),
+        parse_rows_per_s=round(len(batch) / parse_seconds),
+        parse_peak_rss_mb=_peak_rss_mb(),
+    )
+
+    started = time.perf_counter()
+    database.load_embedded(batch)
+    result.update(embedded_load_seconds=round(time.perf_counter() - started, 2),
+                  embedded_peak_rss_mb=_peak_rss_mb())
+
+    pr_number = batch.columns["pr_number"][len(batch) // 2]
+    del batch
+    database.READ_ENGINE = "embedded"
+    result["queries"] = {"embedded": _query_suite(database, shaping, pr_number, repeat)}
+
+    if postgres:
+        database.init_database()
+        if not database.db_available:
+            raise SystemExit("BENCH_DATABASE_URL is not reachable")
+        with database.get_cursor() as cursor:
+            cursor.execute("TRUNCATE procurement_records")
+        started = time.perf_counter()
+        reports = ingestion.ingest([path])
+        seconds = time.perf_counter() - started
+        result["postgres_ingest"] = {
+            "seconds": round(seconds, 2),
+            "rows_per_s": round(sum(r["rows"] for r in reports) / seconds),
+            "parse_seconds": round(sum(r["parse_seconds"] for r in reports), 2),
+            "write_seconds": round(sum(r["write_seconds"] for r in reports), 2),
+        }
+        with database.get_cursor() as cursor:
+            cursor.execute("ANALYZE procurement_records")
+        database.READ_ENGINE = "postgres"
+        result["queries"]["postgres"] = _query_suite(database, shaping, pr_number, repeat)
+    return result
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=BENCH_DIR, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _run_scale(rows: int, args) -> dict:
+    path = os.path.join(DATA_DIR, f"erp-{_label(rows)}.xlsx")
+    generated = None
+    if not os.path.exists(path):
+        print(f"Generating {rows} rows -> {path}")
+        generated = generate_dataset.write_workbook(path, rows, seed=args.seed)["seconds"]
+
+    env = dict(os.environ, CACHE_BACKEND="off", QUERY_LOG_ENABLED="false", READ_ENGINE="embedded")
+    env.pop("DATABASE_URL", None)
+    if args.postgres:
+        if not os.environ.get("BENCH_DATABASE_URL"):
+            raise SystemExit("--postgres needs BENCH_DATABASE_URL (a scratch database; it is truncated)")
+        env["DATABASE_URL"] = os.environ["BENCH_DATABASE_URL"]
+    command = [sys.executable, "-m", "benchmarks.run", "--child", path, "--repeat", str(args.repeat)]
+    if args.postgres:
+        command.append("--postgres")
+    print(f"Measuring {_label(rows)} ...")
+    completed = subprocess.run(command, env=env, capture_output=True, text=True,
+                               cwd=os.path.dirname(BENCH_DIR))
+    if completed.returncode != 0:
+        print(completed.stderr[-2000:])
+        return {"scale": _label(rows), "error": f"exit code {completed.returncode}"}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {"scale": _label(rows), "generate_seconds": generated, **result}
+
+
+def _print_summary(results: list):
+    print(f"\n{'scale':>6} {'parse s':>8} {'rows/s':>8} {'parse MB':>9} {'load s':>7} {'load MB':>8}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['scale']:>6} {r['error']}")
+            continue
+        print(f"{r['scale']:>6} {r['parse_seconds']:>8} {r['parse_rows_per_s']:>8} "
+              f"{r['parse_peak_rss_mb']:>9} {r['embedded_load_seconds']:>7} {r['embedded_peak_rss_mb']:>8}")
+    for engine in ("embedded", "postgres"):
+        measured = [r for r in results if engine in r.get("queries", {})]
+        if not measured:
+            continue
+        print(f"\n{engine} median ms: " + "  ".join(f"{r['scale']:>8}" for r in measured))
+        for name in measured[0]["queries"][engine]:
+            print(f"  {name:<22}" + "  ".join(f"{r['queries'][engine][name]['median_ms']:>8}" for r in measured))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestion and query benchmarks")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per query (median and p95 reported)")
+    parser.add_argument("--seed", type=int, default=2026)
+    parser.add_argument("--postgres", action="store_true", help="Also ingest into and query BENCH_DATABASE_URL")
+    parser.add_argument("--record", action="store_true", help=f"Append the run to {RESULTS_PATH}")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.child, args.repeat, args.postgres)))
+        return
+
+    results = [_run_scale(rows, args) for rows in args.rows]
+    _print_summary(results)
+    if args.record:
+        run = {
+            "at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "repeat": args.repeat,
+            "results": results,
+        }
+        with open(RESULTS_PATH, "a", encoding="utf-8") as f:
+            f.write(json.dumps(run) + "\n")
+        print(f"\n✓ Recorded in {RESULTS_PATH}")
+
+
+if __name__ == "__main__":
+    main()
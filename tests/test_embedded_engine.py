@@ -0,0 +1,38 @@
+import pytest
+
+from backend.services import embedded_engine
+
+
+@pytest.fixture(scope="module")
+def engine():
+    ddl = "CREATE TABLE procurement_records (id SERIAL PRIMARY KEY, department TEXT, budget REAL)"
+    rows = [(1, "IT", 100.0), (2, "IT", 250.5), (3, "Finance", 75.25)]
+    embedded_engine.load_records(rows, len(rows), ["id", "department", "budget"], ddl)
+    return embedded_engine
+
+
+@pytest.mark.parametrize("sql, expected", [
+    ("SELECT ROUND(AVG(budget)::numeric, 2) FROM procurement_records",
+     "SELECT ROUND(CAST(AVG(budget) AS REAL), 2) FROM procurement_records"),
+    ("SELECT SUM(budget)::float FROM procurement_records",
+     "SELECT CAST(SUM(budget) AS REAL) FROM procurement_records"),
+    ("SELECT ROUND(AVG(budget), 2)::numeric FROM procurement_records",
+     "SELECT CAST(ROUND(AVG(budget), 2) AS REAL) FROM procurement_records"),
+    ("SELECT COUNT(*)::int, budget::int, '2024-01-01'::date FROM procurement_records",
+     "SELECT CAST(COUNT(*) AS INTEGER), CAST(budget AS INTEGER), date('2024-01-01') FROM procurement_records"),
+    ("SELECT * FROM procurement_records WHERE id % 2 = 0",
+     "SELECT * FROM procurement_records WHERE id % 2 = 0"),
+    ("SELECT * FROM procurement_records WHERE department = 'now() x::int'",
+     "SELECT * FROM procurement_records WHERE department = 'now() x::int'"),
+])
+def test_translate_sql(sql, expected):
+    assert embedded_engine.translate_sql(sql) == expected
+
+
+def test_aggregate_casts_run(engine):
+    result = engine.execute_query(
+        "SELECT department, ROUND(AVG(budget)::numeric, 2), SUM(budget)::float "
+        "FROM procurement_records GROUP BY department ORDER BY department"
+    )
+    assert result.columns == ("department", "round", "sum")
+    assert [tuple(row) for row in result.rows] == [("Finance", 75.25, 75.25), ("IT", 175.25, 350.5)]
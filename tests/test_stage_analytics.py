@@ -0,0 +1,39 @@
+import pytest
+
+from backend.services import stage_analytics
+
+
+def _route(question: str):
+    parsed = stage_analytics._parse(question)
+    return None if parsed is None else parsed[:2]
+
+
+@pytest.mark.parametrize("question, expected", [
+    # Records, not aggregates: left to generated SQL
+    ("Show PRs that are late", None),
+    ("List the late projects in IT department", None),
+    ("Which PRs are delayed?", None),
+    ("Show me the PRs that breached the SLA", None),
+    ("Are there any delays in the finance department?", None),
+    ("PRs with more than 30 days delay per stage", None),
+    ("اعرض الطلبات المتأخرة", None),
+    # Rankings over a dimension the stage breakdown cannot name
+    ("Which contact person has the most SLA breaches?", None),
+    ("Who breaches the SLA most often?", None),
+    ("Most SLA breaches per approving authority", None),
+    # Aggregates
+    ("What are the bottleneck stages?", ("bottlenecks", None)),
+    ("Which stage is the biggest bottleneck in IT?", ("bottlenecks", None)),
+    ("Which stages have the most delays?", ("bottlenecks", None)),
+    ("Show the SLA breach rate by department", ("breaches", "department")),
+    ("Which department breaches the SLA most often?", ("breaches", "department")),
+    ("Which supplier has the most SLA breaches?", ("breaches", "supplier")),
+    ("What vendor misses the SLA most?", ("breaches", "supplier")),
+    ("p90 delay per stage", ("delays", None)),
+    ("How long does each stage take?", ("delays", None)),
+    ("How many open PRs are at risk of missing the SLA?", ("at_risk", None)),
+    ("ما هي مراحل الاختناق؟", ("bottlenecks", None)),
+    ("أي إدارة لديها أكثر تجاوزات SLA؟", ("breaches", "department")),
+])
+def test_routing(question, expected):
+    assert _route(question) == expected
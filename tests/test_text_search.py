@@ -0,0 +1,33 @@
+import pytest
+
+from backend.services import text_search
+
+DOCUMENTS = [
+    "Security systems upgrade for the main campus",
+    "Cloud services subscription renewal",
+    "Laptops and docking stations for IT",
+    "Supplier-658 framework agreement",
+    "Companies shortlisted for network cabling",
+    "Servicing of HVAC units",
+    "Pipe fittings",
+    "توريد أجهزة شبكة",
+]
+
+
+@pytest.mark.parametrize("query", [
+    "security systems", "secruity", "cloud service", "laptop", "IT", "suplier-658", "company",
+    "serviced", "pipes", "network", "شبكة", "cabling -network", "hvac or laptops",
+])
+def test_prefilter_keeps_every_match(query):
+    terms = text_search.prefilter(query)
+    for document in DOCUMENTS:
+        matched = (text_search.word_similarity(query, document) >= text_search.WORD_SIMILARITY_THRESHOLD
+                   or text_search.fts_match(document, query))
+        if matched and terms is not None:
+            assert any(term in document.lower() for term in terms), document
+
+
+def test_prefilter_unbounded_queries():
+    assert text_search.prefilter("") is None
+    # Non-ASCII cased letters cannot be folded by SQLite lower()
+    assert text_search.prefilter("Café") is None